@@ -1,13 +1,34 @@
 import os
 import numpy as np
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 import time
 from PIL import Image
 import math
 
+from image_loader import rgb_pixels, source_image
+from timing import phase
+
+
+# Binary mode: a GIF/TIFF-style LZW over the raw channel bytes. Codes 0-255 are
+# the byte literals, CLEAR_CODE resets the dictionary, END_CODE ends a channel
+# and new strings start at FIRST_CODE. Codes are packed MSB-first with a width
+# that grows from MIN_CODE_WIDTH bits up to the configured maximum width, and
+# the dictionary is cleared once every code of that width is taken.
+BINARY_MAGIC = b'LZWB'
+BINARY_VERSION = 2
+CLEAR_CODE = 256
+END_CODE = 257
+FIRST_CODE = 258
+MIN_CODE_WIDTH = 9
+MAX_CODE_WIDTH = 16
+
 
 class LZW:
-    def __init__(self, path):
+    def __init__(self, path, verbose=False, image=None):
         self.path = path
+        self.verbose = verbose  # Enables per-row progress messages
+        self.source = image  # Pixels already decoded by image_loader.load_image, if any
         self.compressionDictionary, self.compressionIndex = self.createCompressionDict()
         self.decompressionDictionary, self.decompressionIndex = self.createDecompressionDict()
         print(f"Initialized LZW object for file: {self.path}")
@@ -16,8 +37,12 @@ class LZW:
     ''' --------------------- Compression of the Image --------------------- '''
     ''''''
 
-    def compress(self):
-        start_time = time.time()
+    def compress(self, outputPath=None):
+        """
+        Compresses the image with text LZW and writes it to ``outputPath``, by
+        default ``Compressed/<name>Compressed.lzw`` under the working directory.
+        """
+        start_time = time.perf_counter()
         print("Starting image compression...")
         self.initCompress()
         compressedColors = []
@@ -29,22 +54,16 @@ class LZW:
         compressedColors.append(self.compressColor(self.blue))
         print("Image compression complete. Writing compressed data to file...")
 
-        filesplit = str(os.path.basename(self.path)).split('.')
-        filename = filesplit[0] + 'Compressed.lzw'
-        savingDirectory = os.path.join(os.getcwd(), 'Compressed')
-        if not os.path.isdir(savingDirectory):
-            os.makedirs(savingDirectory)
-
-        compressed_file_path = os.path.join(savingDirectory, filename)
+        compressed_file_path = self.compressedPath('.lzw', outputPath)
 
-        with open(compressed_file_path, 'wb') as file:  # Open file in binary mode
+        with phase("write"), open(compressed_file_path, 'wb') as file:  # Open file in binary mode
             for color in compressedColors:
                 for row in color:
                     file.write(row.encode('utf-8'))  # Encode to bytes using utf-8
                     file.write(b"\n")  # Write newline as a byte
 
         # Calculate compression time
-        time_taken_compress = time.time() - start_time
+        time_taken_compress = time.perf_counter() - start_time
         original_size = os.path.getsize(self.path)
         compressed_size = os.path.getsize(compressed_file_path)
         compression_ratio = original_size / compressed_size
@@ -65,23 +84,142 @@ class LZW:
     def compressColor(self, colorList):
         print("Starting compression for a color channel...")
         compressedColor = []
-        for currentRow in colorList:
-            currentString = currentRow[0]
-            compressedRow = ""
-            for charIndex in range(1, len(currentRow)):
-                currentChar = currentRow[charIndex]
-                if currentString + currentChar in self.compressionDictionary:
-                    currentString = currentString + currentChar
-                else:
-                    compressedRow = compressedRow + str(self.compressionDictionary[currentString]) + ","
-                    self.compressionDictionary[currentString + currentChar] = self.compressionIndex
-                    self.compressionIndex += 1
-                    currentString = currentChar
-            compressedRow = compressedRow + str(self.compressionDictionary[currentString])
-            compressedColor.append(compressedRow)
+        with phase("entropy_code"):
+            for currentRow in colorList:
+                currentString = currentRow[0]
+                compressedRow = ""
+                for charIndex in range(1, len(currentRow)):
+                    currentChar = currentRow[charIndex]
+                    if currentString + currentChar in self.compressionDictionary:
+                        currentString = currentString + currentChar
+                    else:
+                        compressedRow = compressedRow + str(self.compressionDictionary[currentString]) + ","
+                        self.compressionDictionary[currentString + currentChar] = self.compressionIndex
+                        self.compressionIndex += 1
+                        currentString = currentChar
+                compressedRow = compressedRow + str(self.compressionDictionary[currentString])
+                compressedColor.append(compressedRow)
         print("Color channel compression complete.")
         return compressedColor
 
+    def compressBinary(self, maxCodeWidth=MAX_CODE_WIDTH, workers=None, outputPath=None):
+        """
+        Compresses the image with binary LZW. Every channel has its own
+        dictionary of at most 2 ** maxCodeWidth codes, so the channels are
+        compressed in parallel on a pool of ``workers`` processes (``1``
+        compresses them one after another in this process). The file is
+        written to ``outputPath``, by default ``Compressed/<name>Compressed.lzwb``
+        under the working directory.
+        """
+        if not MIN_CODE_WIDTH <= maxCodeWidth <= MAX_CODE_WIDTH:
+            raise ValueError(f"maxCodeWidth must be between {MIN_CODE_WIDTH} and {MAX_CODE_WIDTH}")
+        start_time = time.perf_counter()
+        print("Starting binary image compression...")
+        self.initCompressBinary()
+        with phase("transform"):
+            channelBytes = [channel.tobytes() for channel in self.channels]
+        print(f"Compressing {len(channelBytes)} channels...")
+        with phase("entropy_code"):
+            compressedChannels = self.mapChannels(self.compressChannelBytes, channelBytes, maxCodeWidth, workers)
+        print("Image compression complete. Writing compressed data to file...")
+
+        compressed_file_path = self.compressedPath('.lzwb', outputPath)
+
+        # Header: magic, version, maximum code width, width, height and
+        # channel count, then every channel as a 4-byte stream length
+        # followed by the packed codes.
+        with phase("write"), open(compressed_file_path, 'wb') as file:
+            file.write(BINARY_MAGIC)
+            file.write(BINARY_VERSION.to_bytes(1, 'big'))
+            file.write(maxCodeWidth.to_bytes(1, 'big'))
+            file.write(self.width.to_bytes(4, 'big'))
+            file.write(self.height.to_bytes(4, 'big'))
+            file.write(len(compressedChannels).to_bytes(1, 'big'))
+            for stream in compressedChannels:
+                file.write(len(stream).to_bytes(4, 'big'))
+                file.write(stream)
+
+        time_taken_compress = time.perf_counter() - start_time
+        original_size = os.path.getsize(self.path)
+        compressed_size = os.path.getsize(compressed_file_path)
+        compression_ratio = original_size / compressed_size
+
+        entropy = self.calculate_entropy(compressed_file_path)
+        redundancy = self.calculate_redundancy(entropy)
+
+        return {
+            "original_size": original_size,
+            "compressed_size": compressed_size,
+            "compression_ratio": compression_ratio,
+            "time_taken_compress": time_taken_compress,
+            "entropy": entropy,
+            "redundancy": redundancy
+        }
+
+    @staticmethod
+    def compressChannelBytes(data, maxCodeWidth=MAX_CODE_WIDTH):
+        """
+        LZW-encodes a byte string and returns the codes packed MSB-first into a
+        bytearray.
+
+        The dictionary is a trie stored in a flat array: slot
+        ``(prefix code << 8) | byte`` holds the code of the prefix string
+        extended by that byte, or 0 if it is not in the dictionary yet. When
+        all 2 ** maxCodeWidth codes are taken a CLEAR_CODE is written and the
+        used slots are reset, so memory stays fixed however large the input.
+        """
+        maxCodes = 1 << maxCodeWidth
+        trie = array('H', bytes(2 * 256 * maxCodes))
+        usedSlots = []
+        nextCode = FIRST_CODE
+        output = bytearray()
+        bitBuffer, bitCount = 0, 0
+
+        def writeCode(code, width):
+            nonlocal bitBuffer, bitCount
+            bitBuffer = (bitBuffer << width) | code
+            bitCount += width
+            while bitCount >= 8:
+                bitCount -= 8
+                output.append((bitBuffer >> bitCount) & 0xFF)
+            bitBuffer &= (1 << bitCount) - 1
+
+        if data:
+            prefix = data[0]
+            for byte in data[1:]:
+                slot = (prefix << 8) | byte
+                code = trie[slot]
+                if code:
+                    prefix = code
+                    continue
+                writeCode(prefix, (nextCode - 1).bit_length())
+                trie[slot] = nextCode
+                usedSlots.append(slot)
+                nextCode += 1
+                if nextCode == maxCodes:
+                    writeCode(CLEAR_CODE, maxCodeWidth)
+                    for slot in usedSlots:
+                        trie[slot] = 0
+                    usedSlots.clear()
+                    nextCode = FIRST_CODE
+                prefix = byte
+            writeCode(prefix, (nextCode - 1).bit_length())
+        # The decoder adds the entry for the last prefix before it reads
+        # END_CODE, so END_CODE is read one code later, at the width of
+        # nextCode. Without a last entry (no data, or a CLEAR just before)
+        # nextCode is FIRST_CODE and both widths are MIN_CODE_WIDTH.
+        writeCode(END_CODE, min(maxCodeWidth, nextCode.bit_length()))
+        if bitCount:
+            output.append((bitBuffer << (8 - bitCount)) & 0xFF)
+        return output
+
+    @staticmethod
+    def mapChannels(function, channels, maxCodeWidth, workers=None):
+        if workers == 1:
+            return [function(channel, maxCodeWidth) for channel in channels]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, channels, [maxCodeWidth] * len(channels)))
+
     ''''''
     ''' ---------------------- Helper Methods for Entropy and Redundancy ---------------------- '''
     ''''''
@@ -116,62 +254,201 @@ class LZW:
     ''' --------------------- Decompression of the Image --------------------- '''
     ''''''
 
-    def decompress(self):
+    def decompress(self, memmapPath=None):
         print("Starting image decompression...")
-        image = []
-        with open(self.path, 'rb') as file:  # Open file in binary mode
-            for line in file:
-                line = line.decode('utf-8')  # Decode the byte string back to a regular string
-                decodedRow = self.decompressRow(line)
-                image.append(np.array(decodedRow))
-        image = np.array(image)
-        shapeTup = image.shape
-        image = image.reshape((3, shapeTup[0] // 3, shapeTup[1]))
+        image = self.decompressStream(memmapPath)
         self.saveImage(image)
         print("Decompression complete.")
+        return image
+
+    def decompressStream(self, memmapPath=None):
+        """
+        Decodes the text LZW file line by line straight into a preallocated
+        ``(3, height, width)`` uint8 array, or into an ``np.memmap`` at
+        ``memmapPath`` for outputs that should not live in RAM.
+
+        Each line holds ``rowLength`` consecutive pixels of one channel in
+        PIL's row-major order (``initCompress`` reads ``image.size`` as
+        height, width, so lines are ``height`` pixels long and there are
+        ``width`` of them per channel). Lines are therefore copied to their
+        offset in the flattened channel instead of being treated as rows.
+        """
+        with open(self.path, 'rb') as file:
+            lineCount = sum(chunk.count(b"\n") for chunk in iter(lambda: file.read(1 << 16), b""))
+            file.seek(0)
+            linesPerChannel = lineCount // 3
+            image, flatChannels = None, None
+            for lineIndex, line in enumerate(file):
+                decodedRow = self.decompressRow(line)
+                if image is None:
+                    rowLength = len(decodedRow)
+                    shape = (3, rowLength, linesPerChannel)
+                    if memmapPath is None:
+                        image = np.empty(shape, dtype=np.uint8)
+                    else:
+                        image = np.memmap(memmapPath, dtype=np.uint8, mode='w+', shape=shape)
+                    flatChannels = image.reshape(3, -1)
+                channel, row = divmod(lineIndex, linesPerChannel)
+                flatChannels[channel, row * rowLength:(row + 1) * rowLength] = decodedRow
+        if isinstance(image, np.memmap):
+            image.flush()
+        return image
 
     def decompressRow(self, line):
-        print("Starting decompression for a row...")
-        currentRow = line.split(",")
-        currentRow[-1] = currentRow[-1][:-1]
-        decodedRow = ""
-        word, entry = "", ""
-        decodedRow = decodedRow + self.decompressionDictionary[int(currentRow[0])]
-        word = self.decompressionDictionary[int(currentRow[0])]
-        for i in range(1, len(currentRow)):
-            new = int(currentRow[i])
-            if new in self.decompressionDictionary:
-                entry = self.decompressionDictionary[new]
-                decodedRow += entry
-                add = word + entry[0]
-                word = entry
+        """
+        Decodes one line of comma-separated codes into its pixel values.
+
+        Dictionary entries are (prefix code, last character) pairs in flat
+        arrays rather than strings. An entry is expanded straight into the
+        row text: from its prefixes back to a single character the first time
+        the row uses it, then as a copy of where the row already holds it.
+        """
+        if self.verbose:
+            print("Starting decompression for a row...")
+        prefixes, lastChars, firstChars, lengths = self.decompressionDictionary
+        rowText = bytearray()
+        rowStarts = {}  # Code -> where its string was last written in rowText
+        previous = None
+        for code in map(int, line.rstrip(b"\n").split(b",")):
+            if previous is not None:
+                # The new entry is the previous string followed by the first
+                # character of this one, which is also the first character of
+                # the previous string when this code is the new entry itself.
+                newCode = self.decompressionIndex
+                prefixes.append(previous)
+                lastChars.append(firstChars[code] if code < newCode else firstChars[previous])
+                firstChars.append(firstChars[previous])
+                lengths.append(lengths[previous] + 1)
+                rowStarts[newCode] = rowStarts[previous]
+                self.decompressionIndex += 1
+            start, length = len(rowText), lengths[code]
+            if code in rowStarts:
+                # All but the last character are already in the row, ending
+                # at the latest where this string starts.
+                source = rowStarts[code]
+                rowText += rowText[source:source + length - 1]
+                rowText.append(lastChars[code])
             else:
-                entry = word + word[0]
-                decodedRow += entry
-                add = entry
-                word = entry
-            self.decompressionDictionary[self.decompressionIndex] = add
-            self.decompressionIndex += 1
-        newRow = decodedRow.split(',')
-        decodedRow = [int(x) for x in newRow]
-        print("Row decompression complete.")
+                rowText += bytes(length)
+                position, entry = start + length, code
+                while entry >= 0:  # Characters have no prefix (-1)
+                    position -= 1
+                    rowText[position] = lastChars[entry]
+                    entry = prefixes[entry]
+            rowStarts[code] = start
+            previous = code
+        decodedRow = np.array(bytes(rowText).split(b",")).astype(np.uint8)
+        if self.verbose:
+            print("Row decompression complete.")
         return decodedRow
 
+    def decompressBinary(self, workers=None):
+        print("Starting binary image decompression...")
+        with open(self.path, 'rb') as file:
+            if file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f"{self.path} is not a binary LZW file")
+            version = file.read(1)[0]
+            if version != BINARY_VERSION:
+                raise ValueError(f"Unsupported binary LZW version {version}")
+            maxCodeWidth = file.read(1)[0]
+            width = int.from_bytes(file.read(4), 'big')
+            height = int.from_bytes(file.read(4), 'big')
+            channels = file.read(1)[0]
+            streams = [file.read(int.from_bytes(file.read(4), 'big')) for _ in range(channels)]
+
+        image = np.empty((channels, height, width), dtype=np.uint8)
+        decodedChannels = self.mapChannels(self.decompressChannelBytes, streams, maxCodeWidth, workers)
+        for channel, decoded in enumerate(decodedChannels):
+            if len(decoded) != height * width:
+                raise ValueError(f"Channel {channel} decoded to {len(decoded)} bytes, expected {height * width}")
+            image[channel] = np.frombuffer(decoded, dtype=np.uint8).reshape(height, width)
+        self.saveImage(image)
+        print("Decompression complete.")
+        return image
+
+    @staticmethod
+    def decompressChannelBytes(stream, maxCodeWidth=MAX_CODE_WIDTH):
+        """Inverse of compressChannelBytes: unpacks the codes and rebuilds the bytes."""
+        literals = [bytes([i]) for i in range(256)] + [b'', b'']
+        table = list(literals)
+        maxCodes = 1 << maxCodeWidth
+        output = bytearray()
+        bitBuffer, bitCount, position = 0, 0, 0
+        previous = None
+        while True:
+            # The decoder adds each string one code later than the encoder, so
+            # len(table) here equals the encoder's next code minus one.
+            width = min(maxCodeWidth, len(table).bit_length())
+            while bitCount < width:
+                if position >= len(stream):
+                    raise ValueError("LZW stream ended without an end code")
+                bitBuffer = (bitBuffer << 8) | stream[position]
+                position += 1
+                bitCount += 8
+            bitCount -= width
+            code = bitBuffer >> bitCount
+            bitBuffer &= (1 << bitCount) - 1
+            if code == END_CODE:
+                return output
+            if code == CLEAR_CODE:
+                table = list(literals)
+                previous = None
+                continue
+            if previous is None:
+                entry = table[code]
+            else:
+                if code < len(table):
+                    entry = table[code]
+                elif code == len(table):
+                    entry = previous + previous[:1]
+                else:
+                    raise ValueError(f"Invalid LZW code {code}")
+                if len(table) < maxCodes:
+                    table.append(previous + entry[:1])
+            output += entry
+            previous = entry
+
     ''''''
     ''' ---------------------- Class Helper Functions ---------------------- '''
     ''''''
 
+    def compressedPath(self, extension, outputPath=None):
+        """
+        Returns ``outputPath``, or when it is None the default
+        ``Compressed/<name>Compressed<extension>`` path under the working
+        directory, creating that folder.
+        """
+        if outputPath is not None:
+            return outputPath
+        filesplit = str(os.path.basename(self.path)).split('.')
+        savingDirectory = os.path.join(os.getcwd(), 'Compressed')
+        os.makedirs(savingDirectory, exist_ok=True)
+        return os.path.join(savingDirectory, filesplit[0] + 'Compressed' + extension)
+
+    def loadPixels(self):
+        if self.source is None:
+            print(f"Opening image file: {self.path}")
+        with phase("load"):
+            return rgb_pixels(source_image(self.path, self.source))
+
     def initCompress(self):
-        print(f"Opening image file: {self.path}")
-        self.image = Image.open(self.path)
-        self.height, self.width = self.image.size
-        self.red, self.green, self.blue = self.processImage()
+        self.pixels = self.loadPixels()
+        # The text format splits the pixels into lines of PIL's (width, height)
+        # size read as (height, width)
+        self.height, self.width = self.pixels.shape[1], self.pixels.shape[0]
+        with phase("transform"):
+            self.red, self.green, self.blue = self.processImage()
+
+    def initCompressBinary(self):
+        pixels = self.loadPixels()
+        self.height, self.width = pixels.shape[:2]
+        with phase("transform"):
+            self.channels = np.ascontiguousarray(pixels.transpose(2, 0, 1))
 
     def processImage(self):
         print("Processing image to separate RGB channels...")
-        image = self.image.convert('RGB')
         red, green, blue = [], [], []
-        pixel_values = list(image.getdata())
+        pixel_values = self.pixels.reshape(-1, 3).tolist()
         iterator = 0
         for height_index in range(self.height):
             R, G, B = "", "", ""
@@ -194,19 +471,9 @@ class LZW:
         savingDirectory = os.path.join(os.getcwd(), 'Decompressed')
         if not os.path.isdir(savingDirectory):
             os.makedirs(savingDirectory)
-        imagelist, imagesize = self.makeImageData(image[0], image[1], image[2])
-        imagenew = Image.new('RGB', imagesize)
-        imagenew.putdata(imagelist)
-        imagenew.save(os.path.join(savingDirectory, filename))
+        Image.fromarray(np.ascontiguousarray(image.transpose(1, 2, 0))).save(os.path.join(savingDirectory, filename))
         print(f"Decompressed image saved as {filename}")
 
-    def makeImageData(self, r, g, b):
-        imagelist = []
-        for i in range(len(r)):
-            for j in range(len(r[0])):
-                imagelist.append((r[i][j], g[i][j], b[i][j]))
-        return imagelist, (len(r), len(r[0]))
-
     def createCompressionDict(self):
         print("Creating compression dictionary...")
         dictionary = {}
@@ -218,12 +485,14 @@ class LZW:
 
     def createDecompressionDict(self):
         print("Creating decompression dictionary...")
-        dictionary = {}
-        for i in range(10):
-            dictionary[i] = str(i)
-        dictionary[10] = ','
+        # Codes 0-9 are the digits and 10 the comma, as in createCompressionDict.
+        # Entries are stored as parallel arrays of prefix code (-1 for these
+        # single characters), last character, first character and length.
+        characters = b'0123456789,'
+        dictionary = (array('i', [-1] * len(characters)), array('B', characters),
+                      array('B', characters), array('i', [1] * len(characters)))
         print("Decompression dictionary created.")
-        return dictionary, 11
+        return dictionary, len(characters)
 
 
 # Main function to trigger the LZW compression/decompression process
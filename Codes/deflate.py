@@ -1,9 +1,30 @@
 import cv2
+import os
+import struct
 import zlib
 import numpy as np
 import time
+from concurrent.futures import ThreadPoolExecutor
 from math import log2
 
+from image_loader import source_image
+from timing import phase
+from zlib_tuning import STRATEGIES, autotune_zlib
+
+FILE_MAGIC = b'DFLB'
+FORMAT_VERSION = 1
+HEADER_FORMAT = '<4sBIIBIIBI'
+FILTER_MAGIC = b'DFLF'
+FILTER_HEADER_FORMAT = '<4sBIIBB'
+FILTER_TYPES = ('none', 'sub', 'up', 'average', 'paeth')
+ROW_FILTERS = FILTER_TYPES + ('adaptive',)
+# |byte| when the byte is read as a signed value, for the minimum sum of
+# absolute differences heuristic.
+SIGNED_MAGNITUDE = np.minimum(np.arange(256), 256 - np.arange(256)).astype(np.uint8)
+BLOCK_SIZE = 1 << 20
+RESTART_INTERVAL = 8
+DICTIONARY_SIZE = 32 * 1024  # Deflate window
+
 
 def calculate_entropy(image):
     """
@@ -27,39 +48,232 @@ def calculate_entropy(image):
     return entropy
 
 
-def compress_image_with_deflate(image_path):
+def paeth_predictor(a, b, c):
+    """
+    PNG Paeth predictor on int16 arrays.
+
+    Args:
+        a, b, c (numpy.ndarray): Left, upper and upper-left neighbours.
+
+    Returns:
+        numpy.ndarray: Whichever of a, b, c is closest to a + b - c.
+    """
+    distance_a = np.abs(b - c)
+    distance_b = np.abs(a - c)
+    distance_c = np.abs(a + b - 2 * c)
+    return np.where((distance_a <= distance_b) & (distance_a <= distance_c), a,
+                    np.where(distance_b <= distance_c, b, c))
+
+
+def filter_rows(image, row_filter="adaptive"):
+    """
+    Applies PNG-style filters to every row of an image at once.
+
+    The filters predict each byte from the same channel of the pixel to the
+    left (a), above (b) and above-left (c), with 0 outside the image, and store
+    the difference modulo 256. In adaptive mode every filter is computed and
+    each row keeps the one with the smallest sum of absolute differences, the
+    heuristic libpng uses.
+
+    Args:
+        image (numpy.ndarray): uint8 image of shape (height, width, channels).
+        row_filter (str): One of ``ROW_FILTERS``.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (height, 1 + width * channels), each
+        row being the filter type byte followed by the filtered row, as in PNG.
+    """
+    if row_filter not in ROW_FILTERS:
+        raise ValueError(f"Unknown row filter '{row_filter}', expected one of {ROW_FILTERS}.")
+    height, width, channels = image.shape
+    padded = np.zeros((height + 1, width + 1, channels), dtype=np.uint8)
+    padded[1:, 1:] = image
+    a, b, c = padded[1:, :-1], padded[:-1, 1:], padded[:-1, :-1]
+
+    def apply(name):
+        if name == "none":
+            return image
+        if name == "sub":
+            return image - a
+        if name == "up":
+            return image - b
+        if name == "average":
+            return image - ((a >> 1) + (b >> 1) + (a & b & 1))
+        return image - paeth_predictor(a.astype(np.int16), b.astype(np.int16), c.astype(np.int16)).astype(np.uint8)
+
+    filtered_rows = np.empty((height, 1 + width * channels), dtype=np.uint8)
+    if row_filter == "adaptive":
+        candidates = [apply(name).reshape(height, -1) for name in FILTER_TYPES]
+        costs = np.stack([SIGNED_MAGNITUDE[candidate].sum(axis=1, dtype=np.int64) for candidate in candidates])
+        choice = np.argmin(costs, axis=0)
+        filtered_rows[:, 0] = choice
+        for index, candidate in enumerate(candidates):
+            filtered_rows[choice == index, 1:] = candidate[choice == index]
+    else:
+        filtered_rows[:, 0] = FILTER_TYPES.index(row_filter)
+        filtered_rows[:, 1:] = apply(row_filter).reshape(height, -1)
+    return filtered_rows
+
+
+def unfilter_rows(filtered_rows, shape):
+    """
+    Inverse of ``filter_rows``.
+
+    Consecutive rows with the same filter are decoded together: None rows are
+    copied, Sub rows are running sums along the rows and Up rows running sums
+    down the columns, modulo 256. Average and Paeth read both the decoded pixel
+    to the left and the row above, so the rows around them are decoded along
+    anti-diagonals by ``unfilter_diagonals``, one step per anti-diagonal.
+    Rows of other filters between two Average or Paeth rows join the same
+    anti-diagonal pass unless there are at least ``width`` of them, when
+    decoding them on their own saves steps.
+
+    Args:
+        filtered_rows (numpy.ndarray): Output of ``filter_rows``.
+        shape (tuple): (height, width, channels) of the image.
+
+    Returns:
+        numpy.ndarray: The uint8 image.
+    """
+    height, width, channels = shape
+    filter_types = filtered_rows[:, 0]
+    residuals = filtered_rows[:, 1:].reshape(shape)
+    # A zero row on top and a zero column on the left stand for the pixels
+    # outside the image.
+    padded = np.zeros((height + 1, width + 1, channels), dtype=np.int16)
+    padded[1:, 1:] = residuals
+
+    def unfilter_runs(start, end):
+        # Rows start to end hold no Average or Paeth row
+        starts = start + np.flatnonzero(np.diff(filter_types[start:end], prepend=-1))
+        for first, last in zip(starts, np.append(starts[1:], end)):
+            if filter_types[first] == 1:
+                padded[first + 1:last + 1, 1:] = np.cumsum(residuals[first:last], axis=1, dtype=np.uint8)
+            elif filter_types[first] == 2:
+                rows = np.cumsum(residuals[first:last], axis=0, dtype=np.uint8)
+                padded[first + 1:last + 1, 1:] = (rows + padded[first, 1:]) & 255
+
+    diagonal_rows = np.flatnonzero(filter_types >= 3)
+    bands = np.split(diagonal_rows, np.flatnonzero(np.diff(diagonal_rows) > width) + 1) if len(diagonal_rows) else []
+    decoded = 0
+    for band in bands:
+        unfilter_runs(decoded, band[0])
+        unfilter_diagonals(padded, filter_types, band[0], band[-1] + 1)
+        decoded = band[-1] + 1
+    unfilter_runs(decoded, height)
+    return padded[1:, 1:].astype(np.uint8)
+
+
+def unfilter_diagonals(padded, filter_types, start, end):
+    """
+    Decodes rows ``start`` to ``end`` of the buffer of ``unfilter_rows``, which
+    holds their residuals, in place along anti-diagonals: every pixel on
+    i + j = d only needs pixels on the two previous anti-diagonals. Pixel (i, j)
+    is at position (i + 1) * (width + 1) + j + 1 of the flattened buffer, so an
+    anti-diagonal and its left, upper and upper-left neighbours are strided
+    views with a step of ``width``.
+    """
+    width, channels = padded.shape[1] - 1, padded.shape[2]
+    pixels = padded.reshape(-1, channels)
+    stride = width + 1
+    band_types = filter_types[start:end]
+    counts = np.bincount(band_types)
+    most_used = np.argmax(counts)
+    others = [filter_type for filter_type in np.flatnonzero(counts) if filter_type != most_used]
+
+    def predict(filter_type, a, b, c):
+        if filter_type == 1:
+            return a.copy()
+        if filter_type == 2:
+            return b.copy()
+        if filter_type == 3:
+            return (a + b) >> 1
+        if filter_type == 4:
+            return paeth_predictor(a, b, c)
+        return np.zeros_like(a)
+
+    for d in range(end - start + width - 1):
+        first, last = max(0, d - width + 1), min(d, end - start - 1) + 1
+        begin = (start + first + 1) * stride + d - first + 1
+        stop = begin + (last - first - 1) * width + 1
+        a = pixels[begin - 1:stop - 1:width]
+        b = pixels[begin - stride:stop - stride:width]
+        c = pixels[begin - stride - 1:stop - stride - 1:width]
+        predicted = predict(most_used, a, b, c)
+        for filter_type in others:
+            rows = band_types[first:last] == filter_type
+            if rows.any():
+                predicted[rows] = predict(filter_type, a[rows], b[rows], c[rows])
+        current = pixels[begin:stop:width]
+        np.bitwise_and(current + predicted, 255, out=current)
+
+
+def zlib_compress(data, level, strategy):
+    """Like ``zlib.compress`` with a zlib strategy constant."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, strategy)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_image_with_deflate(image_path, row_filter="adaptive", output_path=None, level=9, strategy="default",
+                                target_ratio=None, time_budget=None, image=None):
     """
     Compresses an image using the Deflate algorithm and calculates performance metrics.
 
+    The rows are first passed through ``filter_rows``, like PNG does, unless
+    ``row_filter`` is None. With ``level="auto"`` the zlib level and strategy
+    are chosen by ``zlib_tuning.autotune_zlib`` on sampled bands of the image.
+
     Args:
         image_path (str): Path to the input image.
+        row_filter (str): One of ``ROW_FILTERS``, or None to deflate the raw bytes.
+        output_path (str): If given, the compressed image is written there for
+            ``decompress_image_with_deflate``.
+        level (int or str): zlib level, or "auto".
+        strategy (str): Key of ``zlib_tuning.STRATEGIES``, ignored with "auto".
+        target_ratio (float): Target ratio for "auto", see ``autotune_zlib``.
+        time_budget (float): Seconds per MB for "auto", see ``autotune_zlib``.
+        image (numpy.ndarray or memoryview): The source already decoded by
+            ``image_loader.load_image``. None decodes ``image_path``.
 
     Returns:
         dict: Metrics including original size, compressed size, compression ratio, 
-              time taken for compression, entropy, and redundancy.
+              time taken for compression, entropy, and redundancy, plus the zlib
+              level and strategy used. With "auto" also the predicted size and
+              encode time next to the actual encode time and the tuning time.
     """
-    # Load the image using OpenCV
-    image = cv2.imread(image_path)
-    if image is None:
-        raise FileNotFoundError(f"Image at path '{image_path}' not found.")
+    # Load the image unless it was decoded already
+    image = source_image(image_path, image)
 
     # Calculate entropy
     entropy = calculate_entropy(image)
 
-    # Flatten the image into a 1D byte array
-    image_data = image.tobytes()
-
     # Record original size in bytes
-    original_size = len(image_data)
+    original_size = image.nbytes
+
+    def encode(pixels, level, strategy):
+        # Filter the rows, then flatten the image into a 1D byte array
+        with phase("transform"):
+            pixel_data = pixels.tobytes() if row_filter is None else filter_rows(pixels, row_filter).tobytes()
+        # Compress the byte data using Deflate (zlib)
+        with phase("entropy_code"):
+            return zlib_compress(pixel_data, level, strategy)
 
     # Start compression timing
-    start_time = time.time()
+    start_time = time.perf_counter()
+
+    tuning = {}
+    if level == "auto":
+        tuning = autotune_zlib(image, encode, target_ratio, time_budget)
+        level, strategy = tuning.pop("level"), tuning.pop("strategy")
+        tuning["time_taken_tuning"] = time.perf_counter() - start_time
 
-    # Compress the byte data using Deflate (zlib)
-    compressed_data = zlib.compress(image_data, level=9)
+    encode_start_time = time.perf_counter()
+    compressed_data = encode(image, level, STRATEGIES[strategy])
 
     # End compression timing
-    time_taken_compress = time.time() - start_time
+    time_taken_compress = time.perf_counter() - start_time
+    if tuning:
+        tuning["time_taken_encode"] = time.perf_counter() - encode_start_time
 
     # Record compressed size in bytes
     compressed_size = len(compressed_data)
@@ -70,6 +284,159 @@ def compress_image_with_deflate(image_path):
     # Calculate redundancy
     redundancy = 1 - (entropy / (log2(256) * compression_ratio)) if compression_ratio > 0 else 0
 
+    if output_path:
+        height, width, channels = image.shape
+        with phase("write"), open(output_path, "wb") as f:
+            f.write(struct.pack(FILTER_HEADER_FORMAT, FILTER_MAGIC, FORMAT_VERSION, height, width, channels,
+                                row_filter is not None))
+            f.write(compressed_data)
+
+    return {
+        "original_size": original_size,
+        "compressed_size": compressed_size,
+        "compression_ratio": compression_ratio,
+        "time_taken_compress": time_taken_compress,
+        "entropy": entropy,
+        "redundancy": redundancy,
+        "zlib_level": level,
+        "zlib_strategy": strategy,
+        **tuning
+    }
+
+
+def decompress_image_with_deflate(input_path, output_image_path=None):
+    """
+    Decompresses a file written by ``compress_image_with_deflate``.
+
+    Args:
+        input_path (str): Path of the compressed file.
+        output_image_path (str): If given, the decoded image is saved there.
+
+    Returns:
+        numpy.ndarray: The decoded image.
+    """
+    with open(input_path, "rb") as f:
+        data = f.read()
+    header_size = struct.calcsize(FILTER_HEADER_FORMAT)
+    magic, version, height, width, channels, filtered = struct.unpack(FILTER_HEADER_FORMAT, data[:header_size])
+    if magic != FILTER_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"'{input_path}' is not a Deflate image file.")
+    image_data = np.frombuffer(zlib.decompress(data[header_size:]), dtype=np.uint8)
+    if filtered:
+        image = unfilter_rows(image_data.reshape(height, -1), (height, width, channels))
+    else:
+        image = image_data.reshape(height, width, channels)
+    if output_image_path:
+        cv2.imwrite(output_image_path, image)
+    return image
+
+
+def compress_block(data, dictionary, level):
+    """
+    Compresses one block as a raw Deflate stream, primed with ``dictionary``.
+
+    Args:
+        data (memoryview): Raw bytes of the block.
+        dictionary (memoryview or None): Up to 32 KiB of data preceding the block.
+        level (int): zlib compression level.
+
+    Returns:
+        bytes: The compressed block.
+    """
+    if dictionary is None:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress_group(data, output, offsets, first_block, block_size):
+    """
+    Decompresses a run of blocks that starts at a restart point. Every block
+    after the first is primed with the last 32 KiB decoded before it.
+
+    Args:
+        data (memoryview): The compressed file.
+        output (memoryview): Raw image bytes, the blocks are written in place.
+        offsets (list): Start and end offsets of the compressed blocks in ``data``.
+        first_block (int): Index of the first block of the run.
+        block_size (int): Raw bytes per block.
+    """
+    dictionary = None
+    for index, (start, end) in enumerate(zip(offsets[:-1], offsets[1:]), first_block):
+        if dictionary is None:
+            decompressor = zlib.decompressobj(-15)
+        else:
+            decompressor = zlib.decompressobj(-15, zdict=dictionary)
+        block = output[index * block_size:(index + 1) * block_size]
+        block[:] = decompressor.decompress(data[start:end]) + decompressor.flush()
+        end = (index + 1) * block_size
+        dictionary = output[max(first_block * block_size, end - DICTIONARY_SIZE):end]
+
+
+def compress_image_with_parallel_deflate(image_path, output_path, block_size=BLOCK_SIZE,
+                                         restart_interval=RESTART_INTERVAL, level=9, workers=None, image=None):
+    """
+    Compresses an image with pigz-style block-parallel Deflate and writes it to a file.
+
+    The raw image bytes are split into blocks of ``block_size`` bytes that are
+    compressed on a thread pool; zlib releases the GIL while it compresses, and
+    the blocks are slices of a memoryview over the image, so no copy of the
+    image is made. Each block is primed with the 32 KiB of data before
+    it as a preset dictionary, except every ``restart_interval``-th
+    block, which is a restart point where decoding can begin. Compressed blocks
+    are written to the file as soon as they are ready, in order, behind a
+    header and a block index.
+
+    Args:
+        image_path (str): Path to the input image.
+        output_path (str): Path of the compressed file.
+        block_size (int): Raw bytes per block.
+        restart_interval (int): Blocks per independently decodable group.
+        level (int): zlib compression level.
+        workers (int): Compression threads, defaults to the number of CPUs.
+        image (numpy.ndarray or memoryview): The source already decoded by
+            ``image_loader.load_image``. None decodes ``image_path``.
+
+    Returns:
+        dict: Metrics with the same keys as ``compress_image_with_deflate``.
+    """
+    image = source_image(image_path, image)
+    entropy = calculate_entropy(image)
+
+    image_data = memoryview(image).cast('B')
+    original_size = len(image_data)
+    block_count = -(-original_size // block_size)
+
+    def tasks():
+        for index in range(block_count):
+            start = index * block_size
+            group_start = (index - index % restart_interval) * block_size
+            dictionary = None if start == group_start else image_data[max(group_start, start - DICTIONARY_SIZE):start]
+            yield image_data[start:start + block_size], dictionary
+
+    start_time = time.perf_counter()
+    height, width, channels = image.shape
+    block_sizes = np.zeros(block_count, dtype='<u4')
+    # Blocks are written while the next ones compress: the writes count as the
+    # write phase and the rest of the pipeline as entropy coding
+    with phase("entropy_code"), open(output_path, "wb") as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        f.write(struct.pack(HEADER_FORMAT, FILE_MAGIC, FORMAT_VERSION, height, width, channels,
+                            block_size, restart_interval, level, block_count))
+        index_offset = f.tell()
+        f.write(block_sizes.tobytes())
+        for index, block in enumerate(executor.map(lambda task: compress_block(*task, level), tasks())):
+            with phase("write"):
+                f.write(block)
+            block_sizes[index] = len(block)
+        f.seek(index_offset)
+        f.write(block_sizes.tobytes())
+    time_taken_compress = time.perf_counter() - start_time
+
+    compressed_size = os.path.getsize(output_path)
+    compression_ratio = original_size / compressed_size
+    redundancy = 1 - (entropy / (log2(256) * compression_ratio))
+
     return {
         "original_size": original_size,
         "compressed_size": compressed_size,
@@ -80,14 +447,72 @@ def compress_image_with_deflate(image_path):
     }
 
 
+def decompress_image_with_parallel_deflate(input_path, output_image_path=None, rows=None, workers=None):
+    """
+    Decompresses a file written by ``compress_image_with_parallel_deflate``.
+
+    Groups of blocks between restart points are decoded in parallel. With
+    ``rows`` only the groups holding those rows are decoded.
+
+    Args:
+        input_path (str): Path of the compressed file.
+        output_image_path (str): If given, the decoded image is saved there.
+        rows (tuple): Optional (first, stop) range of image rows to decode.
+        workers (int): Decompression threads, defaults to the number of CPUs.
+
+    Returns:
+        numpy.ndarray: The decoded image, or the requested rows of it.
+    """
+    with open(input_path, "rb") as f:
+        data = memoryview(f.read())
+    header_size = struct.calcsize(HEADER_FORMAT)
+    magic, version, height, width, channels, block_size, restart_interval, _, block_count = struct.unpack(
+        HEADER_FORMAT, data[:header_size])
+    if magic != FILE_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"'{input_path}' is not a block Deflate file.")
+    block_sizes = np.frombuffer(data, dtype='<u4', count=block_count, offset=header_size)
+    offsets = (header_size + block_sizes.nbytes + np.concatenate([[0], np.cumsum(block_sizes, dtype=np.int64)])).tolist()
+
+    first_row, stop_row = rows or (0, height)
+    row_bytes = width * channels
+    first_block = first_row * row_bytes // block_size
+    stop_block = min(block_count, -(-stop_row * row_bytes // block_size))
+    first_block -= first_block % restart_interval
+
+    image = np.empty(height * row_bytes, dtype=np.uint8)
+    output = memoryview(image)
+    groups = range(first_block, stop_block, restart_interval)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(
+            lambda group: decompress_group(data, output, offsets[group:min(group + restart_interval, stop_block) + 1],
+                                           group, block_size),
+            groups))
+
+    image = image.reshape(height, width, channels)[first_row:stop_row]
+    if output_image_path:
+        cv2.imwrite(output_image_path, image)
+    return image
+
+
 if __name__ == "__main__":
     # Path to your image
     image_path = "Wallpaper_1.jpg"
 
     # Compress the image and retrieve metrics
-    metrics = compress_image_with_deflate(image_path)
+    metrics = compress_image_with_deflate(image_path, output_path="compressed_image.dfl")
 
     # Print the metrics
     print("Compression Metrics:")
     for key, value in metrics.items():
         print(f"{key}: {value}")
+
+    if np.array_equal(cv2.imread(image_path), decompress_image_with_deflate("compressed_image.dfl")):
+        print("Decompression verified: Original and reconstructed images match!")
+
+    # Block-parallel Deflate with a round trip
+    metrics = compress_image_with_parallel_deflate(image_path, "compressed_image.dflb")
+    print("Block Deflate Compression Metrics:")
+    for key, value in metrics.items():
+        print(f"{key}: {value}")
+    if np.array_equal(cv2.imread(image_path), decompress_image_with_parallel_deflate("compressed_image.dflb")):
+        print("Decompression verified: Original and reconstructed images match!")
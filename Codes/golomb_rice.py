@@ -0,0 +1,542 @@
+import numpy as np
+import cv2
+import os
+import struct
+import time
+
+from huffman_image_compression_only import map_stripes
+from image_loader import source_image
+from predictive import (BLOCK_SIZE, PREDICTOR_MODES, compute_prediction_error, image_neighbours, pixel_predictors,
+                        reconstruct_wavefronts)
+from timing import phase
+
+FILE_MAGIC = b'LGR'
+FORMAT_VERSION = 2
+HEADER_FORMAT = '<3sBIIBBHII'
+STRIPE_FORMAT = '<IIIIII'
+
+# LOCO-I gradient thresholds for 8-bit samples. Each of the three local
+# gradients is quantized to -4..4 and the sign of the first non-zero one is
+# folded away, which leaves 365 regular contexts. A pixel whose channels are
+# all in context 0 (a flat neighbourhood) starts run mode. The pixel that ends
+# a run is coded in one of two run interruption contexts: RUN_CONTEXT when its
+# left and top neighbours are equal, RUN_CONTEXT + 1 otherwise.
+GRADIENT_THRESHOLDS = np.array([1, 3, 7, 21])
+DIFFERENCES = np.arange(-255, 256)
+# Quantized gradient of every difference -255..255, times its weight 81, 9 or 1 in the context
+QUANTIZED_GRADIENTS = [weight * np.sign(DIFFERENCES) * np.digitize(np.abs(DIFFERENCES), GRADIENT_THRESHOLDS)
+                       for weight in (81, 9, 1)]
+REGULAR_CONTEXTS = 365
+RUN_CONTEXT = REGULAR_CONTEXTS
+CONTEXT_COUNT = REGULAR_CONTEXTS + 2
+MAX_K = 8
+QUOTIENT_LIMIT = 24
+RESET_BITS = 4  # A, B and N are halved when N reaches 2 ** RESET_BITS
+INITIAL_A = 4
+MIN_C, MAX_C = -128, 127
+# JPEG-LS run length orders: a run is coded in segments of 2 ** RUN_ORDERS[index]
+# pixels, and index moves up after every full segment and down after every run
+# that ends before the end of its row.
+RUN_ORDERS = (0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 9, 10, 11, 12, 13, 14, 15)
+
+
+def gradient_contexts(n, top_row, left_column):
+    """
+    Quantizes the local gradients NE - N, N - NW and NW - W into LOCO-I contexts.
+
+    Gradients that would read outside the image are 0: all three on the top row,
+    and the two that involve the left neighbour on the left column.
+
+    :param n: Neighbour dict as built by ``image_neighbours`` or the wavefront
+              decoder, with int16 arrays of shape (..., channels).
+    :param top_row: Boolean array broadcastable to shape (...), True on the top row.
+    :param left_column: Boolean array broadcastable to shape (...), True on the left column.
+    :return: (context, negative) where context is in 0..364 and negative tells
+             whether the residual sign is flipped for this context.
+    """
+    left = QUANTIZED_GRADIENTS[1][n['N'] - n['NW'] + 255] + QUANTIZED_GRADIENTS[2][n['NW'] - n['W'] + 255]
+    context = QUANTIZED_GRADIENTS[0][n['NE'] - n['N'] + 255] + np.where(left_column[..., None], 0, left)
+    context = np.where(top_row[..., None], 0, context)
+    return np.abs(context), context < 0
+
+
+def run_interruption(n, top_row):
+    """
+    Prediction, context and sign flip of the pixel that ends a run, per channel:
+    the left neighbour when it equals the top one, the top neighbour otherwise.
+    On the top row the top neighbour is not decoded yet and the left one is used.
+    """
+    left = n['W']
+    top = np.where(top_row[..., None], left, n['N'])
+    equal = left == top
+    return np.where(equal, left, top), np.where(equal, RUN_CONTEXT, RUN_CONTEXT + 1), left > top
+
+
+def wrap(errors):
+    """Reduces errors modulo 256 to -128..127."""
+    return ((errors + 128) & 255) - 128
+
+
+def decorrelate(errors):
+    """
+    Subtracts the prediction error of the green channel from those of the blue
+    and red channels, which mostly follow it.
+    """
+    errors = errors.astype(np.int16)
+    errors[..., ::2] -= errors[..., 1:2]
+    return errors
+
+
+def correlate(errors):
+    """Inverse of ``decorrelate``."""
+    errors = errors.copy()
+    errors[..., ::2] += errors[..., 1:2]
+    return errors
+
+
+def channel_contexts(context):
+    """Gives every channel its own contexts, flattening samples in pixel then channel order."""
+    return (context + CONTEXT_COUNT * np.arange(context.shape[-1])).ravel()
+
+
+def bit_length(values):
+    """Number of bits of every non-negative integer in ``values``."""
+    return np.frexp(values)[1]
+
+
+class ContextStatistics:
+    """
+    Running LOCO-I statistics of every context of every channel: A, the sum
+    of absolute errors, B and C, the accumulated bias and the correction it
+    drives, and N, the sample count. Samples are indexed by ``channel_contexts``.
+    Encoder and decoder update them once per wavefront.
+    """
+
+    def __init__(self, channels):
+        self.size = channels * CONTEXT_COUNT
+        self.run_interruption = np.arange(self.size) % CONTEXT_COUNT >= REGULAR_CONTEXTS
+        self.a = np.full(self.size, INITIAL_A, dtype=np.int64)
+        self.b = np.zeros(self.size, dtype=np.int64)
+        self.c = np.zeros(self.size, dtype=np.int64)
+        self.n = np.ones(self.size, dtype=np.int64)
+        self.k = self.rice_parameters()
+
+    def rice_parameters(self):
+        """The smallest k with N * 2 ** k >= A of every context, capped at ``MAX_K``."""
+        k = np.maximum(bit_length(self.a) - bit_length(self.n), 0)
+        return np.minimum(k + (self.n << k < self.a), MAX_K)
+
+    def parameters(self, context):
+        """
+        Returns the Rice parameter k of every sample and whether its context
+        uses the mapping that favours negative errors (k = 0 and 2B <= -N).
+        """
+        k = self.k[context]
+        return k, (k == 0) & (2 * self.b[context] <= -self.n[context])
+
+    def update(self, context, errors):
+        """Adds one wavefront of bias-corrected errors and moves the bias corrections."""
+        self.a += np.bincount(context, np.abs(errors), minlength=self.size).astype(np.int64)
+        self.b += np.bincount(context, errors, minlength=self.size).astype(np.int64)
+        self.n += np.bincount(context, minlength=self.size)
+        # Halve until N < 2 ** RESET_BITS. The shift rounds B down, as LOCO-I does.
+        shift = np.maximum(bit_length(self.n) - RESET_BITS, 0)
+        self.a >>= shift
+        self.b >>= shift
+        self.n >>= shift
+        # C moves by the mean error, rounded up, and B keeps the remainder in
+        # (-N, 0]. Run interruption contexts have no bias correction.
+        correction = np.clip(self.c - (-self.b // self.n), MIN_C, MAX_C)
+        correction[self.run_interruption] = 0
+        self.b -= (correction - self.c) * self.n
+        self.c = correction
+        self.b = np.clip(self.b, 1 - self.n, 0)
+        self.b[self.run_interruption] = 0
+        self.k = self.rice_parameters()
+
+
+def map_errors(errors, negative_mapping):
+    """Folds errors to 0, -1, 1, -2, ... -> 0, 1, 2, 3, ..., or -1, 0, -2, 1, ... where negative_mapping is set."""
+    return np.where(negative_mapping, np.where(errors >= 0, 2 * errors + 1, -2 * errors - 2),
+                    np.where(errors >= 0, 2 * errors, -2 * errors - 1))
+
+
+def unmap_errors(values, negative_mapping):
+    """Inverse of ``map_errors``."""
+    odd = (values & 1).astype(bool)
+    return np.where(odd != negative_mapping, -(values >> 1) - 1, values >> 1)
+
+
+def write_unary(quotients):
+    """Writes every quotient q as q zero bits followed by a one bit."""
+    bits = np.zeros(int(quotients.sum()) + len(quotients), dtype=np.uint8)
+    bits[np.cumsum(quotients + 1) - 1] = 1
+    return np.packbits(bits).tobytes()
+
+
+def read_unary(data, count):
+    """Reads ``count`` quotients written by ``write_unary``."""
+    ends = np.flatnonzero(np.unpackbits(np.frombuffer(data, dtype=np.uint8)))[:count]
+    return np.diff(ends, prepend=-1) - 1
+
+
+def write_bits(values, widths, chunk_size=1 << 18):
+    """
+    Writes each value in ``widths`` bits, most significant bit first, with no
+    padding between values.
+    """
+    ends = np.cumsum(widths)
+    bits = np.zeros(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    for start in range(0, len(values), chunk_size):
+        chunk_widths = widths[start:start + chunk_size].astype(np.int64)
+        chunk_ends = ends[start:start + chunk_size]
+        first = int(chunk_ends[0] - chunk_widths[0])
+        offsets = np.arange(int(chunk_ends[-1]) - first) - np.repeat(chunk_ends - chunk_widths - first, chunk_widths)
+        shifts = np.repeat(chunk_widths, chunk_widths) - 1 - offsets
+        bits[first:int(chunk_ends[-1])] = (np.repeat(values[start:start + chunk_size], chunk_widths) >> shifts) & 1
+    return np.packbits(bits).tobytes()
+
+
+def read_bits(buffer, offsets, widths):
+    """
+    Reads values of up to 9 bits at the given bit offsets of ``buffer``, which
+    must be padded with 2 zero bytes.
+    """
+    byte_offsets = offsets >> 3
+    words = (buffer[byte_offsets].astype(np.int64) << 8) | buffer[byte_offsets + 1]
+    return (words >> (16 - (offsets & 7) - widths)) & ((1 << widths) - 1)
+
+
+def as_buffer(data):
+    return np.frombuffer(data + bytes(2), dtype=np.uint8)
+
+
+def write_runs(lengths, remaining):
+    """
+    Codes run lengths the JPEG-LS way. Every full segment of
+    2 ** RUN_ORDERS[index] pixels is a one bit. A run that stops before the
+    end of its row ends with a zero bit and the rest of its length in
+    RUN_ORDERS[index] bits; a run that reaches the end of its row (its length
+    equals ``remaining``) only adds a one bit for a partial last segment.
+    """
+    bits = []
+    index = 0
+    for length, left in zip(lengths.tolist(), remaining.tolist()):
+        end_of_row = length == left
+        while length >= 1 << RUN_ORDERS[index]:
+            bits.append(1)
+            length -= 1 << RUN_ORDERS[index]
+            index = min(index + 1, len(RUN_ORDERS) - 1)
+        if end_of_row:
+            if length:
+                bits.append(1)
+        else:
+            order = RUN_ORDERS[index]
+            bits.append(0)
+            bits.extend((length >> shift) & 1 for shift in range(order - 1, -1, -1))
+            index = max(index - 1, 0)
+    return np.packbits(np.array(bits, dtype=np.uint8)).tobytes()
+
+
+class RunReader:
+    """Reads the run lengths written by ``write_runs`` one at a time."""
+
+    def __init__(self, data):
+        self.bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8)).tobytes()
+        self.position = 0
+        self.index = 0
+
+    def read(self, remaining):
+        """Returns the length of the next run, which has ``remaining`` pixels left in its row."""
+        length = 0
+        while True:
+            bit = self.bits[self.position]
+            self.position += 1
+            if not bit:
+                break
+            segment = 1 << RUN_ORDERS[self.index]
+            if length + segment > remaining:
+                return remaining
+            length += segment
+            self.index = min(self.index + 1, len(RUN_ORDERS) - 1)
+            if length == remaining:
+                return remaining
+        order = RUN_ORDERS[self.index]
+        for bit in self.bits[self.position:self.position + order]:
+            length += bit << (order - 1)
+            order -= 1
+        self.position += RUN_ORDERS[self.index]
+        self.index = max(self.index - 1, 0)
+        return length
+
+
+def find_runs(image, flat):
+    """
+    Finds the runs of run mode in row-major order. A run starts at a pixel in
+    a flat context that is neither in nor ending an earlier run, and not in
+    the left column, and covers the pixels equal to its left neighbour.
+
+    :param flat: Boolean array of shape (height, width), True where every
+                 channel is in context 0.
+    :return: (starts, lengths) as flat pixel indices and pixel counts.
+    """
+    height, width, _ = image.shape
+    total = height * width
+    positions = np.arange(total + 1)
+    same = np.zeros(total + 1, dtype=bool)
+    same[:total].reshape(height, width)[:, 1:] = (image[:, 1:] == image[:, :-1]).all(axis=2)
+    can_start = np.zeros(total + 1, dtype=bool)
+    can_start[:total].reshape(height, width)[:, 1:] = flat[:, 1:]
+    # Next position >= p that breaks a run, and next one that can start a run
+    next_break = np.minimum.accumulate(np.where(same, total, positions)[::-1])[::-1]
+    next_start = np.minimum.accumulate(np.where(can_start, positions, total)[::-1])[::-1]
+
+    starts, lengths = [], []
+    start = int(next_start[0])
+    while start < total:
+        end = int(next_break[start])
+        starts.append(start)
+        lengths.append(end - start)
+        # A run cut short by a different pixel ends with that pixel, which is
+        # coded as a run interruption; the next run can start after it.
+        start = int(next_start[end if end % width == 0 else end + 1])
+    return np.array(starts, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def encode_stripe(image, predictor, block_size):
+    """
+    Codes one independently decodable stripe.
+
+    Samples are visited wavefront by wavefront (pixels with the same
+    2 * i + j, then by row and channel), the order in which the decoder
+    reconstructs them. Pixels in runs are coded by the run lengths alone. Every
+    other sample is corrected by the bias of its context and Rice coded with
+    the k of its context, with LOCO-I statistics updated after every
+    wavefront, so the decoder can handle a whole wavefront at once.
+
+    :return: (stripe bytes, histogram of the residuals modulo 256)
+    """
+    height, width, channels = image.shape
+    with phase("transform"):
+        prediction_error, predictor_map = compute_prediction_error(image, predictor, block_size)
+        n = image_neighbours(image.astype(np.int16))
+        top_row = (np.arange(height) == 0)[:, None]
+        context, negative = gradient_contexts(n, top_row, (np.arange(width) == 0)[None, :])
+        starts, lengths = find_runs(image, (context == 0).all(axis=2))
+
+        # Run interruptions replace the prediction and context of their pixel.
+        ends = starts + lengths
+        interruptions = ends[ends % width != 0]
+        rows, columns = np.divmod(interruptions, width)
+        interrupted_n = {key: n[key][rows, columns] for key in ('W', 'N')}
+        predicted, context[rows, columns], negative[rows, columns] = run_interruption(interrupted_n, rows == 0)
+        prediction_error[rows, columns] = image[rows, columns] - predicted
+        errors = decorrelate(prediction_error)
+        errors = np.where(negative, -errors, errors)
+
+        # Coded pixels in wavefront order; pixels in runs are left out.
+        in_run = np.zeros(height * width + 1, dtype=np.int64)
+        np.add.at(in_run, starts, 1)
+        np.add.at(in_run, ends, -1)
+        coded = np.cumsum(in_run[:-1]) == 0
+        wavefront = (2 * np.arange(height)[:, None] + np.arange(width)).ravel()
+        order = np.flatnonzero(coded)
+        order = order[np.argsort(wavefront[order], kind='stable')]
+        bounds = np.cumsum(np.bincount(wavefront[order], minlength=2 * (height - 1) + width)) * channels
+        context = channel_contexts(context.reshape(-1, channels)[order])
+        errors = errors.reshape(-1, channels)[order].ravel()
+
+    values = np.empty(len(errors), dtype=np.int64)
+    k = np.empty(len(errors), dtype=np.int64)
+    statistics = ContextStatistics(channels)
+    for start, end in zip(np.concatenate(([0], bounds[:-1])), bounds):
+        if start == end:
+            continue
+        wavefront_context = context[start:end]
+        corrected = wrap(errors[start:end] - statistics.c[wavefront_context])
+        k[start:end], negative_mapping = statistics.parameters(wavefront_context)
+        values[start:end] = map_errors(corrected, negative_mapping)
+        statistics.update(wavefront_context, corrected)
+    quotients = values >> k
+    escaped = quotients >= QUOTIENT_LIMIT
+    quotients = np.minimum(quotients, QUOTIENT_LIMIT)
+    remainders = np.where(escaped, values, values & ((1 << k) - 1))
+    widths = np.where(escaped, 8, k)
+
+    # Runs in the order the decoder meets their first pixel.
+    run_rows, run_columns = np.divmod(starts, width)
+    run_order = np.lexsort((run_rows, 2 * run_rows + run_columns))
+
+    side_map = predictor_map.tobytes() if predictor == 'adaptive' else b''
+    streams = [write_unary(quotients), write_bits(remainders, widths),
+               write_runs(lengths[run_order], width - run_columns[run_order])]
+    counts = struct.pack(STRIPE_FORMAT, len(values), len(starts), len(side_map), *map(len, streams))
+    histogram = np.bincount(prediction_error.astype(np.uint8).ravel(), minlength=256)
+    return counts + side_map + b''.join(streams), histogram
+
+
+def decode_stripe(data, shape, predictor, block_size):
+    """Decodes one stripe written by ``encode_stripe``."""
+    height, width, channels = shape
+    header_size = struct.calcsize(STRIPE_FORMAT)
+    sample_count, run_count, map_size, *stream_sizes = struct.unpack(STRIPE_FORMAT, data[:header_size])
+    position = header_size + map_size
+    streams = []
+    for size in stream_sizes:
+        streams.append(data[position:position + size])
+        position += size
+    if predictor == 'adaptive':
+        map_shape = (-(-height // block_size), -(-width // block_size))
+        predictor_map = np.frombuffer(data[header_size:header_size + map_size], dtype=np.uint8).reshape(map_shape)
+        predictors = pixel_predictors(predictor_map, block_size, height, width)
+    else:
+        predictors = np.full((height, width), PREDICTOR_MODES.index(predictor), dtype=np.uint8)
+
+    # Quotients are self-delimiting and are decoded up front, the remainders
+    # need the k of each wavefront.
+    quotients = read_unary(streams[0], sample_count)
+    remainder_buffer = as_buffer(streams[1])
+    runs = RunReader(streams[2])
+    statistics = ContextStatistics(channels)
+    run_end = np.full(height, -1, dtype=np.int64)  # Column after the current run of every row
+    run_value = np.zeros((height, channels), dtype=np.int16)
+    state = {'sample': 0, 'bit': 0}
+
+    def residuals(neighbours, rows, columns, predicted):
+        top_row = rows == 0
+        context, negative = gradient_contexts(neighbours, top_row, columns == 0)
+        ends = run_end[rows]
+        starting = (columns > ends) & (columns > 0) & (context == 0).all(axis=1)
+        if starting.any():
+            for index in np.flatnonzero(starting):
+                run_end[rows[index]] = columns[index] + runs.read(width - columns[index])
+            run_value[rows[starting]] = neighbours['W'][starting]
+            ends = run_end[rows]
+        in_run = columns < ends
+        interrupted = columns == ends
+
+        residual = np.zeros(predicted.shape, dtype=np.int64)
+        if interrupted.any():
+            interrupted_n = {key: neighbours[key][interrupted] for key in ('W', 'N')}
+            interruption, context[interrupted], negative[interrupted] = run_interruption(interrupted_n,
+                                                                                          top_row[interrupted])
+            residual[interrupted] = interruption - predicted[interrupted]
+        coded = slice(None)
+        if in_run.any():
+            residual[in_run] = run_value[rows[in_run]] - predicted[in_run]
+            coded = ~in_run
+
+        coded_context = channel_contexts(context[coded])
+        end = state['sample'] + len(coded_context)
+        quotient = quotients[state['sample']:end]
+        k, negative_mapping = statistics.parameters(coded_context)
+        escaped = quotient == QUOTIENT_LIMIT
+        widths = np.where(escaped, 8, k)
+        offsets = state['bit'] + np.cumsum(widths) - widths
+        remainders = read_bits(remainder_buffer, offsets, widths)
+        corrected = unmap_errors(np.where(escaped, remainders, (quotient << k) | remainders), negative_mapping)
+        errors = corrected + statistics.c[coded_context]
+        errors = np.where(negative[coded].ravel(), -errors, errors).reshape(-1, channels)
+        residual[coded] += correlate(errors)
+        statistics.update(coded_context, corrected)
+        state['sample'] = end
+        state['bit'] += int(widths.sum())
+        return residual
+
+    return reconstruct_wavefronts(shape, predictors, residuals, wide=True)
+
+
+def golomb_rice_compression(image_path, output_path, predictor='med', block_size=BLOCK_SIZE, stripe_rows=None,
+                            workers=None, image=None):
+    """
+    Compresses an image with predictive coding followed by JPEG-LS style
+    context-adaptive Golomb-Rice coding of the residuals, with bias
+    cancellation and run mode.
+
+    :param predictor: One of ``predictive.PREDICTOR_MODES``.
+    :param stripe_rows: Split the image into independently coded stripes of this
+                        many rows, encoded and decoded on ``workers`` processes.
+    :param image: The source already decoded by ``image_loader.load_image``, an
+                  array or memoryview. ``None`` decodes ``image_path``.
+    """
+    if predictor not in PREDICTOR_MODES:
+        raise ValueError(f"Unknown predictor {predictor!r}, expected one of {PREDICTOR_MODES}")
+    start_time = time.perf_counter()
+
+    image = source_image(image_path, image)
+    height, width, channels = image.shape
+    stripe_rows = stripe_rows or height
+    # Stripes encoded in this process split their time into the transform and
+    # entropy coding phases, stripes encoded on a pool all count as entropy coding
+    with phase("entropy_code"):
+        stripes, histograms = zip(*map_stripes(encode_stripe, [(image[row:row + stripe_rows], predictor, block_size)
+                                                               for row in range(0, height, stripe_rows)], workers))
+
+    # Entropy of the residuals modulo 256
+    value_counts = np.sum(histograms, axis=0)
+    probabilities = value_counts[value_counts > 0] / image.size
+    entropy = -np.sum(probabilities * np.log2(probabilities))
+    redundancy = 8 - entropy
+
+    header = struct.pack(HEADER_FORMAT, FILE_MAGIC, FORMAT_VERSION, height, width, channels,
+                         PREDICTOR_MODES.index(predictor), block_size, stripe_rows, len(stripes))
+    with phase("write"), open(output_path, "wb") as f:
+        f.write(header)
+        f.write(np.array([len(stripe) for stripe in stripes], dtype='<u4').tobytes())
+        for stripe in stripes:
+            f.write(stripe)
+
+    end_time = time.perf_counter()
+
+    original_size = os.path.getsize(image_path)
+    compressed_size = os.path.getsize(output_path)
+    return {
+        "original_size": original_size,
+        "compressed_size": compressed_size,
+        "compression_ratio": original_size / compressed_size,
+        "time_taken": end_time - start_time,
+        "entropy": entropy,
+        "redundancy": redundancy,
+    }
+
+
+def golomb_rice_decompression(compressed_path, output_image_path=None, workers=None):
+    """
+    Decompresses a file written by ``golomb_rice_compression``. Stripes are
+    decoded in parallel on ``workers`` processes.
+    """
+    with open(compressed_path, "rb") as f:
+        data = f.read()
+    header_size = struct.calcsize(HEADER_FORMAT)
+    magic, version, height, width, channels, predictor, block_size, stripe_rows, stripe_count = struct.unpack(
+        HEADER_FORMAT, data[:header_size])
+    if magic != FILE_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{compressed_path} is not a Golomb-Rice coded image")
+
+    sizes = np.frombuffer(data, dtype='<u4', count=stripe_count, offset=header_size)
+    position = header_size + sizes.nbytes
+    tasks = []
+    for index, size in enumerate(sizes):
+        rows = min(stripe_rows, height - index * stripe_rows)
+        tasks.append((data[position:position + size], (rows, width, channels), PREDICTOR_MODES[predictor], block_size))
+        position += int(size)
+    reconstructed_image = np.concatenate(map_stripes(decode_stripe, tasks, workers))
+
+    if output_image_path:
+        cv2.imwrite(output_image_path, reconstructed_image)
+    return reconstructed_image
+
+
+if __name__ == "__main__":
+    input_image_path = "Wallpaper_1.jpg"  # Replace with your image path
+    compressed_path = "compressed_image.lgr"
+    reconstructed_image_path = "reconstructed_image.png"
+
+    compression_result = golomb_rice_compression(input_image_path, compressed_path)
+    print("Compression Results:", compression_result)
+
+    reconstructed_image = golomb_rice_decompression(compressed_path, reconstructed_image_path)
+    if np.array_equal(cv2.imread(input_image_path), reconstructed_image):
+        print("Decompression verified: Original and reconstructed images match!")
+    else:
+        print("Decompression failed: Original and reconstructed images do not match.")
@@ -2,90 +2,587 @@ import cv2
 import heapq
 import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import time
 from math import log2
 
-class HuffmanNode:
-    def __init__(self, char, freq):
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
-
-    def __lt__(self, other):
-        return self.freq < other.freq
-
-def build_huffman_tree(data):
-    freq = defaultdict(int)
-    for pixel in data:
-        freq[pixel] += 1
-    heap = [HuffmanNode(char, f) for char, f in freq.items()]
-    heapq.heapify(heap)
-    while len(heap) > 1:
-        left = heapq.heappop(heap)
-        right = heapq.heappop(heap)
-        merged = HuffmanNode(None, left.freq + right.freq)
-        merged.left = left
-        merged.right = right
-        heapq.heappush(heap, merged)
-    return heap[0]
-
-def generate_huffman_codes(node, current_code="", codes=None):
-    if codes is None:
-        codes = {}
-    if node:
-        if node.char is not None:
-            codes[node.char] = current_code
-        generate_huffman_codes(node.left, current_code + '0', codes)
-        generate_huffman_codes(node.right, current_code + '1', codes)
-    return codes
-
-def encode_data(data, huffman_codes):
-    return ''.join(huffman_codes[pixel] for pixel in data)
-
-def write_binary_file(encoded_data, filename, huffman_codes, image_shape):
+from image_loader import source_image
+from timing import phase
+
+# Canonical codes are limited to MAX_CODE_LENGTH bits so decode tables stay bounded.
+MAX_CODE_LENGTH = 15
+# Files written since canonical codes start with FILE_MAGIC and a version byte.
+# Files without the magic use the original symbol/length/code header.
+FILE_MAGIC = b'HUF'
+FORMAT_VERSION = 4
+# Code table layouts: one table, one per channel, or one per channel and
+# quantized value of the sample above (CONTEXT_BITS bits by default).
+TABLE_MODES = ('single', 'channel', 'context')
+CONTEXT_BITS = 4
+
+# Width of the multi-bit decode table probe; longer codes are resolved per length.
+LOOKUP_BITS = 11
+# The decoder's Python loop visits one code out of every 2 ** JUMP_LOG2.
+JUMP_LOG2 = 4
+
+def compute_code_lengths(counts, max_length=MAX_CODE_LENGTH):
+    """
+    Computes optimal Huffman code lengths no longer than ``max_length`` bits
+    with the package-merge algorithm.
+
+    :param counts: Histogram of the symbols, e.g. ``np.bincount(data, minlength=256)``.
+    :param max_length: Longest code length allowed.
+    :return: uint8 array with the code length of every symbol, 0 for unused ones.
+    """
+    code_lengths = np.zeros(len(counts), dtype=np.uint8)
+    symbols = np.flatnonzero(counts).tolist()
+    if len(symbols) == 1:
+        code_lengths[symbols[0]] = 1
+        return code_lengths
+    if len(symbols) > 1 << max_length:
+        raise ValueError(f"{len(symbols)} symbols do not fit in {max_length}-bit codes")
+
+    # Each item is (weight, symbols below it). Every round pairs up the
+    # current list into packages and merges them back with the leaves.
+    leaves = sorted((int(counts[symbol]), (symbol,)) for symbol in symbols)
+    items = leaves
+    for _ in range(max_length - 1):
+        packages = [
+            (items[i][0] + items[i + 1][0], items[i][1] + items[i + 1][1])
+            for i in range(0, len(items) - 1, 2)
+        ]
+        items = list(heapq.merge(leaves, packages, key=lambda item: item[0]))
+
+    # A symbol's code length is the number of selected items it appears in.
+    for _, members in items[:2 * len(symbols) - 2]:
+        for symbol in members:
+            code_lengths[symbol] += 1
+    return code_lengths
+
+def generate_canonical_codes(code_lengths):
+    """
+    Assigns canonical Huffman codes from a table of code lengths.
+
+    Codes are handed out in order of (length, symbol), so encoder and decoder
+    rebuild the same ``{symbol: '0101...'}`` dict from the lengths alone.
+    """
+    huffman_codes = {}
+    code = 0
+    previous_length = 0
+    for symbol in sorted(np.flatnonzero(code_lengths).tolist(), key=lambda s: (code_lengths[s], s)):
+        length = int(code_lengths[symbol])
+        code <<= length - previous_length
+        huffman_codes[symbol] = format(code, f'0{length}b')
+        code += 1
+        previous_length = length
+    return huffman_codes
+
+def build_code_table(huffman_codes):
+    """
+    Turns a ``{symbol: '0101...'}`` code dict into lookup tables indexed by symbol.
+
+    Returns ``(bit_table, code_lengths)`` where ``bit_table[symbol]`` holds the
+    code bits left-aligned in ``max_length`` uint8 columns.
+    """
+    code_lengths = np.zeros(256, dtype=np.uint8)
+    max_length = max((len(code) for code in huffman_codes.values()), default=0)
+    bit_table = np.zeros((256, max_length), dtype=np.uint8)
+    for symbol, code in huffman_codes.items():
+        code_lengths[symbol] = len(code)
+        bit_table[symbol, :len(code)] = np.frombuffer(code.encode('ascii'), dtype=np.uint8) - ord('0')
+    return bit_table, code_lengths
+
+def encode_data(data, huffman_codes, chunk_size=1 << 20):
+    """
+    Packs the Huffman codes of ``data`` MSB-first into a uint8 buffer.
+
+    The stream is followed by 1-8 zero padding bits, exactly like the old
+    text bitstring, so the output is byte-compatible with earlier files.
+    Pixels are mapped through the code table ``chunk_size`` at a time, which
+    bounds the working memory to a few bytes per pixel of the current chunk.
+    """
+    bit_table, code_lengths = build_code_table(huffman_codes)
+    bit_mask = np.arange(bit_table.shape[1]) < code_lengths[:, None]
+    packed_chunks = []
+    carry = np.zeros(0, dtype=np.uint8)
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        bits = np.concatenate((carry, bit_table[chunk][bit_mask[chunk]]))
+        full_bits = len(bits) - len(bits) % 8
+        packed_chunks.append(np.packbits(bits[:full_bits]))
+        carry = bits[full_bits:]
+    # np.packbits zero-fills the last partial byte; a whole zero byte is added
+    # when the stream already ends on a byte boundary.
+    packed_chunks.append(np.packbits(carry) if len(carry) else np.zeros(1, dtype=np.uint8))
+    return np.concatenate(packed_chunks)
+
+def context_buckets(plane, context_bits, stripe_rows=None):
+    """
+    Quantizes the top neighbour of every sample of a ``(rows, width)`` plane
+    into ``2 ** context_bits`` buckets. The first row of every stripe has no
+    usable neighbour above it and falls into bucket 0.
+    """
+    buckets = np.zeros(plane.shape, dtype=np.uint8)
+    buckets[1:] = plane[:-1] >> (8 - context_bits)
+    if stripe_rows:
+        buckets[::stripe_rows] = 0
+    return buckets
+
+def table_histograms(image, table_mode='single', context_bits=CONTEXT_BITS, stripe_rows=None):
+    """
+    Returns one 256-bin histogram per code table, in the order the tables are
+    stored: a single table, one per channel, or one per (channel, bucket).
+    """
+    if table_mode == 'single':
+        return np.bincount(image.ravel(), minlength=256)[None]
+    planes = [image[:, :, channel] for channel in range(image.shape[2])]
+    if table_mode == 'channel':
+        return np.stack([np.bincount(plane.ravel(), minlength=256) for plane in planes])
+    histograms = []
+    for plane in planes:
+        symbols = context_buckets(plane, context_bits, stripe_rows).astype(np.intp) << 8
+        symbols |= plane
+        histograms.append(np.bincount(symbols.ravel(), minlength=256 << context_bits).reshape(-1, 256))
+    return np.concatenate(histograms)
+
+def split_streams(stripe, table_mode='single', context_bits=CONTEXT_BITS):
+    """Splits a ``(rows, width, channels)`` stripe into one symbol stream per code table."""
+    if table_mode == 'single':
+        return [stripe.ravel()]
+    planes = [stripe[:, :, channel] for channel in range(stripe.shape[2])]
+    if table_mode == 'channel':
+        return [plane.ravel() for plane in planes]
+    streams = []
+    for plane in planes:
+        buckets = context_buckets(plane, context_bits)
+        streams.extend(plane[buckets == bucket] for bucket in range(1 << context_bits))
+    return streams
+
+def merge_streams(streams, stripe_shape, table_mode='single', context_bits=CONTEXT_BITS):
+    """
+    Inverse of ``split_streams``. In context mode the buckets of a row depend
+    on the decoded row above, so rows are rebuilt one at a time.
+    """
+    if table_mode == 'single':
+        return streams[0].reshape(stripe_shape)
+    rows, width, channels = stripe_shape
+    stripe = np.empty(stripe_shape, dtype=np.uint8)
+    if table_mode == 'channel':
+        for channel in range(channels):
+            stripe[:, :, channel] = streams[channel].reshape(rows, width)
+        return stripe
+    num_buckets = 1 << context_bits
+    for channel in range(channels):
+        plane = np.empty((rows, width), dtype=np.uint8)
+        bucket_streams = streams[channel * num_buckets:(channel + 1) * num_buckets]
+        stream_positions = np.zeros(num_buckets, dtype=np.intp)
+        for row in range(rows):
+            if row == 0:
+                buckets = np.zeros(width, dtype=np.uint8)
+            else:
+                buckets = plane[row - 1] >> (8 - context_bits)
+            # Samples of one bucket come out of that bucket's stream in row order.
+            order = np.argsort(buckets, kind='stable')
+            bucket_counts = np.bincount(buckets, minlength=num_buckets)
+            plane[row, order] = np.concatenate([
+                bucket_streams[bucket][stream_positions[bucket]:stream_positions[bucket] + bucket_counts[bucket]]
+                for bucket in range(num_buckets)
+            ])
+            stream_positions += bucket_counts
+        stripe[:, :, channel] = plane
+    return stripe
+
+def encode_stripe(stripe, tables, table_mode='single', context_bits=CONTEXT_BITS):
+    """Encodes one stripe; returns the packed stream and symbol count of every table."""
+    streams = split_streams(stripe, table_mode, context_bits)
+    return [encode_data(stream, codes) for stream, codes in zip(streams, tables)], [len(stream) for stream in streams]
+
+def decode_stripe(encoded_streams, tables, stream_counts, stripe_shape, table_mode='single', context_bits=CONTEXT_BITS):
+    """Decodes the streams of one stripe back into a ``(rows, width, channels)`` array."""
+    streams = [decode_data(data, codes, count) for data, codes, count in zip(encoded_streams, tables, stream_counts)]
+    return merge_streams(streams, stripe_shape, table_mode, context_bits)
+
+def write_binary_file(encoded_stripes, stream_counts, filename, tables, image_shape, stripe_rows=None,
+                      table_mode='single', context_bits=CONTEXT_BITS):
+    """
+    Writes a ``.huf`` file with a compact header for canonical codes.
+
+    Layout: ``FILE_MAGIC``, version byte, width and height (4 bytes each),
+    channels (1 byte), rows per stripe (4 bytes), table mode and context bits
+    (1 byte each), a bitmap of the tables that code any symbol, the 256 code
+    lengths of each of those tables packed as 4-bit nibbles (128 bytes per
+    table), a bitmap of the non-empty streams of those tables (stripe by
+    stripe), the stream offset index (one 8-byte offset per non-empty stream
+    plus the end offset, relative to the first stream), the symbol count of
+    every non-empty stream (8 bytes each), then the byte-aligned non-empty
+    streams stripe by stripe. Bitmaps are packed MSB-first. Context buckets
+    that never occur therefore cost one bit instead of a table and an index
+    entry per stripe.
+    """
+    height, width, channels = image_shape
+    stripe_rows = stripe_rows or max(height, 1)
+    table_lengths = [build_code_table(huffman_codes)[1] for huffman_codes in tables]
+    present_tables = np.array([lengths.any() for lengths in table_lengths], dtype=bool)
+    stream_counts = np.asarray(stream_counts, dtype=np.int64).reshape(len(encoded_stripes), len(tables))
+    present_streams = stream_counts > 0
+    streams = [stream for stripe, counts in zip(encoded_stripes, stream_counts)
+               for stream, count in zip(stripe, counts) if count]
+    stream_offsets = np.cumsum([0] + [len(stream) for stream in streams])
     with open(filename, 'wb') as f:
-        height, width, channels = image_shape
+        f.write(FILE_MAGIC)
+        f.write(FORMAT_VERSION.to_bytes(1, 'big'))
         f.write(width.to_bytes(4, 'big'))
         f.write(height.to_bytes(4, 'big'))
         f.write(channels.to_bytes(1, 'big'))
-        f.write(len(huffman_codes).to_bytes(4, 'big'))
-        for pixel, code in huffman_codes.items():
-            f.write(int(pixel).to_bytes(1, 'big'))
-            f.write(len(code).to_bytes(1, 'big'))
-            f.write(int(code, 2).to_bytes((len(code) + 7) // 8, 'big'))
-        padding = 8 - len(encoded_data) % 8
-        encoded_data += '0' * padding
-        for i in range(0, len(encoded_data), 8):
-            f.write(bytes([int(encoded_data[i:i+8], 2)]))
-
-def process_image(input_image_path, output_file_path):
-    image = cv2.imread(input_image_path)
+        f.write(stripe_rows.to_bytes(4, 'big'))
+        f.write(TABLE_MODES.index(table_mode).to_bytes(1, 'big'))
+        f.write(context_bits.to_bytes(1, 'big'))
+        f.write(np.packbits(present_tables).tobytes())
+        for code_lengths in table_lengths:
+            if not code_lengths.any():
+                continue
+            if code_lengths.max() > MAX_CODE_LENGTH:
+                raise ValueError(f"Code lengths above {MAX_CODE_LENGTH} bits do not fit in the header")
+            f.write(((code_lengths[0::2] << 4) | code_lengths[1::2]).tobytes())
+        f.write(np.packbits(present_streams[:, present_tables]).tobytes())
+        f.write(stream_offsets.astype('>u8').tobytes())
+        f.write(stream_counts[present_streams].astype('>u8').tobytes())
+        for stream in streams:
+            f.write(stream.tobytes())
+
+def read_code_lengths(f):
+    """Reads 256 code lengths packed as 4-bit nibbles."""
+    packed_lengths = np.frombuffer(f.read(128), dtype=np.uint8)
+    code_lengths = np.empty(256, dtype=np.uint8)
+    code_lengths[0::2] = packed_lengths >> 4
+    code_lengths[1::2] = packed_lengths & 0x0F
+    return code_lengths
+
+def read_bitmap(f, count):
+    """Reads ``count`` flags packed MSB-first into bytes."""
+    return np.unpackbits(np.frombuffer(f.read(-(-count // 8)), dtype=np.uint8), count=count).astype(bool)
+
+def read_header(f):
+    """
+    Reads the header of a ``.huf`` file of any version.
+
+    Returns a dict with ``tables``, ``image_shape``, ``stripe_rows``,
+    ``table_mode``, ``context_bits``, ``stream_counts`` (one row per stripe,
+    one column per table) and ``stream_offsets``: stream ``t`` of stripe ``s``
+    occupies file bytes ``stream_offsets[s * T + t]:stream_offsets[s * T + t + 1]``
+    for ``T`` tables. Files written before stripes existed hold a single stripe.
+    """
+    file_size = os.fstat(f.fileno()).st_size
+    if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        f.seek(0)
+        huffman_codes, image_shape = read_legacy_header(f)
+        version = 1
+    else:
+        version = f.read(1)[0]
+        if version not in (2, 3, FORMAT_VERSION):
+            raise ValueError(f"Unsupported .huf format version {version}")
+        width = int.from_bytes(f.read(4), 'big')
+        height = int.from_bytes(f.read(4), 'big')
+        channels = int.from_bytes(f.read(1), 'big')
+        image_shape = (height, width, channels)
+
+    height, width, channels = image_shape
+    header = {
+        "image_shape": image_shape,
+        "stripe_rows": max(height, 1),
+        "table_mode": 'single',
+        "context_bits": 0,
+    }
+    if version >= 3:
+        header["stripe_rows"] = int.from_bytes(f.read(4), 'big')
+    if version >= 4:
+        header["table_mode"] = TABLE_MODES[f.read(1)[0]]
+        header["context_bits"] = f.read(1)[0]
+    num_stripes = -(-height // header["stripe_rows"])
+    num_tables = {
+        'single': 1,
+        'channel': channels,
+        'context': channels << header["context_bits"],
+    }[header["table_mode"]]
+    # Tables that code no symbol are not stored from version 4 on.
+    present_tables = read_bitmap(f, num_tables) if version >= 4 else np.ones(num_tables, dtype=bool)
+    if version >= 2:
+        header["tables"] = [generate_canonical_codes(read_code_lengths(f)) if present else {}
+                            for present in present_tables]
+    else:
+        header["tables"] = [huffman_codes]
+
+    if version >= 4:
+        # Empty streams are not stored either; they get a zero length and
+        # count so that every stripe still has one stream per table.
+        num_present = int(present_tables.sum())
+        present_streams = np.zeros((num_stripes, num_tables), dtype=bool)
+        present_streams[:, present_tables] = read_bitmap(f, num_stripes * num_present).reshape(num_stripes, num_present)
+        num_streams = int(present_streams.sum())
+        offsets = np.frombuffer(f.read(8 * (num_streams + 1)), dtype='>u8').astype(np.int64)
+        stream_lengths = np.zeros(present_streams.size, dtype=np.int64)
+        stream_lengths[present_streams.ravel()] = np.diff(offsets)
+        stream_offsets = offsets[0] + np.concatenate(([0], np.cumsum(stream_lengths)))
+        stream_counts = np.zeros(present_streams.shape, dtype=np.int64)
+        stream_counts[present_streams] = np.frombuffer(f.read(8 * num_streams), dtype='>u8')
+        header["stream_counts"] = stream_counts
+    elif version >= 3:
+        stream_offsets = np.frombuffer(f.read(8 * (num_stripes * num_tables + 1)), dtype='>u8').astype(np.int64)
+    else:
+        stream_offsets = np.array([0, file_size - f.tell()])
+    if version < 4:
+        stripe_heights = np.minimum(header["stripe_rows"], height - header["stripe_rows"] * np.arange(num_stripes))
+        header["stream_counts"] = (stripe_heights * width * channels)[:, None]
+    header["stream_offsets"] = stream_offsets + f.tell()
+    return header
+
+def read_legacy_header(f):
+    """Parses the original header, which stores symbol, length and code bytes per code."""
+    width = int.from_bytes(f.read(4), 'big')
+    height = int.from_bytes(f.read(4), 'big')
+    channels = int.from_bytes(f.read(1), 'big')
+    num_codes = int.from_bytes(f.read(4), 'big')
+    huffman_codes = {}
+    for _ in range(num_codes):
+        pixel = f.read(1)[0]
+        length = f.read(1)[0]
+        code = int.from_bytes(f.read((length + 7) // 8), 'big')
+        huffman_codes[pixel] = format(code, f'0{length}b') if length else ''
+    return huffman_codes, (height, width, channels)
+
+def map_stripes(function, tasks, workers=None):
+    """
+    Applies ``function`` to every argument tuple in ``tasks``, on a process
+    pool with ``workers`` processes unless there is a single task or
+    ``workers`` is 1. Results come back in task order.
+    """
+    if workers == 1 or len(tasks) < 2:
+        return [function(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, *zip(*tasks)))
+
+def build_decode_table(huffman_codes, lookup_bits=LOOKUP_BITS):
+    """
+    Builds a ``2 ** lookup_bits`` entry table for multi-bit Huffman decoding.
+
+    Every ``lookup_bits``-bit window that starts with a code maps to that code's
+    symbol and length. Windows that start with a longer code keep length 0 and
+    are resolved through the returned ``{length: (codes, symbols)}`` dict of
+    sorted code values per length.
+    """
+    table_symbols = np.zeros(1 << lookup_bits, dtype=np.uint8)
+    table_lengths = np.zeros(1 << lookup_bits, dtype=np.uint8)
+    long_codes = defaultdict(list)
+    for symbol, code in huffman_codes.items():
+        if len(code) <= lookup_bits:
+            first = int(code, 2) << (lookup_bits - len(code))
+            last = first + (1 << (lookup_bits - len(code)))
+            table_symbols[first:last] = symbol
+            table_lengths[first:last] = len(code)
+        else:
+            long_codes[len(code)].append((int(code, 2), symbol))
+    long_codes = {
+        length: tuple(np.array(column, dtype=np.int64) for column in zip(*sorted(entries)))
+        for length, entries in sorted(long_codes.items())
+    }
+    return table_symbols, table_lengths, long_codes
+
+def read_bit_windows(buffer, positions, width):
+    """
+    Returns the ``width``-bit MSB-first window starting at each bit position.
+    ``buffer`` needs ``width // 8 + 4`` zero bytes past the last position read.
+    """
+    if width > 25:
+        high = read_bit_windows(buffer, positions, 25)
+        return (high << (width - 25)) | read_bit_windows(buffer, positions + 25, width - 25)
+    byte_index = positions >> 3
+    words = buffer[byte_index].astype(np.int64) << 24
+    words |= buffer[byte_index + 1].astype(np.int64) << 16
+    words |= buffer[byte_index + 2].astype(np.int64) << 8
+    words |= buffer[byte_index + 3]
+    return (words >> (32 - width - (positions & 7))) & ((1 << width) - 1)
+
+def read_all_bit_windows(buffer, first_byte, num_bytes, width):
+    """
+    Same as ``read_bit_windows`` for every bit of ``num_bytes`` consecutive
+    bytes, but shifts one 32-bit word per byte instead of gathering per bit.
+    """
+    data = buffer[first_byte:first_byte + num_bytes + 3].astype(np.intp)
+    words = (data[:-3] << 24) | (data[1:-2] << 16) | (data[2:-1] << 8) | data[3:]
+    windows = np.empty((num_bytes, 8), dtype=np.intp)
+    for shift in range(8):
+        windows[:, shift] = (words >> (32 - width - shift)) & ((1 << width) - 1)
+    return windows.ravel()
+
+def decode_data(encoded_data, huffman_codes, num_symbols, lookup_bits=LOOKUP_BITS, chunk_bytes=1 << 16):
+    """
+    Decodes ``num_symbols`` symbols from a packed Huffman stream.
+
+    The stream is decoded ``chunk_bytes`` at a time. Within a chunk the lookup
+    table is probed at every bit position at once, which gives the symbol and
+    code length that would be decoded if a code started there. The chain of
+    actual code starts is then followed with pointer jumping: the Python loop
+    only visits every ``2 ** JUMP_LOG2``-th code and the codes in between are
+    filled in with vectorized steps.
+    """
+    max_length = max((len(code) for code in huffman_codes.values()), default=0)
+    if max_length == 0:
+        # A single-symbol image is stored with an empty code.
+        return np.full(num_symbols, next(iter(huffman_codes), 0), dtype=np.uint8)
+    lookup_bits = min(lookup_bits, max_length)
+    table_symbols, table_lengths, long_codes = build_decode_table(huffman_codes, lookup_bits)
+
+    buffer = np.concatenate((encoded_data, np.zeros(max_length // 8 + 8, dtype=np.uint8)))
+    decoded = np.empty(num_symbols, dtype=np.uint8)
+    count = 0
+    position = 0
+    while count < num_symbols:
+        first_byte = position >> 3
+        num_bytes = min(chunk_bytes, len(encoded_data) - first_byte)
+        chunk_bits = num_bytes * 8
+        offset = position - first_byte * 8
+        if offset >= chunk_bits:
+            raise ValueError("Huffman stream ended before all symbols were decoded")
+
+        # Symbol and length of the code starting at every bit of the chunk.
+        windows = read_all_bit_windows(buffer, first_byte, num_bytes, lookup_bits)
+        symbols = table_symbols[windows]
+        lengths = table_lengths[windows]
+        long_offsets = np.flatnonzero(lengths == 0)
+        for length, (codes, code_symbols) in long_codes.items():
+            if not len(long_offsets):
+                break
+            values = read_bit_windows(buffer, first_byte * 8 + long_offsets, length)
+            slot = np.minimum(np.searchsorted(codes, values), len(codes) - 1)
+            hit = codes[slot] == values
+            symbols[long_offsets[hit]] = code_symbols[slot[hit]]
+            lengths[long_offsets[hit]] = length
+            long_offsets = long_offsets[~hit]
+
+        # next_offset[i] is where the following code starts; positions that do
+        # not start a valid code, and the chunk end, lead to the sentinel.
+        next_offset = np.arange(chunk_bits + 1, dtype=np.intp)
+        next_offset[:-1] += lengths
+        next_offset[:-1][lengths == 0] = chunk_bits
+        np.minimum(next_offset, chunk_bits, out=next_offset)
+        jump = next_offset
+        for _ in range(JUMP_LOG2):
+            jump = jump[jump]
+
+        checkpoints = []
+        while offset < chunk_bits:
+            checkpoints.append(offset)
+            offset = int(jump[offset])
+        starts = np.empty((len(checkpoints), 1 << JUMP_LOG2), dtype=np.int64)
+        current = np.array(checkpoints, dtype=np.int64)
+        for step in range(1 << JUMP_LOG2):
+            starts[:, step] = current
+            current = next_offset[current]
+        starts = starts.ravel()
+        starts = starts[starts < chunk_bits][:num_symbols - count]
+        if not np.all(lengths[starts]):
+            raise ValueError(f"Invalid Huffman code in chunk starting at byte {first_byte}")
+
+        decoded[count:count + len(starts)] = symbols[starts]
+        count += len(starts)
+        position = first_byte * 8 + int(starts[-1]) + int(lengths[starts[-1]])
+    return decoded
+
+def decompress_image(input_file_path, output_image_path=None, rows=None, workers=None):
+    """
+    Decompresses a ``.huf`` file back into a ``(height, width, channels)`` array.
+
+    :param input_file_path: Path to the file written by ``process_image``.
+    :param output_image_path: Optional path to also save the decoded image.
+    :param rows: Optional ``(first_row, last_row)`` range; only the stripes
+                 overlapping ``[first_row, last_row)`` are read and decoded.
+    :param workers: Number of processes used to decode stripes in parallel.
+    :return: Decoded image (or row range) as a uint8 numpy array.
+    """
+    with open(input_file_path, 'rb') as f:
+        header = read_header(f)
+        height, width, channels = header["image_shape"]
+        stripe_rows = header["stripe_rows"]
+        num_tables = len(header["tables"])
+        stream_offsets = header["stream_offsets"]
+        first_row, last_row = rows if rows is not None else (0, height)
+        if not 0 <= first_row <= last_row <= height:
+            raise ValueError(f"Row range [{first_row}, {last_row}) is outside the image height {height}")
+
+        first_stripe = first_row // stripe_rows
+        tasks = []
+        for stripe in range(first_stripe, -(-last_row // stripe_rows)):
+            offsets = stream_offsets[stripe * num_tables:(stripe + 1) * num_tables + 1]
+            f.seek(offsets[0])
+            stripe_data = np.frombuffer(f.read(offsets[-1] - offsets[0]), dtype=np.uint8)
+            encoded_streams = np.split(stripe_data, offsets[1:-1] - offsets[0])
+            stripe_shape = (min(stripe_rows, height - stripe * stripe_rows), width, channels)
+            tasks.append((encoded_streams, header["tables"], header["stream_counts"][stripe], stripe_shape,
+                          header["table_mode"], header["context_bits"]))
+
+    stripes = map_stripes(decode_stripe, tasks, workers)
+    image = np.concatenate(stripes) if stripes else np.empty((0, width, channels), dtype=np.uint8)
+    skipped_rows = first_stripe * stripe_rows
+    image = image[first_row - skipped_rows:last_row - skipped_rows]
+    if output_image_path is not None:
+        cv2.imwrite(output_image_path, image)
+    return image
+
+def process_image(input_image_path, output_file_path, stripe_rows=None, workers=None,
+                  table_mode='single', context_bits=CONTEXT_BITS, image=None):
+    """
+    Compresses an image with canonical Huffman codes.
+
+    :param stripe_rows: Rows per stripe. Stripes share the code tables but are
+                        encoded as separate byte-aligned streams, so they can be
+                        encoded and decoded in parallel and decoded on their own.
+                        ``None`` writes the whole image as one stripe.
+    :param workers: Number of processes used to encode stripes in parallel.
+    :param table_mode: ``'single'`` for one table over all samples, ``'channel'``
+                       for one table per channel, or ``'context'`` for one table
+                       per channel and bucket of the sample above.
+    :param context_bits: The sample above is quantized to this many bits in
+                         ``'context'`` mode.
+    :param image: The source already decoded by ``image_loader.load_image``, an
+                  array or memoryview. ``None`` decodes ``input_image_path``.
+    """
+    image = source_image(input_image_path, image)
     original_size = os.path.getsize(input_image_path)
 
     # Start compression
-    start_compress = time.time()
-    pixel_data = image.flatten()
+    start_compress = time.perf_counter()
+    stripe_rows = stripe_rows or max(image.shape[0], 1)
 
-    # Build Huffman tree and generate codes
-    huffman_tree = build_huffman_tree(pixel_data)
-    huffman_codes = generate_huffman_codes(huffman_tree)
+    with phase("entropy_code"):
+        # Build length-limited canonical Huffman codes for every table
+        histograms = table_histograms(image, table_mode, context_bits, stripe_rows)
+        code_lengths = np.stack([compute_code_lengths(histogram) for histogram in histograms])
+        tables = [generate_canonical_codes(lengths) for lengths in code_lengths]
 
-    # Encode the pixel data
-    encoded_data = encode_data(pixel_data, huffman_codes)
+        # Encode the pixel data stripe by stripe
+        stripes = [(image[row:row + stripe_rows], tables, table_mode, context_bits)
+                   for row in range(0, image.shape[0], stripe_rows)]
+        encoded = map_stripes(encode_stripe, stripes, workers)
+    encoded_stripes = [streams for streams, _ in encoded]
+    stream_counts = [counts for _, counts in encoded]
 
     # Write the encoded data to file
-    write_binary_file(encoded_data, output_file_path, huffman_codes, image.shape)
-    end_compress = time.time()
+    with phase("write"):
+        write_binary_file(encoded_stripes, stream_counts, output_file_path, tables, image.shape, stripe_rows,
+                          table_mode, context_bits)
+    end_compress = time.perf_counter()
     compressed_size = os.path.getsize(output_file_path)
     time_taken_compress = end_compress - start_compress
 
-    # Calculate entropy and redundancy
-    unique, counts = np.unique(pixel_data, return_counts=True)
-    probabilities = counts / len(pixel_data)
-    entropy = -np.sum(probabilities * np.log2(probabilities))
-    avg_bits_per_symbol = sum(len(huffman_codes[p]) * counts[i] for i, p in enumerate(unique)) / len(pixel_data)
+    # Calculate entropy and redundancy under the table model: the entropy of
+    # each table's symbols, weighted by how many samples it codes.
+    num_samples = max(image.size, 1)
+    table_sizes = histograms.sum(axis=1, keepdims=True)
+    probabilities = histograms / np.maximum(table_sizes, 1)
+    plogp = probabilities * np.log2(np.where(probabilities > 0, probabilities, 1))
+    entropy = -np.sum(table_sizes * plogp) / num_samples
+    avg_bits_per_symbol = np.sum(histograms * code_lengths) / num_samples
     redundancy = avg_bits_per_symbol - entropy
 
     return {
@@ -96,3 +593,23 @@ def process_image(input_image_path, output_file_path):
         "entropy": entropy,
         "redundancy": redundancy
     }
+
+if __name__ == "__main__":
+    input_image_path = "Wallpaper_1.jpg"  # Replace with your image path
+    compressed_path = "compressed_image.huf"
+
+    # Compression
+    compression_result = process_image(input_image_path, compressed_path)
+    print("Huffman Compression Results:", compression_result)
+
+    # Decompression
+    start_decompress = time.perf_counter()
+    decompressed_image = decompress_image(compressed_path)
+    print(f"Decompression took {time.perf_counter() - start_decompress:.2f} seconds")
+
+    # Verify lossless decompression
+    original_image = cv2.imread(input_image_path)
+    if np.array_equal(original_image, decompressed_image):
+        print("Decompression verified: Original and decompressed images match!")
+    else:
+        print("Decompression failed: Original and decompressed images do not match.")
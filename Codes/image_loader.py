@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+
+from timing import phase
+
+# Every codec works on the same decoded pixels: a C-contiguous uint8 array of
+# shape (height, width, 3) with the channels in OpenCV's BGR order. Codecs that
+# store RGB (LZW, RLE, PNG) reorder the channels with ``rgb_pixels``.
+CHANNEL_ORDER = "BGR"
+
+
+def load_image(image_path):
+    """
+    Decodes an image file once into the shared pixel layout.
+
+    :param image_path: Path to the image.
+    :return: C-contiguous uint8 array of shape (height, width, 3), BGR.
+    """
+    image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Could not decode the image at {image_path}")
+    return np.ascontiguousarray(image)
+
+
+def as_image(image):
+    """
+    Wraps decoded pixels, an array or a memoryview exporting one, without
+    copying them unless they are not C-contiguous.
+
+    :param image: uint8 pixels of shape (height, width, 3), BGR.
+    :return: The pixels as a C-contiguous numpy array.
+    """
+    image = np.asarray(image)
+    if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError(f"Expected uint8 pixels of shape (height, width, 3), got {image.dtype} {image.shape}")
+    return np.ascontiguousarray(image)
+
+
+def source_image(image_path, image=None):
+    """
+    Returns ``image`` through ``as_image`` when the caller already decoded the
+    source, otherwise decodes ``image_path`` with ``load_image``. Either way
+    the time counts as the ``load`` phase.
+    """
+    with phase("load"):
+        return load_image(image_path) if image is None else as_image(image)
+
+
+def rgb_pixels(image):
+    """
+    Returns a C-contiguous RGB copy of BGR pixels.
+    """
+    return np.ascontiguousarray(image[..., ::-1])
+
+
+def publish_image(image):
+    """
+    Copies decoded pixels into a new shared memory block so that worker
+    processes can map them instead of receiving pickled copies.
+
+    :param image: Pixels from ``load_image``.
+    :return: The ``SharedMemory`` block, which the caller closes and unlinks
+             once the workers are done, and the ``(name, shape)`` descriptor
+             to pass to ``attach_image``.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+    np.ndarray(image.shape, dtype=np.uint8, buffer=block.buf)[...] = image
+    return block, (block.name, image.shape)
+
+
+def attach_image(descriptor):
+    """
+    Maps pixels published by ``publish_image`` in another process.
+
+    :param descriptor: The ``(name, shape)`` pair from ``publish_image``.
+    :return: The ``SharedMemory`` block, to close once the array is released,
+             and a read-only array over it.
+    """
+    name, shape = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    image = np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+    image.flags.writeable = False
+    return block, image
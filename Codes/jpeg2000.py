@@ -1,20 +1,30 @@
 import cv2
+import io
 import os
 import time
 import numpy as np
-from collections import Counter
+from PIL import Image, ImageFile
+
+from image_loader import source_image
+from timing import phase
+
+TILE_SIZE = (1024, 1024)
+NUM_RESOLUTIONS = 6
+# Pillow 11 and later describe a pending decode with ImageFile._Tile named
+# tuples, whose jpeg2k args are (codec, reduce, layers, fd, length). Older
+# versions use plain tuples, and load_reduced falls back to the public API.
+PILLOW_TILE = getattr(ImageFile, "_Tile", ())
 
 def calculate_entropy(image):
-    # Flatten the image and count the occurrences of each pixel value
-    flat_image = image.flatten()
-    value_counts = Counter(flat_image)
-    total_pixels = len(flat_image)
+    # Count the occurrences of each pixel value
+    value_counts = np.bincount(image.ravel(), minlength=256)
+    total_pixels = image.size
 
-    # Calculate probabilities of unique pixel values
-    probabilities = [count / total_pixels for count in value_counts.values()]
+    # Calculate probabilities of the pixel values that occur
+    probabilities = value_counts[value_counts > 0] / total_pixels
 
     # Calculate entropy
-    entropy = -sum(p * np.log2(p) for p in probabilities)
+    entropy = -np.sum(probabilities * np.log2(probabilities))
 
     # Calculate maximum entropy for an 8-bit image (256 possible values)
     max_entropy = np.log2(256)
@@ -24,56 +34,174 @@ def calculate_entropy(image):
 
     return entropy, redundancy
 
-def jpeg2000_compression(image_path, compressed_path):
-    start_time = time.time()
-
-    # Read the image
-    image = cv2.imread(image_path)
-    if image is None:
-        raise FileNotFoundError(f"Image not found at {image_path}")
-
-    # Compress the image using OpenCV (JPEG 2000)
-    result = cv2.imwrite(compressed_path, image, [cv2.IMWRITE_JPEG2000_COMPRESSION_X1000, 1000])
-
-    if not result:
-        raise ValueError("Compression failed")
-
-    end_time = time.time()
+def encode_tiled_jpeg2000(image, tile_size=TILE_SIZE, num_resolutions=NUM_RESOLUTIONS):
+    """
+    Encodes a BGR image as a tiled, lossless JPEG 2000 file with OpenJPEG
+    through Pillow.
+
+    :param image: uint8 BGR (or grayscale) array.
+    :param tile_size: (width, height) of the tiles.
+    :param num_resolutions: Number of resolution levels. A decoder can skip up
+                            to ``num_resolutions - 1`` of them, halving the
+                            size each time.
+    :return: The encoded bytes.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="JPEG2000", tile_size=tuple(tile_size),
+                                num_resolutions=num_resolutions, irreversible=False)
+    return buffer.getvalue()
+
+
+def jpeg2000_compression(image_path, compressed_path=None, verify=False, tile_size=None, num_resolutions=None,
+                         image=None):
+    """
+    Compresses an image as JPEG 2000 in memory. The file is only written when
+    ``compressed_path`` is given, and the encoded buffer is only decoded again
+    when ``verify`` is set, in which case the metrics come from the decoded
+    image and ``verified`` tells whether it matches the source.
+
+    With ``tile_size`` or ``num_resolutions`` the image is encoded by
+    ``encode_tiled_jpeg2000`` (missing values default to ``TILE_SIZE`` and
+    ``NUM_RESOLUTIONS``), otherwise as a single tile through OpenCV.
+
+    ``image`` takes the source already decoded by ``image_loader.load_image``
+    (an array or memoryview); by default ``image_path`` is decoded.
+    """
+    start_time = time.perf_counter()
+
+    # Read the image unless it was decoded already
+    image = source_image(image_path, image)
+
+    # OpenJPEG runs the wavelet transform and the entropy coding in one call,
+    # which counts as the entropy coding phase
+    with phase("entropy_code"):
+        if tile_size is not None or num_resolutions is not None:
+            # Compress the image tile by tile with resolution levels (OpenJPEG)
+            encoded = np.frombuffer(encode_tiled_jpeg2000(image, tile_size or TILE_SIZE,
+                                                          num_resolutions or NUM_RESOLUTIONS), dtype=np.uint8)
+        else:
+            # Compress the image using OpenCV (JPEG 2000)
+            result, encoded = cv2.imencode(".jp2", image, [cv2.IMWRITE_JPEG2000_COMPRESSION_X1000, 1000])
+
+            if not result:
+                raise ValueError("Compression failed")
+    if compressed_path:
+        with phase("write"):
+            encoded.tofile(compressed_path)
+
+    end_time = time.perf_counter()
 
     # Get sizes and calculate compression ratio
     original_size = os.path.getsize(image_path)
-    compressed_size = os.path.getsize(compressed_path)
+    compressed_size = encoded.size
     compression_ratio = original_size / compressed_size
     time_taken_compress = end_time - start_time
 
-    # Load the compressed image to calculate entropy and redundancy
-    compressed_image = cv2.imread(compressed_path, cv2.IMREAD_UNCHANGED)
-    if compressed_image is None:
-        raise FileNotFoundError(f"Failed to load compressed image from {compressed_path}")
-
-    # Calculate entropy and redundancy for the compressed image
-    entropy, redundancy = calculate_entropy(compressed_image)
-
-    return {
+    result = {
         "original_size": original_size,
         "compressed_size": compressed_size,
         "compression_ratio": compression_ratio,
         "time_taken": time_taken_compress,
-        "entropy": entropy,
-        "redundancy": redundancy,
     }
 
-def jpeg2000_decompression(compressed_path, output_path):
-    # Decompress the image using OpenCV
-    image = cv2.imread(compressed_path, cv2.IMREAD_UNCHANGED)
-
-    if image is None:
-        raise FileNotFoundError(f"Failed to load compressed image from {compressed_path}")
+    # Calculate entropy and redundancy, on the decoded image when verifying
+    if verify:
+        decoded_image = cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED)
+        if decoded_image is None:
+            raise ValueError("Failed to decode the encoded JPEG 2000 image")
+        result["verified"] = np.array_equal(image, decoded_image)
+        image = decoded_image
+    result["entropy"], result["redundancy"] = calculate_entropy(image)
+    return result
+
+def load_reduced(decoded, reduce):
+    """
+    Decodes a JPEG 2000 image opened with Pillow at resolution level ``reduce``.
+
+    OpenJPEG gives that level a size of ceil(size / 2 ** reduce) while Pillow's
+    own ``reduce`` asks for the size rounded to the nearest integer, so the
+    decode fails as a broken data stream whenever a dimension rounds down. On
+    Pillow 11 and later (see ``PILLOW_TILE``) the image size and decoder tile
+    are set to OpenJPEG's size before loading instead, and only the requested
+    level is decoded. Otherwise the full resolution is decoded and shrunk with
+    the public ``Image.reduce``, which also rounds the size up but averages
+    pixels instead of taking OpenJPEG's wavelet low-pass band.
+
+    :param decoded: The image returned by ``PIL.Image.open``, not loaded yet.
+    :param reduce: Number of resolution levels to skip.
+    :return: The decoded image as an RGB (or grayscale) array.
+    """
+    if reduce:
+        tile = decoded.tile[0] if len(decoded.tile) == 1 else None
+        if not isinstance(tile, PILLOW_TILE) or tile.codec_name != "jpeg2k":
+            decoded.load()
+            return np.asarray(decoded.reduce(1 << reduce))
+        width, height = decoded.size
+        decoded._size = (-(-width >> reduce), -(-height >> reduce))
+        decoded.tile = [tile._replace(extents=(0, 0) + decoded.size, args=(tile.args[0], reduce) + tile.args[2:])]
+    return np.asarray(decoded)
+
+
+def jpeg2000_decompression(compressed_path, output_path=None, reduce=0, region=None):
+    """
+    Decompresses a JPEG 2000 file, optionally at a lower resolution level or
+    for a region only.
+
+    :param compressed_path: Path to the JPEG 2000 file.
+    :param output_path: Path to save the decompressed image, if given.
+    :param reduce: Number of resolution levels to skip; the image is decoded at
+                   1 / 2 ** reduce of its size without decoding the finer levels.
+    :param region: Optional (left, upper, right, lower) box in full-resolution
+                   pixels. Pillow decodes every tile of the requested level, so
+                   the region is cropped after decoding.
+    :return: The decoded image as a BGR (or grayscale) array.
+    """
+    if reduce == 0 and region is None:
+        # Decompress the image using OpenCV
+        image = cv2.imread(compressed_path, cv2.IMREAD_UNCHANGED)
+
+        if image is None:
+            raise FileNotFoundError(f"Failed to load compressed image from {compressed_path}")
+    else:
+        with Image.open(compressed_path) as decoded:
+            image = load_reduced(decoded, reduce)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        if region is not None:
+            scale = 2 ** reduce
+            left, upper, right, lower = region
+            image = image[upper // scale:-(-lower // scale), left // scale:-(-right // scale)]
 
     # Save the decompressed image
-    cv2.imwrite(output_path, image)
+    if output_path:
+        cv2.imwrite(output_path, image)
     return image
 
+
+def time_jpeg2000_decodes(compressed_path, thumbnail_reduce=NUM_RESOLUTIONS - 1):
+    """
+    Times a full-resolution decode and a thumbnail decode of a JPEG 2000 file.
+
+    :param thumbnail_reduce: Resolution levels skipped for the thumbnail, at
+                             most the file's number of resolutions minus one.
+    :return: The two decode times and the thumbnail shape.
+    """
+    start_time = time.perf_counter()
+    jpeg2000_decompression(compressed_path, reduce=0)
+    time_taken_decode = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    thumbnail = jpeg2000_decompression(compressed_path, reduce=thumbnail_reduce)
+    time_taken_thumbnail_decode = time.perf_counter() - start_time
+
+    return {
+        "time_taken_decode": time_taken_decode,
+        "time_taken_thumbnail_decode": time_taken_thumbnail_decode,
+        "thumbnail_shape": thumbnail.shape,
+    }
+
 if __name__ == "__main__":
     input_image_path = "Images/480-360-sample.bmp"  # Replace with your image path
     output_compressed_path = "compressed_image.jp2"  # JPEG 2000 file extension
@@ -86,3 +214,10 @@ if __name__ == "__main__":
     # Decompression
     decompressed_image = jpeg2000_decompression(output_compressed_path, decompressed_image_path)
     print("Decompression complete.")
+
+    # Tiled, multi-resolution encoding with full and thumbnail decode times
+    tiled_compressed_path = "compressed_image_tiled.jp2"
+    result = jpeg2000_compression(input_image_path, tiled_compressed_path, tile_size=TILE_SIZE,
+                                  num_resolutions=NUM_RESOLUTIONS)
+    print("Tiled Compression Result:", result)
+    print("Decode Times:", time_jpeg2000_decodes(tiled_compressed_path))
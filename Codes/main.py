@@ -1,130 +1,456 @@
 import os
 import csv
+import math
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
 from huffman_image_compression_only import process_image as huffman_process
 from Limpel_ziv import LZW  # Assuming your LZW code is in Limpel_ziv.py
 from rle import RLE  # Assuming your RLE code is in rle_image_compression.py
 from deflate import compress_image_with_deflate as deflate_compress  # Correct import for Deflate
+from deflate import compress_image_with_parallel_deflate  # Block-parallel Deflate written to a file
 from predictive import predictive_coding_compression, predictive_coding_decompression  # Import your predictive coding functions
-from jpeg2000 import jpeg2000_compression, jpeg2000_decompression  # Import JPEG 2000 compression functions
-from webp import webp_compression, webp_decompression  # Import WebP compression functions
+from golomb_rice import golomb_rice_compression  # Context-adaptive Golomb-Rice coding of predictive residuals
+from jpeg2000 import (jpeg2000_compression, jpeg2000_decompression,  # Import JPEG 2000 compression functions
+                      time_jpeg2000_decodes, TILE_SIZE, NUM_RESOLUTIONS)
+from webp import webp_compression, webp_decompression, webp_effort_sweep  # Import WebP compression functions
 from png import png_compression  # Import PNG compression functions
+from image_loader import attach_image, publish_image, source_image  # Decode each image once for all codecs
+from result_cache import append_entry, cache_path, codec_fingerprint, content_hash, load_cache, open_cache
+from timing import REPEATS, WARMUP, benchmark  # Comparable timings of every codec
 
 
-def process_images_in_folder(input_folder, output_folder, csv_file_path):
-    os.makedirs(output_folder, exist_ok=True)
+CSV_HEADER = [
+    "Filename", "Original Size (bytes)", "Compressed Size (bytes)",
+    "Compression Ratio", "Time to Compress (seconds)", "Entropy", "Redundancy", "Coding Technique",
+    "Single-Table Huffman Size (bytes)", "Gain vs Single-Table Huffman (%)",
+    "Zlib Level", "Zlib Strategy", "Predicted Compressed Size (bytes)", "Predicted Encode Time (seconds)",
+    "Encode Time (seconds)", "Tuning Time (seconds)",
+    "Decode Time (seconds)", "Thumbnail Decode Time (seconds)",
+    "Median Time (seconds)", "P90 Time (seconds)", "Min Time (seconds)", "Load Time (seconds)",
+    "Transform Time (seconds)", "Entropy Coding Time (seconds)", "Write Time (seconds)", "Timed Runs"
+]
+# Columns filled by the codecs; the rest come from the timing harness.
+RESULT_COLUMNS = CSV_HEADER.index("Median Time (seconds)")
 
-    valid_extensions = (".bmp", ".dng", ".jpg", ".png")  # Include more extensions as needed
-    write_header = not os.path.exists(csv_file_path)
+# Images decoded and published to the workers at a time.
+IMAGE_BATCH = 8
 
-    with open(csv_file_path, mode="a", newline="") as csv_file:
-        csv_writer = csv.writer(csv_file)
-        if write_header:
-            csv_writer.writerow([
-                "Filename", "Original Size (bytes)", "Compressed Size (bytes)",
-                "Compression Ratio", "Time to Compress (seconds)", "Entropy", "Redundancy", "Coding Technique"
-            ])
-
-        for filename in os.listdir(input_folder):
-            input_image_path = os.path.join(input_folder, filename)
-            if os.path.isfile(input_image_path) and filename.lower().endswith(valid_extensions):
-                print(f"Processing: {filename}")
-                compressed_file_path_huffman = os.path.join(output_folder, filename + ".huf")
-                compressed_file_path_lzw = os.path.join(output_folder, filename + ".lzw")
-                compressed_file_path_rle = os.path.join(output_folder, filename + ".rle")
-                compressed_file_path_predictive = os.path.join(output_folder, filename + ".predictive.gz")
-                compressed_file_path_jpeg2000 = os.path.join(output_folder, filename + ".jp2")
-                compressed_file_path_webp = os.path.join(output_folder, filename + ".webp")
-                compressed_file_path_png = os.path.join(output_folder, filename + ".png")
-
-                # Huffman compression
-                try:
-                    huffman_result = huffman_process(input_image_path, compressed_file_path_huffman)
-                    csv_writer.writerow([
-                        filename, huffman_result["original_size"], huffman_result["compressed_size"],
-                        huffman_result["compression_ratio"], huffman_result["time_taken_compress"],
-                        huffman_result["entropy"], huffman_result["redundancy"], "huffman"
-                    ])
-                except Exception as e:
-                    print(f"Error processing {filename} with Huffman: {e}")
+# Huffman table modes written as extra CSV rows next to the single-table "huffman" row.
+HUFFMAN_TABLE_MODES = {"channel": ".channel.huf", "context": ".context.huf"}
 
-                # LZW compression
-                try:
-                    lzw = LZW(input_image_path)
-                    lzw_result = lzw.compress()
-                    csv_writer.writerow([
-                        filename, lzw_result["original_size"], lzw_result["compressed_size"],
-                        lzw_result["compression_ratio"], lzw_result["time_taken_compress"],
-                        lzw_result["entropy"], lzw_result["redundancy"], "lzw"
-                    ])
-                except Exception as e:
-                    print(f"Error processing {filename} with LZW: {e}")
 
-                # RLE compression
-                try:
-                    rle = RLE(input_image_path)
-                    rle_result = rle.compress()
-                    csv_writer.writerow([
-                        filename, rle_result["original_size"], rle_result["compressed_size"],
-                        rle_result["compression_ratio"], rle_result["time_taken_compress"],
-                        rle_result["entropy"], rle_result["redundancy"], "rle"
-                    ])
-                except Exception as e:
-                    print(f"Error processing {filename} with RLE: {e}")
+def result_row(filename, result, technique, time_key):
+    return [
+        filename, result["original_size"], result["compressed_size"],
+        result["compression_ratio"], result[time_key],
+        result["entropy"], result["redundancy"], technique
+    ]
 
-                # Deflate compression
-                try:
-                    deflate_result = deflate_compress(input_image_path)
-                    csv_writer.writerow([
-                        filename, deflate_result["original_size"], deflate_result["compressed_size"],
-                        deflate_result["compression_ratio"], deflate_result["time_taken_compress"],
-                        deflate_result["entropy"], deflate_result["redundancy"], "deflate"
-                    ])
-                except Exception as e:
-                    print(f"Error processing {filename} with Deflate: {e}")
 
-                # Predictive Coding compression
-                try:
-                    predictive_result = predictive_coding_compression(input_image_path, compressed_file_path_predictive)
-                    csv_writer.writerow([
-                        filename, predictive_result["original_size"], predictive_result["compressed_size"],
-                        predictive_result["compression_ratio"], predictive_result["time_taken"],
-                        predictive_result["entropy"], predictive_result["redundancy"], "predictive_coding"
-                    ])
-                except Exception as e:
-                    print(f"Error processing {filename} with Predictive Coding: {e}")
+def huffman_row(filename, result, technique, single_table_size):
+    gain = 100 * (single_table_size - result["compressed_size"]) / single_table_size
+    return [
+        filename, result["original_size"], result["compressed_size"],
+        result["compression_ratio"], result["time_taken_compress"],
+        result["entropy"], result["redundancy"], technique, single_table_size, gain
+    ]
+
+
+def timed_row(row, timing, decode_time):
+    """
+    Pads a codec row to ``RESULT_COLUMNS`` and appends the ``timing.benchmark``
+    figures. The decode of the source, timed once per image, is added to the
+    load phase and to the totals, so every row covers decoding the file,
+    compressing it and writing the result.
+    """
+    return [
+        *row, *[""] * (RESULT_COLUMNS - len(row)),
+        timing["median"] + decode_time, timing["p90"] + decode_time, timing["min"] + decode_time,
+        timing["load"] + decode_time, timing["transform"], timing["entropy_code"], timing["write"], timing["repeats"]
+    ]
+
+
+def autotuned_row(filename, result, technique, time_key):
+    return [
+        filename, result["original_size"], result["compressed_size"],
+        result["compression_ratio"], result[time_key],
+        result["entropy"], result["redundancy"], technique, "", "",
+        result["zlib_level"], result["zlib_strategy"], result["predicted_compressed_size"],
+        result["predicted_time_taken"], result["time_taken_encode"], result["time_taken_tuning"]
+    ]
+
+
+def huffman_rows(filename, input_image_path, image, output_folder, measure):
+    huffman_result, timing = measure(
+        lambda: huffman_process(input_image_path, os.path.join(output_folder, filename + ".huf"), image=image)
+    )
+    single_table_size = huffman_result["compressed_size"]
+    yield huffman_row(filename, huffman_result, "huffman", single_table_size), timing
+    for table_mode, extension in HUFFMAN_TABLE_MODES.items():
+        mode_result, timing = measure(lambda: huffman_process(
+            input_image_path, os.path.join(output_folder, filename + extension), table_mode=table_mode, image=image
+        ))
+        yield huffman_row(filename, mode_result, f"huffman_{table_mode}", single_table_size), timing
+
+
+def lzw_rows(filename, input_image_path, image, output_folder, measure):
+    lzw_result, timing = measure(lambda: LZW(input_image_path, image=image).compress(
+        os.path.join(output_folder, filename + ".lzw")
+    ))
+    yield result_row(filename, lzw_result, "lzw", "time_taken_compress"), timing
+
+
+def lzw_binary_rows(filename, input_image_path, image, output_folder, measure):
+    # LZW over the raw channel bytes with packed codes
+    lzw_binary_result, timing = measure(lambda: LZW(input_image_path, image=image).compressBinary(
+        outputPath=os.path.join(output_folder, filename + ".lzwb")
+    ))
+    yield result_row(filename, lzw_binary_result, "lzw_binary", "time_taken_compress"), timing
+
+
+def rle_rows(filename, input_image_path, image, output_folder, measure):
+    rle_result, timing = measure(lambda: RLE(input_image_path, image=image).compress(
+        os.path.join(output_folder, filename + ".rle")
+    ))
+    yield result_row(filename, rle_result, "rle", "time_taken_compress"), timing
+
+
+def rle_binary_rows(filename, input_image_path, image, output_folder, measure):
+    # RLE with vectorized PackBits packets
+    rle_binary_result, timing = measure(lambda: RLE(input_image_path, image=image).compressBinary(
+        scanOrder="auto", outputPath=os.path.join(output_folder, filename + ".rleb")
+    ))
+    yield result_row(filename, rle_binary_result, "rle_binary", "time_taken_compress"), timing
+
+
+def deflate_rows(filename, input_image_path, image, output_folder, measure):
+    deflate_result, timing = measure(lambda: deflate_compress(
+        input_image_path, output_path=os.path.join(output_folder, filename + ".dfl"), image=image
+    ))
+    yield result_row(filename, deflate_result, "deflate", "time_taken_compress"), timing
+
+
+def deflate_auto_rows(filename, input_image_path, image, output_folder, measure):
+    # Deflate with an autotuned zlib level and strategy
+    deflate_auto_result, timing = measure(lambda: deflate_compress(
+        input_image_path, output_path=os.path.join(output_folder, filename + ".auto.dfl"), level="auto", image=image
+    ))
+    yield autotuned_row(filename, deflate_auto_result, "deflate_auto", "time_taken_compress"), timing
+
+
+def deflate_parallel_rows(filename, input_image_path, image, output_folder, measure):
+    deflate_parallel_result, timing = measure(lambda: compress_image_with_parallel_deflate(
+        input_image_path, os.path.join(output_folder, filename + ".dflb"), image=image
+    ))
+    yield result_row(filename, deflate_parallel_result, "deflate_parallel", "time_taken_compress"), timing
+
+
+def predictive_rows(filename, input_image_path, image, output_folder, measure):
+    predictive_result, timing = measure(lambda: predictive_coding_compression(
+        input_image_path, os.path.join(output_folder, filename + ".predictive.pred"), image=image
+    ))
+    yield result_row(filename, predictive_result, "predictive_coding", "time_taken"), timing
+
+
+def predictive_adaptive_rows(filename, input_image_path, image, output_folder, measure):
+    # Predictive Coding with a per-block predictor choice
+    predictive_adaptive_result, timing = measure(lambda: predictive_coding_compression(
+        input_image_path, os.path.join(output_folder, filename + ".adaptive.pred"), predictor="adaptive",
+        image=image
+    ))
+    yield result_row(filename, predictive_adaptive_result, "predictive_coding_adaptive", "time_taken"), timing
 
-                # JPEG 2000 compression
-                try:
-                    jpeg2000_result = jpeg2000_compression(input_image_path, compressed_file_path_jpeg2000)
-                    csv_writer.writerow([
-                        filename, jpeg2000_result["original_size"], jpeg2000_result["compressed_size"],
-                        jpeg2000_result["compression_ratio"], jpeg2000_result["time_taken"],
-                        jpeg2000_result["entropy"], jpeg2000_result["redundancy"], "jpeg2000"
-                    ])
-                except Exception as e:
-                    print(f"Error processing {filename} with JPEG 2000: {e}")
 
-                # WebP compression
+def golomb_rice_rows(filename, input_image_path, image, output_folder, measure):
+    # Predictive Coding with context-adaptive Golomb-Rice residual coding
+    golomb_rice_result, timing = measure(lambda: golomb_rice_compression(
+        input_image_path, os.path.join(output_folder, filename + ".lgr"), image=image
+    ))
+    yield result_row(filename, golomb_rice_result, "golomb_rice", "time_taken"), timing
+
+
+def jpeg2000_rows(filename, input_image_path, image, output_folder, measure):
+    jpeg2000_result, timing = measure(lambda: jpeg2000_compression(
+        input_image_path, os.path.join(output_folder, filename + ".jp2"), image=image
+    ))
+    yield result_row(filename, jpeg2000_result, "jpeg2000", "time_taken"), timing
+
+
+def jpeg2000_tiled_rows(filename, input_image_path, image, output_folder, measure):
+    # Tiled, multi-resolution JPEG 2000 with full and thumbnail decode times
+    compressed_path = os.path.join(output_folder, filename + ".tiled.jp2")
+    jpeg2000_tiled_result, timing = measure(lambda: jpeg2000_compression(
+        input_image_path, compressed_path, tile_size=TILE_SIZE, num_resolutions=NUM_RESOLUTIONS, image=image
+    ))
+    decode_times = time_jpeg2000_decodes(compressed_path, NUM_RESOLUTIONS - 1)
+    yield result_row(filename, jpeg2000_tiled_result, "jpeg2000_tiled", "time_taken") + [
+        *[""] * 8, decode_times["time_taken_decode"], decode_times["time_taken_thumbnail_decode"]
+    ], timing
+
+
+def webp_rows(filename, input_image_path, image, output_folder, measure):
+    webp_result, timing = measure(
+        lambda: webp_compression(input_image_path, os.path.join(output_folder, filename + ".webp"), image=image)
+    )
+    yield result_row(filename, webp_result, "webp", "time_taken"), timing
+
+
+def webp_sweep_rows(filename, input_image_path, image, output_folder, measure):
+    # Lossless WebP size and encode time at every effort level (0-6)
+    for method in range(7):
+        sweep_result, timing = measure(lambda: webp_effort_sweep(input_image_path, methods=[method], image=image)[0])
+        yield [
+            filename, sweep_result["original_size"], sweep_result["compressed_size"],
+            sweep_result["compression_ratio"], sweep_result["time_taken"],
+            "", "", f"webp_lossless_m{sweep_result['method']}"
+        ], timing
+
+
+def png_rows(filename, input_image_path, image, output_folder, measure):
+    png_result, timing = measure(
+        lambda: png_compression(input_image_path, os.path.join(output_folder, filename + ".png"), image=image)
+    )
+    yield result_row(filename, png_result, "png", "time_taken"), timing
+
+
+def png_auto_rows(filename, input_image_path, image, output_folder, measure):
+    # PNG with an autotuned zlib level and strategy
+    png_auto_result, timing = measure(lambda: png_compression(
+        input_image_path, os.path.join(output_folder, filename + ".auto.png"), level="auto", image=image
+    ))
+    yield autotuned_row(filename, png_auto_result, "png_auto", "time_taken"), timing
+
+
+# Codec name -> (label used in error messages, estimated cost, row generator).
+# The order is the order of the rows written for each image. The costs are the
+# seconds each codec took on Wallpaper_1.jpg and, scaled by the pixel count,
+# only decide which tasks are scheduled first.
+CODECS = {
+    "huffman": ("Huffman", 2.0, huffman_rows),
+    "lzw": ("LZW", 21, lzw_rows),
+    "lzw_binary": ("binary LZW", 3.0, lzw_binary_rows),
+    "rle": ("RLE", 2.3, rle_rows),
+    "rle_binary": ("binary RLE", 0.6, rle_binary_rows),
+    "deflate": ("Deflate", 3.0, deflate_rows),
+    "deflate_auto": ("autotuned Deflate", 3.5, deflate_auto_rows),
+    "deflate_parallel": ("block-parallel Deflate", 0.5, deflate_parallel_rows),
+    "predictive": ("Predictive Coding", 2.9, predictive_rows),
+    "predictive_adaptive": ("adaptive Predictive Coding", 4.4, predictive_adaptive_rows),
+    "golomb_rice": ("Golomb-Rice coding", 1.9, golomb_rice_rows),
+    "jpeg2000": ("JPEG 2000", 0.6, jpeg2000_rows),
+    "jpeg2000_tiled": ("tiled JPEG 2000", 1.5, jpeg2000_tiled_rows),
+    "webp": ("WebP", 2.8, webp_rows),
+    "webp_sweep": ("the WebP effort sweep", 45, webp_sweep_rows),
+    "png": ("PNG", 2.7, png_rows),
+    "png_auto": ("autotuned PNG", 3.0, png_auto_rows),
+}
+
+
+def run_codec(codec, filename, input_image_path, descriptor, output_folder, repeats, warmup, decode_time):
+    """
+    Runs one codec on one image, whose pixels are mapped from the shared memory
+    block named by ``descriptor``, and returns its CSV rows and whether the
+    codec finished. Every codec call is timed by ``timing.benchmark`` with
+    ``warmup`` and ``repeats`` calls. An exception ends the task with the rows
+    produced so far instead of propagating to the pool.
+    """
+    label, _, generate_rows = CODECS[codec]
+    block, image = attach_image(descriptor)
+    measure = partial(benchmark, repeats=repeats, warmup=warmup)
+    rows = []
+    try:
+        for row, timing in generate_rows(filename, input_image_path, image, output_folder, measure):
+            rows.append(timed_row(row, timing, decode_time))
+    except Exception as e:
+        print(f"Error processing {filename} with {label}: {e}")
+        return rows, False
+    finally:
+        del image
+        block.close()
+    return rows, True
+
+
+def run_isolated(key, arguments, on_done):
+    """
+    Reruns a task that was running when a worker died, alone in a fresh process,
+    so that only the task which crashes the worker loses its rows.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            result = executor.submit(run_codec, *arguments).result()
+        except BrokenProcessPool:
+            codec, filename = arguments[:2]
+            print(f"Error processing {filename} with {CODECS[codec][0]}: worker process crashed")
+            result = [], False
+    on_done(key, result)
+
+
+def execute_tasks(tasks, workers, on_done):
+    """
+    Runs ``run_codec`` for every ``(key, arguments)`` task, in list order, on a
+    pool of ``workers`` processes and calls ``on_done(key, result)`` as tasks
+    finish. Only ``workers`` tasks are submitted at a time, so a crashed worker,
+    which breaks the whole pool, loses just the tasks that were running. Those
+    are rerun with ``run_isolated`` and the rest continue on a new pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue = list(reversed(tasks))
+    while queue:
+        lost = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            while (queue or running) and not lost:
+                while queue and len(running) < workers:
+                    key, arguments = queue.pop()
+                    running[executor.submit(run_codec, *arguments)] = (key, arguments)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, arguments = running.pop(future)
+                    try:
+                        on_done(key, future.result())
+                    except BrokenProcessPool:
+                        lost.append((key, arguments))
+            for future in as_completed(running):
+                key, arguments = running[future]
                 try:
-                    webp_result = webp_compression(input_image_path, compressed_file_path_webp)
-                    csv_writer.writerow([
-                        filename, webp_result["original_size"], webp_result["compressed_size"],
-                        webp_result["compression_ratio"], webp_result["time_taken"],
-                        webp_result["entropy"], webp_result["redundancy"], "webp"
-                    ])
-                except Exception as e:
-                    print(f"Error processing {filename} with WebP: {e}")
+                    on_done(key, future.result())
+                except BrokenProcessPool:
+                    lost.append((key, arguments))
+        for key, arguments in lost:
+            run_isolated(key, arguments, on_done)
 
-                # PNG compression
+
+def needs_header(csv_file_path):
+    """
+    Tells whether ``csv_file_path`` is new or empty and needs ``CSV_HEADER``.
+    Rows are only appended to a CSV with the same header, since rows with other
+    columns would corrupt it.
+    """
+    if not os.path.exists(csv_file_path) or not os.path.getsize(csv_file_path):
+        return True
+    with open(csv_file_path, newline="") as csv_file:
+        header = next(csv.reader(csv_file), [])
+    if header != CSV_HEADER:
+        raise ValueError(f"{csv_file_path} has {len(header)} columns instead of the {len(CSV_HEADER)} of CSV_HEADER; "
+                         f"move it away or write the results to another file")
+    return False
+
+
+def process_images_in_folder(input_folder, output_folder, csv_file_path, webp_sweep=False, workers=None,
+                             batch_size=IMAGE_BATCH, repeats=REPEATS, warmup=WARMUP):
+    """
+    Runs every codec on every image in ``input_folder`` and appends the results
+    to ``csv_file_path``. With ``webp_sweep`` a lossless WebP row is also
+    written for each encoder method (0-6) to compare size and encode time.
+
+    Results are cached next to the CSV (see ``result_cache``) under the content
+    hash of the image, the codec and hashes of its parameters and code. A run
+    only computes the keys that are not cached yet, computes byte-identical
+    images once whatever their names, and only appends the rows that are not
+    in the CSV yet, so an interrupted run can simply be started again.
+
+    Images are processed ``batch_size`` at a time. Each image of a batch is
+    decoded once with ``image_loader.load_image``, and that decode is the one
+    timed for its rows, then published in shared memory. Every (image, codec)
+    pair is a task on a pool of ``workers`` processes (one per CPU by default)
+    that maps the pixels instead of decoding the file again. Tasks are submitted longest first, estimated from the codec
+    cost and the pixel count, but rows are written in file name order and then
+    ``CODECS`` order as soon as all earlier rows are in. Tasks caught in a
+    crashed worker are rerun one at a time so that only the crashing task loses
+    its rows. Failed tasks are neither cached nor written, not even the rows
+    they produced before failing, and run again next time.
+
+    An existing CSV must have the ``CSV_HEADER`` columns, otherwise a
+    ``ValueError`` is raised before anything runs.
+
+    Timings come from ``timing.benchmark``: after ``warmup`` untimed calls,
+    every codec call is timed ``repeats`` times with ``time.perf_counter_ns``
+    and split into the load, transform, entropy coding and write phases the
+    codecs mark. By default every codec call runs once; warmups and repeats
+    are opt-in. The timing columns give the median, p90 and min of the total
+    and the median of each phase; they are the ones to compare across codecs,
+    unlike the time each codec reports itself.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    valid_extensions = (".bmp", ".dng", ".jpg", ".png")  # Include more extensions as needed
+    write_header = needs_header(csv_file_path)
+    codecs = [codec for codec in CODECS if webp_sweep or codec != "webp_sweep"]
+    filenames = [filename for filename in sorted(os.listdir(input_folder))
+                 if os.path.isfile(os.path.join(input_folder, filename)) and filename.lower().endswith(valid_extensions)]
+
+    # Key every (image, codec) pair and drop the ones already in the CSV
+    fingerprints = {codec: codec_fingerprint(CODECS[codec][2], repeats, warmup) for codec in codecs}
+    hashes = {filename: content_hash(os.path.join(input_folder, filename)) for filename in filenames}
+    results, written = load_cache(cache_path(csv_file_path))
+    pending = [(filename, (hashes[filename], codec, *fingerprints[codec])) for filename in filenames for codec in codecs]
+    pending = [(filename, key) for filename, key in pending if (key, filename) not in written]
+
+    # Missing keys, grouped by source image and computed from its first file name
+    sources = {}
+    for filename, key in pending:
+        if key not in results:
+            keys = sources.setdefault(key[0], (filename, []))[1]
+            if key not in keys:
+                keys.append(key)
+    missing = sum(len(keys) for _, keys in sources.values())
+    print(f"{len(pending)} results to write, {missing} to compute")
+
+    with open(csv_file_path, mode="a", newline="") as csv_file, open_cache(cache_path(csv_file_path)) as cache_file:
+        csv_writer = csv.writer(csv_file)
+        if write_header:
+            csv_writer.writerow(CSV_HEADER)
+
+        failed = set()
+        position = 0
+
+        def write_ready():
+            nonlocal position
+            while position < len(pending):
+                filename, key = pending[position]
+                if key in results:
+                    csv_writer.writerows([filename, *row[1:]] for row in results[key])
+                    csv_file.flush()
+                    append_entry(cache_file, key, filename=filename)
+                elif key not in failed:
+                    break
+                position += 1
+
+        def on_done(key, result):
+            rows, complete = result
+            if complete:
+                results[key] = rows
+                append_entry(cache_file, key, rows=rows)
+            else:
+                failed.add(key)
+            write_ready()
+
+        write_ready()
+        batches = list(sources.values())
+        for start in range(0, len(batches), batch_size):
+            blocks, tasks = [], []
+            for filename, keys in batches[start:start + batch_size]:
+                print(f"Processing: {filename}")
+                input_image_path = os.path.join(input_folder, filename)
                 try:
-                    png_result = png_compression(input_image_path, compressed_file_path_png)
-                    csv_writer.writerow([
-                        filename, png_result["original_size"], png_result["compressed_size"],
-                        png_result["compression_ratio"], png_result["time_taken"],
-                        png_result["entropy"], png_result["redundancy"], "png"
-                    ])
+                    image, decode_timing = benchmark(lambda: source_image(input_image_path), repeats=1, warmup=0)
+                    block, descriptor = publish_image(image)
                 except Exception as e:
-                    print(f"Error processing {filename} with PNG: {e}")
+                    print(f"Error loading {filename}: {e}")
+                    for key in keys:
+                        on_done(key, ([], False))
+                    continue
+                blocks.append(block)
+                tasks += [(key, (key[1], filename, input_image_path, descriptor, output_folder, repeats, warmup,
+                                 decode_timing["median"])) for key in keys]
+            tasks.sort(key=lambda task: CODECS[task[0][1]][1] * math.prod(task[1][3][1]), reverse=True)
+            try:
+                execute_tasks(tasks, workers, on_done)
+            finally:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
 
 
 if __name__ == "__main__":
@@ -1,8 +1,12 @@
 from PIL import Image
+import io
 import os
 import time
 import numpy as np
-from collections import Counter
+
+from image_loader import rgb_pixels, source_image
+from timing import phase
+from zlib_tuning import STRATEGIES, autotune_zlib
 
 
 def calculate_entropy(image):
@@ -12,16 +16,15 @@ def calculate_entropy(image):
     :param image: The input image as a numpy array.
     :return: Entropy and redundancy values.
     """
-    # Flatten the image and count the occurrences of each pixel value
-    flat_image = image.flatten()
-    value_counts = Counter(flat_image)
-    total_pixels = len(flat_image)
+    # Count the occurrences of each pixel value
+    value_counts = np.bincount(image.ravel(), minlength=256)
+    total_pixels = image.size
 
-    # Calculate probabilities of unique pixel values
-    probabilities = [count / total_pixels for count in value_counts.values()]
+    # Calculate probabilities of the pixel values that occur
+    probabilities = value_counts[value_counts > 0] / total_pixels
 
     # Calculate entropy
-    entropy = -sum(p * np.log2(p) for p in probabilities)
+    entropy = -np.sum(probabilities * np.log2(probabilities))
 
     # Calculate maximum entropy for an 8-bit image (256 possible values)
     max_entropy = np.log2(256)
@@ -32,37 +35,87 @@ def calculate_entropy(image):
     return entropy, redundancy
 
 
-def png_compression(input_image_path, output_image_path):
-    start_time = time.time()
+def encode_png(pixels, level, strategy):
+    """
+    Encodes an array as PNG in memory.
 
-    # Open the image using Pillow
-    image = Image.open(input_image_path)
-    
-    # Save the image as PNG with lossless compression
-    image.save(output_image_path, format="PNG", compress_level=9)
+    :param pixels: uint8 array of shape (height, width[, channels]).
+    :param level: zlib compression level.
+    :param strategy: zlib strategy constant.
+    :return: The PNG bytes.
+    """
+    buffer = io.BytesIO()
+    # Pillow filters the rows and deflates them in one call, which counts as
+    # the entropy coding phase
+    with phase("entropy_code"):
+        Image.fromarray(pixels).save(buffer, format="PNG", compress_level=level, compress_type=strategy)
+    return buffer.getvalue()
+
+
+def png_compression(input_image_path, output_image_path=None, level=9, strategy="filtered", target_ratio=None,
+                    time_budget=None, verify=False, image=None):
+    """
+    Encodes an image as PNG in memory and saves it if ``output_image_path`` is
+    given. Sizes come from the encoded buffer and the metrics from the source
+    pixels.
+
+    :param level: zlib level, or "auto" to pick the level and strategy with
+                  ``zlib_tuning.autotune_zlib`` on sampled bands of the image.
+    :param strategy: Key of ``zlib_tuning.STRATEGIES``, ignored with "auto". Pillow
+                     uses "filtered" for PNG by default.
+    :param target_ratio: Target ratio for "auto", see ``autotune_zlib``.
+    :param time_budget: Seconds per MB for "auto", see ``autotune_zlib``.
+    :param verify: Decode the encoded buffer and report in ``verified`` whether
+                   it matches the source pixels.
+    :param image: The source already decoded by ``image_loader.load_image``, an
+                  array or memoryview. ``None`` decodes ``input_image_path``.
+    """
+    start_time = time.perf_counter()
+
+    # Decode the image unless it was decoded already; PNG stores RGB
+    with phase("load"):
+        pixels = rgb_pixels(source_image(input_image_path, image))
 
-    end_time = time.time()
+    tuning = {}
+    if level == "auto":
+        tuning = autotune_zlib(pixels, encode_png, target_ratio, time_budget)
+        level, strategy = tuning.pop("level"), tuning.pop("strategy")
+        tuning["time_taken_tuning"] = time.perf_counter() - start_time
+
+    # Encode the image as PNG with lossless compression
+    encode_start_time = time.perf_counter()
+    encoded = encode_png(pixels, level, STRATEGIES[strategy])
+    if output_image_path:
+        with phase("write"), open(output_image_path, "wb") as f:
+            f.write(encoded)
+
+    end_time = time.perf_counter()
+    if tuning:
+        tuning["time_taken_encode"] = end_time - encode_start_time
 
     # Get the sizes
     original_size = os.path.getsize(input_image_path)
-    compressed_size = os.path.getsize(output_image_path)
+    compressed_size = len(encoded)
     compression_ratio = original_size / compressed_size
     time_taken = end_time - start_time
 
-    # Load the compressed image to calculate entropy and redundancy
-    compressed_image = np.array(image)
-
-    # Calculate entropy and redundancy for the compressed image
-    entropy, redundancy = calculate_entropy(compressed_image)
+    # Calculate entropy and redundancy from the source pixels
+    entropy, redundancy = calculate_entropy(pixels)
 
-    return {
+    result = {
         "original_size": original_size,
         "compressed_size": compressed_size,
         "compression_ratio": compression_ratio,
         "time_taken": time_taken,
         "entropy": entropy,
         "redundancy": redundancy,
+        "zlib_level": level,
+        "zlib_strategy": strategy,
+        **tuning
     }
+    if verify:
+        result["verified"] = np.array_equal(pixels, np.asarray(Image.open(io.BytesIO(encoded))))
+    return result
 
 if __name__ == "__main__":
     input_image_path = "Wallpaper_1.jpg"  # Replace with your image path
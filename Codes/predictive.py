@@ -1,20 +1,375 @@
 import numpy as np
 import cv2
+import bz2
 import gzip
+import lzma
 import os
+import struct
 import time
-from collections import Counter
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 
+from image_loader import source_image
+from timing import phase
 
-def predictive_coding_compression(image_path, output_path):
-    start_time = time.time()
+FILE_MAGIC = b'PRC'
+FORMAT_VERSION = 2
+HEADER_FORMAT_V1 = '<3sBIIBBBI'
+HEADER_FORMAT = '<3sBIIBBBIBH'
+PREDICTOR_NAMES = ('left', 'top', 'average', 'paeth', 'med', 'gap')
+PREDICTOR_MODES = PREDICTOR_NAMES + ('adaptive',)
+BLOCK_SIZE = 32
+BORDER_PREDICTION = 128
+RESIDUAL_MAPPINGS = ('zigzag', 'modulo')
+BACKENDS = {
+    'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress, 9),
+    'bz2': (lambda data, level: bz2.compress(data, level), bz2.decompress, 9),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 6),
+}
+BACKEND_NAMES = tuple(BACKENDS)
+# Estimated code length of a residual byte, log2(1 + |residual|) with the
+# residual centred on [-128, 127], indexed by the residual modulo 256.
+RESIDUAL_COST = np.log2(1 + np.abs(((np.arange(256) + 128) & 255) - 128), dtype=np.float32)
 
-    # Read the image in RGB (BGR format in OpenCV)
-    image = cv2.imread(image_path)
-    if image is None:
-        raise FileNotFoundError(f"Image not found at {image_path}")
 
-    # Get image dimensions
+def median_edge(n):
+    low = np.minimum(n['W'], n['N'])
+    high = np.maximum(n['W'], n['N'])
+    return np.where(n['NW'] >= high, low, np.where(n['NW'] <= low, high, n['W'] + n['N'] - n['NW']))
+
+
+def paeth(n):
+    estimate = n['W'] + n['N'] - n['NW']
+    distance_left = np.abs(estimate - n['W'])
+    distance_top = np.abs(estimate - n['N'])
+    distance_top_left = np.abs(estimate - n['NW'])
+    return np.where((distance_left <= distance_top) & (distance_left <= distance_top_left), n['W'],
+                    np.where(distance_top <= distance_top_left, n['N'], n['NW']))
+
+
+def gradient_adjusted(n):
+    """
+    CALIC gradient-adjusted predictor (GAP). The blend is computed in eighths so
+    the encoder and decoder agree exactly.
+    """
+    w, ww, north, nw, ne, nn, nne = (n[k].astype(np.int32) for k in ('W', 'WW', 'N', 'NW', 'NE', 'NN', 'NNE'))
+    horizontal = np.abs(w - ww) + np.abs(north - nw) + np.abs(north - ne)
+    vertical = np.abs(w - nw) + np.abs(north - nn) + np.abs(ne - nne)
+    difference = vertical - horizontal
+    eighths = 4 * (w + north) + 2 * (ne - nw)
+    eighths = np.select(
+        [difference > 32, difference > 8, difference < -32, difference < -8],
+        [(eighths + 8 * w) >> 1, (3 * eighths + 8 * w) >> 2, (eighths + 8 * north) >> 1, (3 * eighths + 8 * north) >> 2],
+        eighths)
+    predicted = np.clip((eighths + 4) >> 3, 0, 255)
+    predicted = np.where(difference > 80, w, np.where(difference < -80, north, predicted))
+    return predicted.astype(np.int16)
+
+
+# Each predictor maps the causal neighbours W, WW, N, NW, NE, NN and NNE of a set
+# of pixels to their predictions. Neighbours outside the image are clamped to
+# the nearest pixel in the image.
+PREDICTORS = {
+    'left': lambda n: n['W'],
+    'top': lambda n: n['N'],
+    'average': lambda n: (n['W'] + n['N']) >> 1,
+    'paeth': paeth,
+    'med': median_edge,
+    'gap': gradient_adjusted,
+}
+
+
+def predict_borders(predicted, n, top_row, left_column):
+    """
+    Predicts the top row from the left neighbour, the left column from the top
+    neighbour and the corner pixel as ``BORDER_PREDICTION``.
+    """
+    predicted = np.where(top_row[..., None], n['W'], predicted)
+    predicted = np.where(left_column[..., None], n['N'], predicted)
+    return np.where((top_row & left_column)[..., None], BORDER_PREDICTION, predicted)
+
+
+def image_neighbours(pixels, context_rows=0):
+    """
+    Returns the causal neighbours of every pixel as shifted views of an
+    edge-padded copy of the image. The first ``context_rows`` rows (at most
+    two) of ``pixels`` only serve as neighbours of the rows below them.
+    """
+    padded = np.pad(pixels, ((2 - context_rows, 0), (2, 1), (0, 0)), mode='edge')
+    return {
+        'W': padded[2:, 1:-2], 'WW': padded[2:, :-3],
+        'N': padded[1:-1, 2:-1], 'NW': padded[1:-1, 1:-2], 'NE': padded[1:-1, 3:],
+        'NN': padded[:-2, 2:-1], 'NNE': padded[:-2, 3:],
+    }
+
+
+def band_errors(image, first_row, last_row, predictors, stripe_rows):
+    """
+    Computes the prediction error of every predictor in ``predictors`` for the
+    rows ``first_row`` to ``last_row`` of the image, reading at most two rows
+    above them, so memory grows with the band and not with the image.
+
+    :param stripe_rows: The predictor restarts every ``stripe_rows`` rows.
+    :return: int16 array of shape (len(predictors), last_row - first_row, width, channels).
+    """
+    errors = np.empty((len(predictors), last_row - first_row) + image.shape[1:], dtype=np.int16)
+    row = first_row
+    while row < last_row:
+        stripe_start = row - row % stripe_rows
+        end = min(last_row, stripe_start + stripe_rows)
+        context_rows = min(row - stripe_start, 2)
+        pixels = image[row - context_rows:end].astype(np.int16)
+        n = image_neighbours(pixels, context_rows)
+        pixels = pixels[context_rows:]
+        for index, name in enumerate(predictors):
+            error = errors[index, row - first_row:end - first_row]
+            np.subtract(pixels, PREDICTORS[name](n), out=error)
+            # Same borders as predict_borders: the left column is predicted
+            # from the top neighbour, the top row of a stripe from the left
+            # neighbour and its first pixel as BORDER_PREDICTION.
+            error[:, 0] = pixels[:, 0] - n['N'][:, 0]
+            if row == stripe_start:
+                error[0] = pixels[0] - n['W'][0]
+                error[0, 0] = pixels[0, 0] - BORDER_PREDICTION
+        row = end
+    return errors
+
+
+def compute_prediction_error(image, predictor='med', block_size=BLOCK_SIZE, stripe_rows=None):
+    """
+    Computes the prediction error of an image for one of ``PREDICTOR_MODES``.
+
+    The image is processed one row of ``block_size`` x ``block_size`` blocks at
+    a time. In ``'adaptive'`` mode every predictor is tried on the band and
+    each block keeps the one with the smallest estimated code length, the sum
+    of log2(1 + |residual|) over the block with residuals taken modulo 256 as
+    they are stored.
+
+    :return: (prediction_error, predictor_map) where predictor_map is a uint8
+             array holding one index into ``PREDICTOR_NAMES`` per block.
+    """
+    if predictor not in PREDICTOR_MODES:
+        raise ValueError(f"Unknown predictor {predictor!r}, expected one of {PREDICTOR_MODES}")
+    height, width, _ = image.shape
+    stripe_rows = stripe_rows or max(height, 1)
+    prediction_error = np.empty(image.shape, dtype=np.int16)
+    if predictor != 'adaptive':
+        for row in range(0, height, block_size):
+            last_row = min(row + block_size, height)
+            prediction_error[row:last_row] = band_errors(image, row, last_row, (predictor,), stripe_rows)[0]
+        return prediction_error, np.full((1, 1), PREDICTOR_NAMES.index(predictor), dtype=np.uint8)
+
+    block_columns = np.arange(0, width, block_size)
+    predictor_map = np.empty((-(-height // block_size), len(block_columns)), dtype=np.uint8)
+    for block_row, row in enumerate(range(0, height, block_size)):
+        last_row = min(row + block_size, height)
+        errors = band_errors(image, row, last_row, PREDICTOR_NAMES, stripe_rows)
+        cost = [np.add.reduceat(RESIDUAL_COST[error & 255].sum(axis=(0, 2)), block_columns) for error in errors]
+        predictor_map[block_row] = np.argmin(cost, axis=0)
+        choice = predictor_map[block_row].repeat(block_size)[:width]
+        prediction_error[row:last_row] = np.take_along_axis(errors, choice[None, None, :, None], axis=0)[0]
+    return prediction_error, predictor_map
+
+
+def pixel_predictors(predictor_map, block_size, height, width):
+    """Expands a per-block predictor map to one predictor index per pixel."""
+    return predictor_map.repeat(block_size, axis=0).repeat(block_size, axis=1)[:height, :width]
+
+
+def reconstruct(prediction_error, predictors):
+    """
+    Rebuilds the image from the output of ``compute_prediction_error``.
+
+    :param predictors: Predictor index per pixel, as from ``pixel_predictors``.
+    """
+    wide = PREDICTOR_NAMES.index('gap') in np.unique(predictors)
+    return reconstruct_wavefronts(prediction_error.shape, predictors,
+                                  lambda n, rows, columns, predicted: prediction_error[rows, columns], wide)
+
+
+def reconstruct_wavefronts(shape, predictors, residuals, wide=False):
+    """
+    Rebuilds an image wavefront by wavefront.
+
+    The pixels with 2 * i + j = t only depend on pixels with smaller t, even for
+    GAP which reads the top-right neighbours, so the image is rebuilt one such
+    wavefront at a time with NumPy operations. When ``wide`` is False only the
+    W, N and NW neighbours are read and the shorter anti-diagonal wavefront
+    i + j = t is used.
+
+    :param shape: (height, width, channels) of the image.
+    :param predictors: Predictor index per pixel, as from ``pixel_predictors``.
+    :param residuals: Called as ``residuals(n, rows, columns, predicted)`` for
+                      every wavefront in turn, with the neighbour dict and the
+                      predictions of its pixels, and returns their prediction
+                      errors.
+    :param wide: Also gather the WW, NE, NN and NNE neighbours.
+    """
+    height, width, channels = shape
+    used = np.unique(predictors)
+    skew = 2 if wide else 1
+    reconstructed_image = np.zeros((height, width, channels), dtype=np.int16)
+    for t in range(skew * (height - 1) + width):
+        rows = np.arange(max(0, -(-(t - width + 1) // skew)), min(height - 1, t // skew) + 1)
+        columns = t - skew * rows
+        up, left = np.maximum(rows - 1, 0), np.maximum(columns - 1, 0)
+        n = {'W': reconstructed_image[rows, left], 'N': reconstructed_image[up, columns],
+             'NW': reconstructed_image[up, left]}
+        if wide:
+            up2, left2, right = np.maximum(rows - 2, 0), np.maximum(columns - 2, 0), np.minimum(columns + 1, width - 1)
+            n.update(WW=reconstructed_image[rows, left2], NE=reconstructed_image[up, right],
+                     NN=reconstructed_image[up2, columns], NNE=reconstructed_image[up2, right])
+
+        if len(used) == 1:
+            predicted = PREDICTORS[PREDICTOR_NAMES[used[0]]](n)
+        else:
+            choice = predictors[rows, columns][:, None]
+            predicted = np.zeros_like(n['W'])
+            for index in used:
+                predicted = np.where(choice == index, PREDICTORS[PREDICTOR_NAMES[index]](n), predicted)
+        predicted = predict_borders(predicted, n, rows == 0, columns == 0)
+        reconstructed_image[rows, columns] = (predicted + residuals(n, rows, columns, predicted)) & 255
+    return reconstructed_image.astype(np.uint8)
+
+
+def med_reconstruct(prediction_error):
+    """
+    Rebuilds the image from its MED prediction error along anti-diagonal wavefronts.
+
+    Pixel (i, j) depends on (i, j - 1), (i - 1, j) and (i - 1, j - 1), which all
+    lie on the two previous anti-diagonals i + j = d - 1 and d - 2. Every
+    anti-diagonal is therefore reconstructed with one set of NumPy operations.
+    The two previous diagonals are kept in buffers indexed by row, so the
+    neighbours of rows lo..hi are plain slices of them.
+    """
+    height, width, channels = prediction_error.shape
+    reconstructed_image = np.empty((height, width, channels), dtype=np.uint8)
+    current = np.zeros((height, channels), dtype=np.int16)
+    previous = np.zeros_like(current)
+    before_previous = np.zeros_like(current)
+    for d in range(height + width - 1):
+        first_row, last_row = max(0, d - width + 1), min(d, height - 1)
+        rows = np.arange(first_row, last_row + 1)
+        error = prediction_error[rows, d - rows]
+
+        # Rows with a left and a top neighbour use MED, the top row and the
+        # left column were predicted as 0.
+        lo, hi = max(1, first_row), min(d - 1, height - 1)
+        current[first_row:last_row + 1] = error
+        if lo <= hi:
+            left = previous[lo:hi + 1]
+            top = previous[lo - 1:hi]
+            top_left = before_previous[lo - 1:hi]
+            low = np.minimum(left, top)
+            high = np.maximum(left, top)
+            predicted = np.where(top_left >= high, low, np.where(top_left <= low, high, left + top - top_left))
+            current[lo:hi + 1] += predicted
+        # Wrap modulo 256: a no-op for exact int16 errors, and it undoes the
+        # modulo step of the residual mappings.
+        np.bitwise_and(current[first_row:last_row + 1], 255, out=current[first_row:last_row + 1])
+        reconstructed_image[rows, d - rows] = current[first_row:last_row + 1]
+        before_previous, previous, current = previous, current, before_previous
+    return reconstructed_image
+
+
+def map_residuals(prediction_error, mapping='zigzag'):
+    """
+    Maps int16 prediction errors to one byte per sample.
+
+    Errors of 8-bit data are only needed modulo 256, since the decoder wraps the
+    reconstructed pixel modulo 256 as well. ``'modulo'`` stores the wrapped value
+    as is, ``'zigzag'`` first centres it on [-128, 127] and then folds it to
+    0, -1, 1, -2, 2, ... -> 0, 1, 2, 3, 4, ... so small errors of either sign get
+    small byte values.
+
+    :param prediction_error: int16 array returned by ``compute_prediction_error``.
+    :param mapping: One of ``RESIDUAL_MAPPINGS``.
+    :return: uint8 array of the same shape.
+    """
+    wrapped = prediction_error.astype(np.uint8)
+    if mapping == 'modulo':
+        return wrapped
+    if mapping != 'zigzag':
+        raise ValueError(f"Unknown residual mapping {mapping!r}, expected one of {RESIDUAL_MAPPINGS}")
+    signed = wrapped.view(np.int8)
+    return ((signed.astype(np.int16) << 1) ^ (signed >> 7)).astype(np.uint8)
+
+
+def unmap_residuals(mapped, mapping='zigzag'):
+    """
+    Inverse of ``map_residuals``. Returns int16 errors that are equal to the
+    original ones modulo 256.
+    """
+    if mapping == 'modulo':
+        return mapped.astype(np.int16)
+    if mapping != 'zigzag':
+        raise ValueError(f"Unknown residual mapping {mapping!r}, expected one of {RESIDUAL_MAPPINGS}")
+    folded = mapped.astype(np.int16)
+    return (folded >> 1) ^ -(folded & 1)
+
+
+def reconstruct_stripes(prediction_error, stripe_rows, workers=None, predictors=None):
+    """
+    Reconstructs an image encoded with predictor restarts every ``stripe_rows``
+    rows. Stripes are independent and are decoded on a process pool.
+
+    :param predictors: Predictor index per pixel for ``reconstruct``. Without it
+                       the stripes are decoded with ``med_reconstruct``.
+    """
+    starts = range(0, prediction_error.shape[0], stripe_rows)
+    stripes = [prediction_error[row:row + stripe_rows] for row in starts]
+    if predictors is None:
+        function, tasks = med_reconstruct, (stripes,)
+    else:
+        function, tasks = reconstruct, (stripes, [predictors[row:row + stripe_rows] for row in starts])
+    if workers == 1 or len(stripes) < 2:
+        return np.concatenate(list(map(function, *tasks)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return np.concatenate(list(executor.map(function, *tasks)))
+
+
+def med_reconstruct_reference(prediction_error):
+    """
+    Per-pixel loop version of ``med_reconstruct``, kept as a reference to check
+    the wavefront decoder against.
+    """
+    # Initialize the reconstructed image
+    height, width, channels = prediction_error.shape
+    reconstructed_image = np.zeros((height, width, channels), dtype=np.uint8)
+
+    # Reconstruct the image using the prediction error for each channel
+    for i in range(height):
+        for j in range(width):
+            if i == 0 or j == 0:  # Top row or left column
+                predicted_pixel = [0, 0, 0]  # For R, G, B
+            else:
+                left = reconstructed_image[i, j - 1].astype(np.int16)
+                top = reconstructed_image[i - 1, j].astype(np.int16)
+                top_left = reconstructed_image[i - 1, j - 1].astype(np.int16)
+
+                # MED predictor for each channel
+                predicted_pixel = []
+                for c in range(3):  # Loop over the RGB channels
+                    if top_left[c] >= max(left[c], top[c]):
+                        predicted_pixel.append(min(left[c], top[c]))
+                    elif top_left[c] <= min(left[c], top[c]):
+                        predicted_pixel.append(max(left[c], top[c]))
+                    else:
+                        predicted_pixel.append(left[c] + top[c] - top_left[c])
+
+            # Reconstruct the pixel value for each channel
+            reconstructed_pixel = np.array(predicted_pixel) + prediction_error[i, j]
+            reconstructed_image[i, j] = np.clip(reconstructed_pixel, 0, 255)
+
+    return reconstructed_image
+
+
+def med_prediction_error_reference(image):
+    """
+    Per-pixel loop version of the MED predictor of version 1 files, which
+    predict the top row and left column as 0, kept as a reference to check
+    ``compute_prediction_error`` and ``med_reconstruct`` against.
+    """
     height, width, channels = image.shape
 
     # Initialize the prediction error for each channel with np.int16 to avoid overflow
@@ -43,28 +398,72 @@ def predictive_coding_compression(image_path, output_path):
             # Calculate prediction error for each channel (store in int16 to avoid overflow)
             prediction_error[i, j] = image[i, j] - predicted_pixel
 
-    # Flatten the prediction error to calculate entropy
-    flat_prediction_error = prediction_error.flatten()
+    return prediction_error
+
+
+def predictive_coding_compression(image_path, output_path, stripe_rows=None, mapping='zigzag', backend='zlib',
+                                  level=None, predictor='med', block_size=BLOCK_SIZE, image=None):
+    """
+    Compresses an image with predictive coding.
+
+    The prediction errors are mapped to one byte per sample with
+    ``map_residuals`` and packed with a general purpose backend. The file starts
+    with a small header holding the image shape, mapping, backend and stripe
+    rows, the predictor and, in adaptive mode, the per-block predictor map, so
+    decompression needs nothing but the file.
 
-    # Calculate probabilities of unique values
-    value_counts = Counter(flat_prediction_error)
-    total_values = sum(value_counts.values())
-    probabilities = [count / total_values for count in value_counts.values()]
+    :param stripe_rows: Restart the predictor every ``stripe_rows`` rows.
+    :param mapping: Residual mapping, one of ``RESIDUAL_MAPPINGS``.
+    :param backend: One of ``BACKEND_NAMES``.
+    :param level: Backend compression level (lzma preset), defaults to 9 for zlib
+                  and bz2 and 6 for lzma.
+    :param predictor: One of ``PREDICTOR_MODES``. ``'adaptive'`` picks the best
+                      predictor for every ``block_size`` x ``block_size`` block.
+    :param image: The source already decoded by ``image_loader.load_image``, an
+                  array or memoryview. ``None`` decodes ``image_path``.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKEND_NAMES}")
+    if mapping not in RESIDUAL_MAPPINGS:
+        raise ValueError(f"Unknown residual mapping {mapping!r}, expected one of {RESIDUAL_MAPPINGS}")
+    compress, _, default_level = BACKENDS[backend]
+
+    start_time = time.perf_counter()
+
+    # Read the image in RGB (BGR format in OpenCV) unless it was decoded already
+    image = source_image(image_path, image)
+
+    # Predictive coding for each channel
+    with phase("transform"):
+        prediction_error, predictor_map = compute_prediction_error(image, predictor, block_size, stripe_rows)
+        residuals = map_residuals(prediction_error, mapping)
+
+    # Calculate probabilities of the stored residual bytes
+    value_counts = np.bincount(residuals.ravel(), minlength=256)
+    probabilities = value_counts[value_counts > 0] / residuals.size
 
     # Calculate entropy
-    entropy = -sum(p * np.log2(p) for p in probabilities)
+    entropy = -np.sum(probabilities * np.log2(probabilities))
 
     # Calculate maximum entropy for the data type
-    max_entropy = np.log2(2 ** 16)  # 16 bits (int16)
+    max_entropy = np.log2(2 ** 8)  # 8 bits (mapped residuals)
 
     # Calculate redundancy
     redundancy = max_entropy - entropy
 
-    # Compress the prediction error using gzip
-    with gzip.open(output_path, "wb") as f:
-        f.write(prediction_error.astype(np.int16).tobytes())
+    # Write the header followed by the packed predictor map and residuals
+    height, width, channels = image.shape
+    header = struct.pack(HEADER_FORMAT, FILE_MAGIC, FORMAT_VERSION, height, width, channels,
+                         RESIDUAL_MAPPINGS.index(mapping), BACKEND_NAMES.index(backend), stripe_rows or 0,
+                         PREDICTOR_MODES.index(predictor), block_size)
+    side_map = predictor_map.tobytes() if predictor == 'adaptive' else b''
+    with phase("entropy_code"):
+        packed = compress(side_map + residuals.tobytes(), default_level if level is None else level)
+    with phase("write"), open(output_path, "wb") as f:
+        f.write(header)
+        f.write(packed)
 
-    end_time = time.time()
+    end_time = time.perf_counter()
 
     original_size = os.path.getsize(image_path)
     compressed_size = os.path.getsize(output_path)
@@ -81,62 +480,90 @@ def predictive_coding_compression(image_path, output_path):
     }
 
 
-def predictive_coding_decompression(compressed_path, image_shape, output_image_path):
-    # Load the compressed prediction error
-    with gzip.open(compressed_path, "rb") as f:
-        prediction_error = np.frombuffer(f.read(), dtype=np.int16).reshape(image_shape)
+def read_prediction_error(compressed_path, image_shape=None):
+    """
+    Reads the prediction error stored by ``predictive_coding_compression``.
 
-    # Initialize the reconstructed image
-    height, width, channels = image_shape
-    reconstructed_image = np.zeros((height, width, channels), dtype=np.uint8)
+    Files written before the header was introduced are a bare gzip stream of
+    int16 errors; those still need ``image_shape``. Those and version 1 files
+    use MED with a zero border prediction.
 
-    # Reconstruct the image using the prediction error for each channel
-    for i in range(height):
-        for j in range(width):
-            if i == 0 or j == 0:  # Top row or left column
-                predicted_pixel = [0, 0, 0]  # For R, G, B
-            else:
-                left = reconstructed_image[i, j - 1].astype(np.int16)
-                top = reconstructed_image[i - 1, j].astype(np.int16)
-                top_left = reconstructed_image[i - 1, j - 1].astype(np.int16)
+    :return: (prediction_error, stripe_rows, predictors) where predictors holds
+             the predictor index of every pixel, or None for the older files.
+    """
+    with open(compressed_path, "rb") as f:
+        data = f.read()
+    if not data.startswith(FILE_MAGIC):
+        if image_shape is None:
+            raise ValueError(f"{compressed_path} has no header, image_shape is required")
+        return np.frombuffer(gzip.decompress(data), dtype=np.int16).reshape(image_shape), None, None
 
-                # MED predictor for each channel
-                predicted_pixel = []
-                for c in range(3):  # Loop over the RGB channels
-                    if top_left[c] >= max(left[c], top[c]):
-                        predicted_pixel.append(min(left[c], top[c]))
-                    elif top_left[c] <= min(left[c], top[c]):
-                        predicted_pixel.append(max(left[c], top[c]))
-                    else:
-                        predicted_pixel.append(left[c] + top[c] - top_left[c])
+    version = data[len(FILE_MAGIC)]
+    if version == 1:
+        header_size = struct.calcsize(HEADER_FORMAT_V1)
+        _, _, height, width, channels, mapping, backend, stripe_rows = struct.unpack(
+            HEADER_FORMAT_V1, data[:header_size])
+        predictor, block_size = None, None
+    elif version == FORMAT_VERSION:
+        header_size = struct.calcsize(HEADER_FORMAT)
+        _, _, height, width, channels, mapping, backend, stripe_rows, predictor, block_size = struct.unpack(
+            HEADER_FORMAT, data[:header_size])
+    else:
+        raise ValueError(f"Unsupported predictive coding format version {version}")
 
-            # Reconstruct the pixel value for each channel
-            reconstructed_pixel = np.array(predicted_pixel) + prediction_error[i, j]
-            reconstructed_image[i, j] = np.clip(reconstructed_pixel, 0, 255)
+    _, decompress, _ = BACKENDS[BACKEND_NAMES[backend]]
+    stream = decompress(data[header_size:])
+    predictors = None
+    if predictor is not None:
+        if PREDICTOR_MODES[predictor] == 'adaptive':
+            map_shape = (-(-height // block_size), -(-width // block_size))
+            predictor_map = np.frombuffer(stream, dtype=np.uint8, count=map_shape[0] * map_shape[1])
+            stream = stream[predictor_map.size:]
+            predictors = pixel_predictors(predictor_map.reshape(map_shape), block_size, height, width)
+        else:
+            predictors = np.full((height, width), predictor, dtype=np.uint8)
+    residuals = np.frombuffer(stream, dtype=np.uint8).reshape(height, width, channels)
+    return unmap_residuals(residuals, RESIDUAL_MAPPINGS[mapping]), stripe_rows or None, predictors
+
+
+def predictive_coding_decompression(compressed_path, image_shape=None, output_image_path=None, workers=None):
+    """
+    Decompresses a predictive-coded image. Shape, mapping, backend, stripe rows
+    and predictors are read from the file header.
+
+    :param image_shape: Only needed for headerless files from older versions.
+    :param output_image_path: Where the reconstructed image is saved, if given.
+    :param workers: Processes used to decode stripes in parallel.
+    """
+    prediction_error, stripe_rows, predictors = read_prediction_error(compressed_path, image_shape)
+
+    # Reconstruct the image wavefront by wavefront
+    if stripe_rows:
+        reconstructed_image = reconstruct_stripes(prediction_error, stripe_rows, workers, predictors)
+    elif predictors is None:
+        reconstructed_image = med_reconstruct(prediction_error)
+    else:
+        reconstructed_image = reconstruct(prediction_error, predictors)
 
     # Save the reconstructed image
-    cv2.imwrite(output_image_path, reconstructed_image)
+    if output_image_path is not None:
+        cv2.imwrite(output_image_path, reconstructed_image)
 
     return reconstructed_image
 
-
 if __name__ == "__main__":
     input_image_path = "Wallpaper_1.jpg"  # Replace with your image path
-    compressed_path = "compressed_prediction_error.gz"
+    compressed_path = "compressed_prediction_error.pred"
     reconstructed_image_path = "reconstructed_image.png"
 
     # Compression
     compression_result = predictive_coding_compression(input_image_path, compressed_path)
     print("Compression Results:", compression_result)
 
-    # Get the shape of the original image
     original_image = cv2.imread(input_image_path)
-    image_shape = original_image.shape
 
     # Decompression
-    reconstructed_image = predictive_coding_decompression(
-        compressed_path, image_shape, reconstructed_image_path
-    )
+    reconstructed_image = predictive_coding_decompression(compressed_path, output_image_path=reconstructed_image_path)
 
     # Verify
     if np.array_equal(original_image, reconstructed_image):
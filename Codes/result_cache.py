@@ -0,0 +1,132 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+# Codec results are cached in a JSON Lines file next to the results CSV. A
+# result line holds the rows computed for a key, a written line records that
+# the rows of a key were written to the CSV under a file name. A key is
+# (content hash of the source image, codec name, hash of the codec parameters,
+# hash of the codec code), so a changed image, parameter or codec module is
+# computed again while everything else is read back.
+CACHE_SUFFIX = ".cache.jsonl"
+HASH_CHUNK = 1 << 20
+LOCAL_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def cache_path(csv_file_path):
+    """
+    Returns the path of the cache stored next to ``csv_file_path``.
+    """
+    return os.path.splitext(csv_file_path)[0] + CACHE_SUFFIX
+
+
+def content_hash(file_path):
+    """
+    Returns the SHA-256 hex digest of a file's bytes.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_module(value):
+    """
+    Returns the module of this folder that defines ``value``, if any.
+    """
+    module = value if inspect.ismodule(value) else sys.modules.get(getattr(value, "__module__", None))
+    path = getattr(module, "__file__", None)
+    if path and os.path.dirname(os.path.abspath(path)) == LOCAL_FOLDER:
+        return module
+    return None
+
+
+def codec_fingerprint(generate_rows, *settings):
+    """
+    Hashes what a codec's rows depend on.
+
+    :param generate_rows: Row generator of ``main.CODECS``.
+    :param settings: Other values the rows depend on, such as the number of
+                     timed runs.
+    :return: ``(params, version)``. ``params`` hashes the source of the
+             generator, which holds the arguments the codec is called with,
+             the helpers it calls from its own module and ``settings``. ``version``
+             hashes the source files of the other local modules it uses,
+             following their imports.
+    """
+    own_module = local_module(generate_rows)
+    names = [generate_rows.__globals__[name] for name in generate_rows.__code__.co_names
+             if name in generate_rows.__globals__]
+    params = hashlib.sha256(inspect.getsource(generate_rows).encode() + repr(settings).encode())
+    modules, pending = {}, []
+    for value in names:
+        module = local_module(value)
+        if module is own_module:
+            if inspect.isfunction(value):
+                params.update(inspect.getsource(value).encode())
+        elif module is not None:
+            pending.append(module)
+    while pending:
+        module = pending.pop()
+        if module.__name__ not in modules:
+            modules[module.__name__] = module
+            pending += [dependency for dependency in map(local_module, vars(module).values())
+                        if dependency is not None and dependency is not own_module]
+    version = hashlib.sha256()
+    for name in sorted(modules):
+        with open(modules[name].__file__, "rb") as f:
+            version.update(f.read())
+    return params.hexdigest(), version.hexdigest()
+
+
+def load_cache(path):
+    """
+    Reads a cache file.
+
+    :return: A dict from key to cached rows, and the set of (key, file name)
+             pairs whose rows are already in the CSV. A line cut short by an
+             interrupted run is skipped.
+    """
+    results, written = {}, set()
+    if not os.path.exists(path):
+        return results, written
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            key = tuple(entry["key"])
+            if "rows" in entry:
+                results[key] = entry["rows"]
+            else:
+                written.add((key, entry["filename"]))
+    return results, written
+
+
+def open_cache(path):
+    """
+    Opens a cache file for appending, ending a line cut short by an
+    interrupted run first so that the next entry starts on its own line.
+    """
+    complete = True
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            complete = f.read() == b"\n"
+    cache_file = open(path, "a")
+    if not complete:
+        cache_file.write("\n")
+    return cache_file
+
+
+def append_entry(cache_file, key, **entry):
+    """
+    Appends a result (``rows=...``) or written (``filename=...``) line to an
+    open cache file and flushes it, so an interrupted run keeps its progress.
+    """
+    cache_file.write(json.dumps({"key": list(key), **entry}, default=lambda value: value.item()) + "\n")
+    cache_file.flush()
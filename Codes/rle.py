@@ -2,20 +2,45 @@ import os
 import numpy as np
 from PIL import Image
 import time
+from functools import lru_cache
+
+from image_loader import rgb_pixels, source_image
+from timing import phase
+
+
+# Binary mode: every channel plane is flattened and stored as PackBits packets.
+# A header byte n <= 127 is followed by n + 1 literal bytes, a header byte
+# n >= 129 is followed by one byte repeated 257 - n times, and 128 is a no-op.
+BINARY_MAGIC = b'RLEB'
+BINARY_VERSION = 2
+# Order in which a channel plane is traversed before run detection. 'row'
+# continues runs across row ends, 'snake' reverses every other row, 'hilbert'
+# follows Hilbert curves over square tiles. 'auto' picks the order with the
+# fewest runs on SCAN_SAMPLE_BANDS bands of SCAN_SAMPLE_ROWS rows.
+SCAN_ORDERS = ('row', 'column', 'snake', 'hilbert')
+SCAN_SAMPLE_BANDS = 4
+SCAN_SAMPLE_ROWS = 32
+MIN_REPEAT = 3  # Shorter runs are cheaper to store inside literal packets
+MAX_PACKET = 128
 
 
 class RLE:
-    def __init__(self, path):
+    def __init__(self, path, image=None):
         self.path = path
+        self.source = image  # Pixels already decoded by image_loader.load_image, if any
         print(f"Initialized RLE object for file: {self.path}")
 
     ''''''
     ''' --------------------- Compression of the Image --------------------- '''
     ''''''
 
-    def compress(self):
+    def compress(self, outputPath=None):
+        """
+        Compresses the image with text RLE and writes it to ``outputPath``, by
+        default ``Compressed/<name>Compressed.rle`` under the working directory.
+        """
         print("Starting image compression using RLE...")
-        start_time = time.time()
+        start_time = time.perf_counter()
         self.initCompress()
         compressedColors = []
         print("Compressing Red channel...")
@@ -26,26 +51,21 @@ class RLE:
         compressedColors.append(self.compressColor(self.blue))
         print("Image compression complete. Writing compressed data to file...")
 
-        filesplit = str(os.path.basename(self.path)).split('.')
-        filename = filesplit[0] + 'Compressed.rle'
-        savingDirectory = os.path.join(os.getcwd(), 'Compressed')
-        os.makedirs(savingDirectory, exist_ok=True)
-
-        compressed_file_path = os.path.join(savingDirectory, filename)
-        with open(compressed_file_path, 'w') as file:
+        compressed_file_path = self.compressedPath('.rle', outputPath)
+        with phase("write"), open(compressed_file_path, 'w') as file:
             for color in compressedColors:
                 for row in color:
                     file.write(row + "\n")
 
-        time_taken_compress = time.time() - start_time
+        time_taken_compress = time.perf_counter() - start_time
         original_size = os.path.getsize(self.path)
         compressed_size = os.path.getsize(compressed_file_path)
         compression_ratio = original_size / compressed_size
 
         entropy = self.calculate_entropy()
-        redundancy = 1 - (entropy / (8 * self.image.mode.count("RGB")))
+        redundancy = 1 - (entropy / 8)  # 8 bits per RGB sample
 
-        print(f"Compressed image saved as {filename}")
+        print(f"Compressed image saved as {os.path.basename(compressed_file_path)}")
         print(f"Compression Metrics:")
         print(f" - Original size: {original_size} bytes")
         print(f" - Compressed size: {compressed_size} bytes")
@@ -64,26 +84,228 @@ class RLE:
 
     def compressColor(self, colorList):
         compressedColor = []
-        for currentRow in colorList:
-            compressedRow = []
-            currentValue = currentRow[0]
-            count = 1
-
-            for i in range(1, len(currentRow)):
-                if currentRow[i] == currentValue:
-                    count += 1
-                else:
-                    compressedRow.append(f"{currentValue},{count}")
-                    currentValue = currentRow[i]
-                    count = 1
-
-            compressedRow.append(f"{currentValue},{count}")  # Append the last value-count pair
-            compressedColor.append(" ".join(compressedRow))
+        with phase("entropy_code"):
+            for currentRow in colorList:
+                compressedRow = []
+                currentValue = currentRow[0]
+                count = 1
+
+                for i in range(1, len(currentRow)):
+                    if currentRow[i] == currentValue:
+                        count += 1
+                    else:
+                        compressedRow.append(f"{currentValue},{count}")
+                        currentValue = currentRow[i]
+                        count = 1
+
+                compressedRow.append(f"{currentValue},{count}")  # Append the last value-count pair
+                compressedColor.append(" ".join(compressedRow))
         return compressedColor
 
+    def compressBinary(self, scanOrder='row', outputPath=None):
+        """
+        Compresses the image with PackBits RLE in ``scanOrder`` and writes it
+        to ``outputPath``, by default ``Compressed/<name>Compressed.rleb`` under
+        the working directory.
+        """
+        print("Starting image compression using binary RLE...")
+        start_time = time.perf_counter()
+        self.initCompressBinary()
+        with phase("transform"):
+            if scanOrder == 'auto':
+                scanOrder = self.chooseScanOrder(self.channels)
+                print(f"Selected {scanOrder} scan order")
+            scannedChannels = self.scanChannels(scanOrder)
+        with phase("entropy_code"):
+            compressedChannels = [self.packbitsEncode(channel) for channel in scannedChannels]
+        print("Image compression complete. Writing compressed data to file...")
+
+        # Header: magic, version, scan order, width, height and channel count,
+        # then every channel as an 8-byte stream length followed by its packets.
+        compressed_file_path = self.compressedPath('.rleb', outputPath)
+        with phase("write"), open(compressed_file_path, 'wb') as file:
+            file.write(BINARY_MAGIC)
+            file.write(BINARY_VERSION.to_bytes(1, 'big'))
+            file.write(SCAN_ORDERS.index(scanOrder).to_bytes(1, 'big'))
+            file.write(self.width.to_bytes(4, 'big'))
+            file.write(self.height.to_bytes(4, 'big'))
+            file.write(len(compressedChannels).to_bytes(1, 'big'))
+            for stream in compressedChannels:
+                file.write(len(stream).to_bytes(8, 'big'))
+                file.write(stream.tobytes())
+
+        time_taken_compress = time.perf_counter() - start_time
+        original_size = os.path.getsize(self.path)
+        compressed_size = os.path.getsize(compressed_file_path)
+        compression_ratio = original_size / compressed_size
+
+        entropy = self.calculate_entropy()
+        redundancy = 1 - (entropy / 8)  # 8 bits per RGB sample
+
+        print(f"Compressed image saved as {os.path.basename(compressed_file_path)}")
+        return {
+            "original_size": original_size,
+            "compressed_size": compressed_size,
+            "compression_ratio": compression_ratio,
+            "time_taken_compress": time_taken_compress,
+            "entropy": entropy,
+            "redundancy": redundancy,
+            "scan_order": scanOrder
+        }
+
+    def scanChannels(self, scanOrder):
+        """
+        Flattens every channel plane in ``scanOrder``. The 'row' order is the
+        memory order and needs no gather.
+        """
+        if scanOrder == 'row':
+            return [channel.ravel() for channel in self.channels]
+        indices = self.scanIndices(scanOrder, self.height, self.width)
+        return [channel.ravel()[indices] for channel in self.channels]
+
+    @staticmethod
+    def indexType(size):
+        """Smallest index dtype that addresses ``size`` pixels: uint32 below 2 ** 32, int64 above."""
+        return np.uint32 if size <= 2 ** 32 else np.int64
+
+    @staticmethod
+    @lru_cache(maxsize=len(SCAN_ORDERS))
+    def sampleIndices(scanOrder, height, width):
+        """
+        ``scanIndices`` of the bands ``chooseScanOrder`` samples, cached since
+        every image of a given width samples the same band shape. Full planes
+        are not cached: their indices take 4 bytes per pixel.
+        """
+        indices = RLE.scanIndices(scanOrder, height, width)
+        indices.setflags(write=False)
+        return indices
+
+    @staticmethod
+    def scanIndices(scanOrder, height, width):
+        """
+        Returns the flat (row-major) pixel indices of a height x width plane in
+        the given scan order, as uint32 unless the plane has 2 ** 32 pixels or more.
+        """
+        grid = np.arange(height * width, dtype=RLE.indexType(height * width)).reshape(height, width)
+        if scanOrder == 'row':
+            indices = grid.ravel()
+        elif scanOrder == 'column':
+            indices = grid.T.ravel()
+        elif scanOrder == 'snake':
+            grid[1::2] = grid[1::2, ::-1]
+            indices = grid.ravel()
+        elif scanOrder == 'hilbert':
+            indices = RLE.hilbertIndices(height, width)
+        else:
+            raise ValueError(f"Unknown scan order {scanOrder!r}, expected one of {SCAN_ORDERS}")
+        return indices
+
+    @staticmethod
+    def hilbertIndices(height, width):
+        """
+        Covers the plane with square tiles along its longer side, each the
+        smallest power of two not below the shorter side, and visits every
+        tile along a Hilbert curve. Points outside the plane are dropped.
+        """
+        if height == 0 or width == 0:
+            return np.zeros(0, dtype=RLE.indexType(0))
+        side = 1 << (min(height, width) - 1).bit_length()
+        # Hilbert curve d -> (x, y) for every d of one tile at once.
+        remaining = np.arange(side * side, dtype=np.int64)
+        x = np.zeros_like(remaining)
+        y = np.zeros_like(remaining)
+        step = 1
+        while step < side:
+            rx = 1 & (remaining // 2)
+            ry = 1 & (remaining ^ rx)
+            flip = (ry == 0) & (rx == 1)
+            x[flip] = step - 1 - x[flip]
+            y[flip] = step - 1 - y[flip]
+            swap = ry == 0
+            x[swap], y[swap] = y[swap], x[swap].copy()
+            x += step * rx
+            y += step * ry
+            remaining //= 4
+            step *= 2
+        tiles = np.arange(-(-max(height, width) // side), dtype=np.int64)[:, None] * side
+        if width >= height:
+            x, y = (x + tiles).ravel(), np.broadcast_to(y, (len(tiles), len(y))).ravel()
+        else:
+            x, y = np.broadcast_to(x, (len(tiles), len(x))).ravel(), (y + tiles).ravel()
+        inside = (x < width) & (y < height)
+        return (y[inside] * width + x[inside]).astype(RLE.indexType(height * width))
+
+    def chooseScanOrder(self, channels):
+        """
+        Counts the runs every scan order produces on a few evenly spaced bands
+        of rows and returns the order with the fewest.
+        """
+        height = channels.shape[1]
+        bandRows = min(SCAN_SAMPLE_ROWS, height)
+        bandStarts = np.linspace(0, height - bandRows, SCAN_SAMPLE_BANDS).astype(int)
+        bands = [channels[:, start:start + bandRows] for start in np.unique(bandStarts)]
+        runCounts = {}
+        for scanOrder in SCAN_ORDERS:
+            runCounts[scanOrder] = 0
+            for band in bands:
+                scanned = band.reshape(band.shape[0], -1)
+                if scanOrder != 'row':
+                    scanned = scanned[:, self.sampleIndices(scanOrder, *band.shape[1:])]
+                runCounts[scanOrder] += int(np.count_nonzero(scanned[:, 1:] != scanned[:, :-1]))
+        return min(SCAN_ORDERS, key=runCounts.get)
+
+    @staticmethod
+    def packbitsEncode(flat):
+        """
+        Encodes a 1-D uint8 array as PackBits packets without a Python loop.
+
+        Run boundaries come from comparing neighbouring bytes. Runs of at least
+        MIN_REPEAT bytes become repeat packets (split every MAX_PACKET bytes)
+        and the bytes between them become literal packets. Packets are
+        ordered by the position of their first byte, so the output offsets
+        are a cumulative sum of the packet sizes.
+        """
+        n = len(flat)
+        if n == 0:
+            return np.zeros(0, dtype=np.uint8)
+        runStarts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+        runLengths = np.diff(np.append(runStarts, n))
+        isRepeat = runLengths >= MIN_REPEAT
+
+        def splitPackets(starts, lengths):
+            chunks = (lengths + MAX_PACKET - 1) // MAX_PACKET
+            chunkIndex = np.arange(chunks.sum()) - np.repeat(np.cumsum(chunks) - chunks, chunks)
+            packetStarts = np.repeat(starts, chunks) + MAX_PACKET * chunkIndex
+            packetCounts = np.minimum(np.repeat(lengths, chunks) - MAX_PACKET * chunkIndex, MAX_PACKET)
+            return packetStarts, packetCounts
+
+        repeatStarts, repeatCounts = splitPackets(runStarts[isRepeat], runLengths[isRepeat])
+        literal = np.repeat(~isRepeat, runLengths)
+        edges = np.diff(np.concatenate(([0], literal.view(np.int8), [0])))
+        literalBegins = np.flatnonzero(edges == 1)
+        literalStarts, literalCounts = splitPackets(literalBegins, np.flatnonzero(edges == -1) - literalBegins)
+
+        packetStarts = np.concatenate((repeatStarts, literalStarts))
+        packetCounts = np.concatenate((repeatCounts, literalCounts))
+        # A repeat chunk of a single byte left over after splitting is stored as a literal.
+        packetRepeat = np.concatenate((repeatCounts > 1, np.zeros(len(literalStarts), dtype=bool)))
+        order = np.argsort(packetStarts, kind='stable')
+        packetStarts, packetCounts, packetRepeat = packetStarts[order], packetCounts[order], packetRepeat[order]
+
+        packetSizes = 1 + np.where(packetRepeat, 1, packetCounts)
+        offsets = np.cumsum(packetSizes) - packetSizes
+        output = np.empty(int(packetSizes.sum()), dtype=np.uint8)
+        output[offsets] = np.where(packetRepeat, 257 - packetCounts, packetCounts - 1)
+        output[offsets[packetRepeat] + 1] = flat[packetStarts[packetRepeat]]
+
+        literalOffsets = offsets[~packetRepeat] + 1
+        literalStarts, literalCounts = packetStarts[~packetRepeat], packetCounts[~packetRepeat]
+        withinPacket = np.arange(literalCounts.sum()) - np.repeat(np.cumsum(literalCounts) - literalCounts, literalCounts)
+        output[np.repeat(literalOffsets, literalCounts) + withinPacket] = flat[np.repeat(literalStarts, literalCounts) + withinPacket]
+        return output
+
     def calculate_entropy(self):
-        pixel_data = np.array(self.image)
-        unique, counts = np.unique(pixel_data, return_counts=True)
+        unique, counts = np.unique(self.pixels, return_counts=True)
         probabilities = counts / counts.sum()
         entropy = -np.sum(probabilities * np.log2(probabilities))
         return entropy
@@ -120,19 +342,92 @@ class RLE:
 
         return decodedRow
 
+    def decompressBinary(self):
+        print("Starting image decompression using binary RLE...")
+        with open(self.path, 'rb') as file:
+            if file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f"{self.path} is not a binary RLE file")
+            version = file.read(1)[0]
+            if version not in (1, BINARY_VERSION):
+                raise ValueError(f"Unsupported binary RLE version {version}")
+            scanOrder = SCAN_ORDERS[file.read(1)[0]] if version >= 2 else 'row'
+            width = int.from_bytes(file.read(4), 'big')
+            height = int.from_bytes(file.read(4), 'big')
+            channels = file.read(1)[0]
+            indices = None if scanOrder == 'row' else self.scanIndices(scanOrder, height, width)
+            image = np.empty((channels, height, width), dtype=np.uint8)
+            for channel in range(channels):
+                stream = file.read(int.from_bytes(file.read(8), 'big'))
+                decoded = self.packbitsDecode(stream)
+                if len(decoded) != height * width:
+                    raise ValueError(f"Channel {channel} decoded to {len(decoded)} bytes, expected {height * width}")
+                if indices is None:
+                    image[channel] = decoded.reshape(height, width)
+                else:
+                    image[channel].ravel()[indices] = decoded
+
+        self.saveImage(image)
+        print("Decompression complete. Decompressed image saved.")
+        return image
+
+    @staticmethod
+    def packbitsDecode(stream):
+        """
+        Decodes PackBits packets. Only the walk from one packet header to the
+        next is a Python loop; the bytes are expanded with np.repeat.
+        """
+        headerPositions = []
+        position = 0
+        while position < len(stream):
+            header = stream[position]
+            headerPositions.append(position)
+            position += 1 if header == 128 else 2 if header > 128 else header + 2
+        data = np.frombuffer(stream, dtype=np.uint8)
+        headerPositions = np.array(headerPositions, dtype=np.int64)
+        headers = data[headerPositions].astype(np.int64)
+        isRepeat = headers > 128
+        counts = np.where(isRepeat, 257 - headers, headers + 1)
+        counts[headers == 128] = 0
+        # Repeat packets read their single value byte over and over, literal
+        # packets read consecutive bytes.
+        withinPacket = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        source = np.repeat(headerPositions + 1, counts) + withinPacket * np.repeat(~isRepeat, counts)
+        return data[source]
+
     ''''''
     ''' ---------------------- Class Helper Functions ---------------------- '''
     ''''''
 
+    def compressedPath(self, extension, outputPath=None):
+        """
+        Returns ``outputPath``, or when it is None the default
+        ``Compressed/<name>Compressed<extension>`` path under the working
+        directory, creating that folder.
+        """
+        if outputPath is not None:
+            return outputPath
+        filesplit = str(os.path.basename(self.path)).split('.')
+        savingDirectory = os.path.join(os.getcwd(), 'Compressed')
+        os.makedirs(savingDirectory, exist_ok=True)
+        return os.path.join(savingDirectory, filesplit[0] + 'Compressed' + extension)
+
     def initCompress(self):
-        self.image = Image.open(self.path)
-        self.height, self.width = self.image.size
-        self.red, self.green, self.blue = self.processImage()
+        with phase("load"):
+            self.pixels = rgb_pixels(source_image(self.path, self.source))
+        self.height, self.width = self.pixels.shape[:2]
+        with phase("transform"):
+            self.red, self.green, self.blue = self.processImage()
+
+    def initCompressBinary(self):
+        with phase("load"):
+            self.pixels = rgb_pixels(source_image(self.path, self.source))
+        self.height, self.width = self.pixels.shape[:2]
+        with phase("transform"):
+            self.channels = np.ascontiguousarray(self.pixels.transpose(2, 0, 1))
 
     def processImage(self):
-        image = self.image.convert('RGB')
         red, green, blue = [], [], []
-        pixel_values = list(image.getdata())
+        pixel_values = self.pixels.reshape(-1, 3).tolist()
         iterator = 0
         for height_index in range(self.height):
             R, G, B = [], [], []
@@ -153,18 +448,8 @@ class RLE:
         savingDirectory = os.path.join(os.getcwd(), 'Decompressed')
         os.makedirs(savingDirectory, exist_ok=True)
 
-        imagelist, imagesize = self.makeImageData(image[0], image[1], image[2])
-        imagenew = Image.new('RGB', imagesize)
-        imagenew.putdata(imagelist)
-        imagenew.save(os.path.join(savingDirectory, filename))
-
-    def makeImageData(self, r, g, b):
-        imagelist = []
-        for i in range(len(r)):
-            for j in range(len(r[0])):
-                imagelist.append((r[i][j], g[i][j], b[i][j]))
-        return imagelist, (len(r), len(r[0]))
-
+        pixels = np.ascontiguousarray(image.transpose(1, 2, 0), dtype=np.uint8)
+        Image.fromarray(pixels).save(os.path.join(savingDirectory, filename))
 
 # Main function to trigger the RLE compression/decompression process
 def main():
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The codecs are flat modules in the folder above, imported by name as main.py does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SOURCE_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Wallpaper_1.jpg")
+
+
+@pytest.fixture
+def source_path():
+    """Path passed to the codecs as the input file; its size only feeds the ratio."""
+    return SOURCE_IMAGE
+
+
+def random_image(height, width, seed=0, levels=256):
+    """Noise with ``levels`` grey levels per channel, BGR uint8 like image_loader.load_image."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, levels, (height, width, 3), dtype=np.uint8)
+
+
+def smooth_image(height, width, seed=0):
+    """A gradient with a little noise, closer to a photo than ``random_image``."""
+    rows, columns = np.mgrid[:height, :width]
+    base = np.stack([rows * 3 + columns, rows + columns * 2, (rows * columns) // 7], axis=-1)
+    noise = np.random.default_rng(seed).integers(-3, 4, (height, width, 3))
+    return ((base + noise) % 256).astype(np.uint8)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import deflate
+from conftest import random_image, smooth_image
+
+SHAPES = [(1, 1), (1, 7), (7, 1), (5, 9), (13, 6)]
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("row_filter", deflate.ROW_FILTERS)
+def test_unfilter_rows_inverts_filter_rows(shape, row_filter):
+    image = random_image(*shape, seed=sum(shape))
+    assert np.array_equal(deflate.unfilter_rows(deflate.filter_rows(image, row_filter), image.shape), image)
+
+
+def test_unfilter_rows_mixed_filters():
+    # Runs of every filter, with Average and Paeth rows both close together
+    # and far enough apart to be decoded in separate anti-diagonal passes.
+    image = smooth_image(40, 5)
+    filter_types = np.array([4, 1, 3, 0, 2, 2, 4, 4] + [1] * 6 + [2] * 6 + [3, 0] + [4, 3] * 9)
+    candidates = [deflate.filter_rows(image, name) for name in deflate.FILTER_TYPES]
+    filtered_rows = np.stack([candidates[filter_type][row] for row, filter_type in enumerate(filter_types)])
+    assert np.array_equal(deflate.unfilter_rows(filtered_rows, image.shape), image)
+
+
+@pytest.mark.parametrize("row_filter", [None, "paeth", "adaptive"])
+def test_file_round_trip(tmp_path, source_path, row_filter):
+    image = smooth_image(19, 37)
+    path = str(tmp_path / "image.dfl")
+    deflate.compress_image_with_deflate(source_path, row_filter, output_path=path, image=image)
+    assert np.array_equal(deflate.decompress_image_with_deflate(path), image)
+
+
+@pytest.mark.parametrize("block_size", [64, 1000, 1 << 20])
+@pytest.mark.parametrize("rows", [None, (0, 1), (7, 19), (18, 19)])
+def test_block_file_round_trip(tmp_path, source_path, block_size, rows):
+    image = random_image(19, 37, levels=8)
+    path = str(tmp_path / "image.dflb")
+    deflate.compress_image_with_parallel_deflate(source_path, path, block_size=block_size, restart_interval=3,
+                                                 workers=2, image=image)
+    first, stop = rows or (0, len(image))
+    assert np.array_equal(deflate.decompress_image_with_parallel_deflate(path, rows=rows, workers=2),
+                          image[first:stop])
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import golomb_rice
+from conftest import random_image, smooth_image
+
+
+def flat_image(height, width):
+    # Long runs, runs cut short by a different pixel and runs reaching the end of their row.
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:, width // 3:] = 200
+    image[::3, width // 2] = 17
+    image[height // 2:, -3:] = random_image(height - height // 2, 3)
+    return image
+
+
+IMAGES = {
+    'smooth': lambda: smooth_image(19, 37),
+    'noise': lambda: random_image(11, 14),
+    'levels': lambda: random_image(13, 21, levels=3),
+    'flat': lambda: flat_image(15, 40),
+    'pixel': lambda: random_image(1, 1),
+    'column': lambda: smooth_image(9, 1),
+}
+
+
+@pytest.mark.parametrize("name", IMAGES)
+@pytest.mark.parametrize("predictor", golomb_rice.PREDICTOR_MODES)
+@pytest.mark.parametrize("stripe_rows", [None, 4])
+def test_file_round_trip(tmp_path, source_path, name, predictor, stripe_rows):
+    image = IMAGES[name]()
+    path = str(tmp_path / "image.lgr")
+    golomb_rice.golomb_rice_compression(source_path, path, predictor=predictor, block_size=8,
+                                        stripe_rows=stripe_rows, workers=1, image=image)
+    assert np.array_equal(golomb_rice.golomb_rice_decompression(path, workers=1), image)
+
+
+@pytest.mark.parametrize("negative_mapping", [False, True])
+def test_error_mapping_round_trip(negative_mapping):
+    errors = np.arange(-128, 128)
+    values = golomb_rice.map_errors(errors, negative_mapping)
+    assert sorted(values) == list(range(256))
+    assert np.array_equal(golomb_rice.unmap_errors(values, negative_mapping), errors)
+
+
+def test_run_lengths_round_trip():
+    rng = np.random.default_rng(0)
+    remaining = rng.integers(1, 300, 500)
+    lengths = np.where(rng.random(500) < 0.3, remaining, rng.integers(0, 300, 500) % remaining)
+    runs = golomb_rice.RunReader(golomb_rice.write_runs(lengths, remaining))
+    assert [runs.read(left) for left in remaining.tolist()] == lengths.tolist()
+
+
+def test_runs_shrink_flat_images(tmp_path, source_path):
+    path = str(tmp_path / "image.lgr")
+    result = golomb_rice.golomb_rice_compression(source_path, path, workers=1, image=flat_image(64, 256))
+    assert result["compressed_size"] < 64 * 256 * 3 // 32
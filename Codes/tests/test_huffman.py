@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import huffman_image_compression_only as huffman
+from conftest import random_image, smooth_image
+
+IMAGES = [
+    smooth_image(61, 83),
+    random_image(33, 17, levels=5),
+    np.zeros((5, 7, 3), dtype=np.uint8),
+    np.full((9, 4, 3), 200, dtype=np.uint8),
+]
+
+
+@pytest.mark.parametrize("image", IMAGES, ids=lambda image: "x".join(map(str, image.shape[:2])))
+@pytest.mark.parametrize("table_mode", huffman.TABLE_MODES)
+@pytest.mark.parametrize("stripe_rows", [None, 7])
+def test_round_trip(tmp_path, source_path, image, table_mode, stripe_rows):
+    path = str(tmp_path / "image.huf")
+    huffman.process_image(source_path, path, stripe_rows=stripe_rows, workers=1, table_mode=table_mode, image=image)
+    assert np.array_equal(huffman.decompress_image(path, workers=1), image)
+    if stripe_rows:
+        rows = (3, image.shape[0] - 1)
+        assert np.array_equal(huffman.decompress_image(path, rows=rows, workers=1), image[rows[0]:rows[1]])
+
+
+def test_context_mode_skips_unused_tables(tmp_path, source_path):
+    # Samples below 16 all fall into bucket 0, so context mode codes the same
+    # streams as channel mode and only pays for its larger table bitmap.
+    image = random_image(60, 80, levels=16)
+    sizes = {}
+    for table_mode in ('channel', 'context'):
+        path = str(tmp_path / f"{table_mode}.huf")
+        sizes[table_mode] = huffman.process_image(source_path, path, workers=1, table_mode=table_mode,
+                                                  image=image)["compressed_size"]
+    assert sizes['context'] == sizes['channel'] + (3 << huffman.CONTEXT_BITS) // 8 - 1
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from conftest import random_image
+from image_loader import as_image, attach_image, publish_image
+
+
+def read_published(descriptor):
+    # Runs in the child: returns a copy of the pixels and whether writing to them fails.
+    block, image = attach_image(descriptor)
+    try:
+        try:
+            image[0, 0, 0] = 0
+            read_only = False
+        except ValueError:
+            read_only = True
+        return image.copy(), image.flags.writeable, read_only
+    finally:
+        del image
+        block.close()
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (5, 9), (64, 33)])
+def test_published_image_is_read_only_in_child(shape):
+    image = random_image(*shape)
+    block, descriptor = publish_image(image)
+    try:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            pixels, writeable, read_only = executor.submit(read_published, descriptor).result()
+    finally:
+        block.close()
+        block.unlink()
+    assert np.array_equal(pixels, image)
+    assert not writeable
+    assert read_only
+
+
+def test_as_image_wraps_without_copying():
+    image = random_image(4, 6)
+    assert as_image(image) is image
+    assert np.shares_memory(as_image(memoryview(image)), image)
+    assert np.array_equal(as_image(image[:, ::-1]), image[:, ::-1])
+    with pytest.raises(ValueError):
+        as_image(image[..., 0])
+    with pytest.raises(ValueError):
+        as_image(image.astype(np.int16))
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import jpeg2000
+from conftest import SOURCE_IMAGE, smooth_image
+
+SHAPES = [(1000, 1000), (33, 33), (300, 517), (301, 512)]
+
+
+@pytest.fixture(scope="module", params=SHAPES, ids=lambda shape: "x".join(map(str, shape)))
+def encoded(request, tmp_path_factory):
+    image = smooth_image(*request.param)
+    path = str(tmp_path_factory.mktemp("jpeg2000") / "image.jp2")
+    jpeg2000.jpeg2000_compression(SOURCE_IMAGE, path, tile_size=(128, 128), num_resolutions=4, image=image)
+    return image, path
+
+
+@pytest.mark.parametrize("reduce", [0, 1, 3])
+def test_reduced_decode(encoded, reduce):
+    image, path = encoded
+    height, width = image.shape[:2]
+    decoded = jpeg2000.jpeg2000_decompression(path, reduce=reduce)
+    assert decoded.shape == (-(-height >> reduce), -(-width >> reduce), 3)
+    if reduce == 0:
+        assert np.array_equal(decoded, image)
+
+
+@pytest.mark.parametrize("reduce", [0, 1, 3])
+def test_region_decode(encoded, reduce):
+    image, path = encoded
+    height, width = image.shape[:2]
+    region = (width // 3, height // 5, width - 1, height)
+    decoded = jpeg2000.jpeg2000_decompression(path, reduce=reduce, region=region)
+    whole = jpeg2000.jpeg2000_decompression(path, reduce=reduce)
+    scale = 2 ** reduce
+    assert np.array_equal(decoded, whole[region[1] // scale:-(-region[3] // scale),
+                                         region[0] // scale:-(-region[2] // scale)])
+    if reduce == 0:
+        assert np.array_equal(decoded, image[region[1]:region[3], region[0]:region[2]])
+
+
+@pytest.mark.parametrize("reduce", [1, 3])
+def test_reduced_decode_without_pillow_tiles(monkeypatch, encoded, reduce):
+    # Pillow before 11 has plain tuple tiles: the lossless full decode is shrunk with Image.reduce.
+    image, path = encoded
+    monkeypatch.setattr(jpeg2000, "PILLOW_TILE", ())
+    decoded = jpeg2000.jpeg2000_decompression(path, reduce=reduce)
+    expected = np.asarray(Image.fromarray(image[..., ::-1]).reduce(2 ** reduce))[..., ::-1]
+    assert decoded.shape == (-(-image.shape[0] >> reduce), -(-image.shape[1] >> reduce), 3)
+    assert np.array_equal(decoded, expected)
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+import Limpel_ziv
+from Limpel_ziv import LZW
+from conftest import smooth_image
+
+
+def round_trip(data, maxCodeWidth=16):
+    return bytes(LZW.decompressChannelBytes(LZW.compressChannelBytes(data, maxCodeWidth), maxCodeWidth))
+
+
+def test_end_code_after_width_increase():
+    # 255 distinct bytes add 254 strings, so the encoder's next code is 512
+    # when END_CODE is written and the decoder reads it at 10 bits.
+    data = bytes(range(255))
+    assert round_trip(data) == data
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 255, 256])
+def test_short_channels(length):
+    data = bytes(range(256))[:length]
+    assert round_trip(data) == data
+
+
+def test_random_channels():
+    rng = np.random.default_rng(0)
+    for length in range(700, 740):
+        data = rng.integers(0, 4, length, dtype=np.uint8).tobytes()
+        assert round_trip(data) == data
+
+
+@pytest.mark.parametrize("maxCodeWidth", [9, 12, 16])
+def test_bounded_dictionary(maxCodeWidth):
+    # Long enough to fill a 9- and 12-bit dictionary several times.
+    rng = np.random.default_rng(maxCodeWidth)
+    for _ in range(50):
+        data = rng.integers(0, int(rng.integers(2, 257)), int(rng.integers(0, 20000)), dtype=np.uint8).tobytes()
+        assert round_trip(data, maxCodeWidth) == data
+
+
+@pytest.mark.parametrize("maxCodeWidth", [9, 16])
+def test_binary_file_round_trip(tmp_path, monkeypatch, source_path, maxCodeWidth):
+    monkeypatch.chdir(tmp_path)  # decompressBinary also saves the image under Decompressed/
+    image = smooth_image(37, 53)
+    compressed = str(tmp_path / "image.lzwb")
+    result = LZW(source_path, image=image).compressBinary(maxCodeWidth, workers=1, outputPath=compressed)
+    assert result["compressed_size"] == os.path.getsize(compressed)
+    decoded = LZW(compressed).decompressBinary(workers=1)
+    # Binary LZW stores RGB channel planes.
+    assert np.array_equal(decoded.transpose(1, 2, 0), image[..., ::-1])
+
+
+def test_binary_file_rejects_other_versions(tmp_path):
+    path = tmp_path / "image.lzwb"
+    path.write_bytes(Limpel_ziv.BINARY_MAGIC + bytes(11))
+    with pytest.raises(ValueError, match="version 0"):
+        LZW(str(path)).decompressBinary(workers=1)
+
+
+@pytest.mark.parametrize("shape", [(23, 31), (31, 23), (1, 9)])
+def test_text_file_round_trip(tmp_path, source_path, shape):
+    image = smooth_image(*shape)
+    compressed = str(tmp_path / "image.lzw")
+    result = LZW(source_path, image=image).compress(outputPath=compressed)
+    assert result["compressed_size"] == os.path.getsize(compressed)
+    decoded = LZW(compressed).decompressStream()
+    # Every channel's lines hold its RGB samples in row-major order.
+    assert np.array_equal(decoded.reshape(3, -1), image[..., ::-1].transpose(2, 0, 1).reshape(3, -1))
+
+
+def test_default_output_path(tmp_path, monkeypatch, source_path):
+    monkeypatch.chdir(tmp_path)
+    LZW(source_path, image=smooth_image(5, 7)).compressBinary(workers=1)
+    stem = os.path.basename(source_path).split('.')[0]
+    assert os.path.isfile(os.path.join("Compressed", stem + "Compressed.lzwb"))
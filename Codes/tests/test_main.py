@@ -0,0 +1,104 @@
+import csv
+import os
+
+import cv2
+import pytest
+
+import main
+from conftest import smooth_image
+
+
+def fake_rows(filename, technique, count, measure):
+    for index in range(count):
+        result, timing = measure(lambda: index)
+        yield [filename, 100, 50, 2.0, 0.1, 7.0, 1.0, f"{technique}_{result}"], timing
+
+
+def steady_rows(filename, input_image_path, image, output_folder, measure):
+    yield from fake_rows(filename, "steady", 2, measure)
+
+
+def flaky_rows(filename, input_image_path, image, output_folder, measure):
+    # Fails after its first row until a marker file exists next to the outputs.
+    yield from fake_rows(filename, "flaky", 1, measure)
+    if not os.path.exists(os.path.join(output_folder, "fixed")):
+        raise RuntimeError("flaky codec")
+    yield from fake_rows(filename, "flaky_more", 1, measure)
+
+
+def crashing_rows(filename, input_image_path, image, output_folder, measure):
+    # Kills the worker process on b.png.
+    if filename == "b.png":
+        os._exit(1)
+    yield from fake_rows(filename, "crashing", 1, measure)
+
+
+def raising_rows(filename, input_image_path, image, output_folder, measure):
+    if filename == "a.png":
+        raise RuntimeError("raising codec")
+    yield from fake_rows(filename, "raising", 1, measure)
+
+
+@pytest.fixture
+def folders(tmp_path):
+    input_folder = tmp_path / "images"
+    input_folder.mkdir()
+    for seed, name in enumerate(("a.png", "b.png", "c.png")):
+        cv2.imwrite(str(input_folder / name), smooth_image(6, 9, seed))
+    return str(input_folder), str(tmp_path / "compressed"), str(tmp_path / "results.csv")
+
+
+def read_rows(csv_file_path):
+    with open(csv_file_path, newline="") as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_failed_rows_are_written_once_they_succeed(monkeypatch, folders):
+    monkeypatch.setattr(main, "CODECS", {"steady": ("steady", 1, steady_rows), "flaky": ("flaky", 1, flaky_rows)})
+    input_folder, output_folder, csv_file_path = folders
+    main.process_images_in_folder(input_folder, output_folder, csv_file_path, workers=1)
+    main.process_images_in_folder(input_folder, output_folder, csv_file_path, workers=1)
+    rows = read_rows(csv_file_path)
+    assert rows[0] == main.CSV_HEADER
+    assert [(row[0], row[7]) for row in rows[1:]] == [(name, f"steady_{index}") for name in ("a.png", "b.png", "c.png")
+                                                      for index in range(2)]
+
+    open(os.path.join(output_folder, "fixed"), "w").close()
+    for _ in range(2):
+        main.process_images_in_folder(input_folder, output_folder, csv_file_path, workers=1)
+    assert [(row[0], row[7]) for row in read_rows(csv_file_path)[7:]] == [
+        (name, technique) for name in ("a.png", "b.png", "c.png") for technique in ("flaky_0", "flaky_more_0")]
+
+
+def test_other_header_is_not_appended_to(monkeypatch, folders):
+    monkeypatch.setattr(main, "CODECS", {"steady": ("steady", 1, steady_rows)})
+    input_folder, output_folder, csv_file_path = folders
+    with open(csv_file_path, "w", newline="") as csv_file:
+        csv.writer(csv_file).writerow(main.CSV_HEADER[:8])
+    with pytest.raises(ValueError):
+        main.process_images_in_folder(input_folder, output_folder, csv_file_path, workers=1)
+    assert read_rows(csv_file_path) == [main.CSV_HEADER[:8]]
+
+
+def test_empty_csv_gets_the_header(monkeypatch, folders):
+    monkeypatch.setattr(main, "CODECS", {"steady": ("steady", 1, steady_rows)})
+    input_folder, output_folder, csv_file_path = folders
+    open(csv_file_path, "w").close()
+    main.process_images_in_folder(input_folder, output_folder, csv_file_path, workers=1)
+    assert read_rows(csv_file_path)[0] == main.CSV_HEADER
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_crash_and_error_only_lose_their_tasks(monkeypatch, folders, workers):
+    monkeypatch.setattr(main, "CODECS", {
+        "steady": ("steady", 1, steady_rows),
+        "crashing": ("crashing", 3, crashing_rows),
+        "raising": ("raising", 2, raising_rows),
+    })
+    input_folder, output_folder, csv_file_path = folders
+    main.process_images_in_folder(input_folder, output_folder, csv_file_path, workers=workers)
+    assert [(row[0], row[7]) for row in read_rows(csv_file_path)[1:]] == [
+        ("a.png", "steady_0"), ("a.png", "steady_1"), ("a.png", "crashing_0"),
+        ("b.png", "steady_0"), ("b.png", "steady_1"), ("b.png", "raising_0"),
+        ("c.png", "steady_0"), ("c.png", "steady_1"), ("c.png", "crashing_0"), ("c.png", "raising_0"),
+    ]
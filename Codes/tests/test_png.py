@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import png
+from conftest import smooth_image
+
+
+@pytest.mark.parametrize("level", [1, 9, "auto"])
+def test_round_trip(tmp_path, source_path, level):
+    image = smooth_image(19, 37)
+    path = str(tmp_path / "image.png")
+    result = png.png_compression(source_path, path, level=level, verify=True, image=image)
+    assert result["verified"]
+    assert result["compressed_size"] == (tmp_path / "image.png").stat().st_size
+    assert np.array_equal(np.asarray(Image.open(path))[..., ::-1], image)
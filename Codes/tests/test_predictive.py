@@ -0,0 +1,78 @@
+import gzip
+
+import cv2
+import numpy as np
+import pytest
+
+import predictive
+from conftest import random_image, smooth_image
+
+SHAPES = [(1, 1), (1, 7), (7, 1), (5, 9), (13, 6)]
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("stripe_rows", [None, 2])
+def test_med_prediction_error_matches_loop(shape, stripe_rows):
+    # Both use MED inside each stripe; only the borders are predicted differently.
+    image = random_image(*shape, seed=sum(shape))
+    error, _ = predictive.compute_prediction_error(image, 'med', block_size=4, stripe_rows=stripe_rows)
+    for row in range(0, shape[0], stripe_rows or shape[0]):
+        stripe = image[row:row + (stripe_rows or shape[0])]
+        expected = predictive.med_prediction_error_reference(stripe)
+        assert np.array_equal(error[row:row + len(stripe)][1:, 1:], expected[1:, 1:])
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_med_reconstruct_matches_loop(shape):
+    image = random_image(*shape, seed=sum(shape))
+    error = predictive.med_prediction_error_reference(image)
+    assert np.array_equal(predictive.med_reconstruct_reference(error), image)
+    assert np.array_equal(predictive.med_reconstruct(error), image)
+
+
+@pytest.mark.parametrize("mapping", predictive.RESIDUAL_MAPPINGS)
+def test_mapped_residuals_reconstruct(mapping):
+    image = random_image(11, 17)
+    error = predictive.unmap_residuals(predictive.map_residuals(predictive.med_prediction_error_reference(image), mapping), mapping)
+    assert np.array_equal(predictive.med_reconstruct(error), image)
+
+
+@pytest.mark.parametrize("predictor", predictive.PREDICTOR_MODES)
+@pytest.mark.parametrize("stripe_rows", [None, 4, 5])
+def test_file_round_trip(tmp_path, source_path, predictor, stripe_rows):
+    image = smooth_image(19, 37)
+    image[5:12, 20:30] = random_image(7, 10)
+    path = str(tmp_path / "image.pred")
+    predictive.predictive_coding_compression(source_path, path, stripe_rows=stripe_rows, predictor=predictor,
+                                             block_size=8, image=image)
+    decoded = predictive.predictive_coding_decompression(path, output_image_path=str(tmp_path / "image.png"), workers=1)
+    assert np.array_equal(decoded, image)
+
+
+@pytest.mark.parametrize("mapping", predictive.RESIDUAL_MAPPINGS)
+@pytest.mark.parametrize("backend", predictive.BACKEND_NAMES)
+def test_file_round_trip_backends(tmp_path, source_path, mapping, backend):
+    image = random_image(9, 14)
+    path = str(tmp_path / "image.pred")
+    predictive.predictive_coding_compression(source_path, path, mapping=mapping, backend=backend, image=image)
+    assert np.array_equal(predictive.predictive_coding_decompression(path, output_image_path=str(tmp_path / "image.png")), image)
+
+
+def test_headerless_file_positional_arguments(tmp_path):
+    # Files from before the header: bare gzip int16 errors, decoded with the original (path, shape, output) order.
+    image = random_image(6, 8)
+    path = tmp_path / "image.pred"
+    path.write_bytes(gzip.compress(predictive.med_prediction_error_reference(image).astype(np.int16).tobytes()))
+    output = str(tmp_path / "image.png")
+    assert np.array_equal(predictive.predictive_coding_decompression(str(path), image.shape, output), image)
+    assert np.array_equal(cv2.imread(output), image)
+
+
+@pytest.mark.parametrize("stripe_rows", [None, 3, 7])
+def test_banded_errors_match_whole_stripes(stripe_rows):
+    # Per predictor, the error of a band must not depend on where bands start.
+    image = smooth_image(29, 23)
+    for name in predictive.PREDICTOR_NAMES:
+        banded, _ = predictive.compute_prediction_error(image, name, block_size=4, stripe_rows=stripe_rows)
+        whole, _ = predictive.compute_prediction_error(image, name, block_size=64, stripe_rows=stripe_rows)
+        assert np.array_equal(banded, whole)
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import random_image, smooth_image
+from rle import RLE, SCAN_ORDERS
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 3, 127, 128, 129, 300])
+def test_packbits_round_trip(length):
+    rng = np.random.default_rng(length)
+    flat = np.repeat(rng.integers(0, 3, length, dtype=np.uint8), rng.integers(1, 200, length))[:5 * length]
+    assert np.array_equal(RLE.packbitsDecode(RLE.packbitsEncode(flat).tobytes()), flat)
+
+
+@pytest.mark.parametrize("scanOrder", SCAN_ORDERS + ('auto',))
+@pytest.mark.parametrize("shape", [(1, 1), (7, 13), (40, 9)])
+def test_binary_file_round_trip(tmp_path, monkeypatch, source_path, scanOrder, shape):
+    monkeypatch.chdir(tmp_path)  # decompressBinary also saves the image under Decompressed/
+    image = smooth_image(*shape) // 16
+    image[:shape[0] // 2] = random_image(shape[0] // 2, shape[1])
+    compressed = str(tmp_path / "image.rleb")
+    result = RLE(source_path, image=image).compressBinary(scanOrder, outputPath=compressed)
+    assert result["compressed_size"] == os.path.getsize(compressed)
+    decoded = RLE(compressed).decompressBinary()
+    # Binary RLE stores RGB channel planes.
+    assert np.array_equal(decoded.transpose(1, 2, 0), image[..., ::-1])
+
+
+def test_default_output_path(tmp_path, monkeypatch, source_path):
+    monkeypatch.chdir(tmp_path)
+    RLE(source_path, image=smooth_image(5, 7)).compressBinary()
+    stem = os.path.basename(source_path).split('.')[0]
+    assert os.path.isfile(os.path.join("Compressed", stem + "Compressed.rleb"))
+
+
+@pytest.mark.parametrize("scanOrder", SCAN_ORDERS)
+@pytest.mark.parametrize("shape", [(1, 1), (7, 13), (40, 9)])
+def test_scan_indices_are_uint32_permutations(scanOrder, shape):
+    indices = RLE.scanIndices(scanOrder, *shape)
+    assert indices.dtype == np.uint32
+    assert np.array_equal(np.sort(indices), np.arange(shape[0] * shape[1]))
@@ -0,0 +1,89 @@
+import pytest
+
+import timing
+from timing import benchmark, phase
+
+
+class FakeClock:
+    """Stands in for time.perf_counter_ns; ``sleep`` moves it forward by whole seconds."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds * 10 ** 9
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(timing.time, "perf_counter_ns", clock)
+    return clock
+
+
+def fake_codec(clock, entropy_seconds):
+    calls = []
+
+    def codec():
+        with phase("load"):
+            clock.sleep(1)
+        with phase("transform"):
+            clock.sleep(2)
+            with phase("entropy_code"):
+                clock.sleep(entropy_seconds[len(calls)])
+            clock.sleep(1)
+        with phase("write"):
+            clock.sleep(1)
+        clock.sleep(100)  # Outside every phase, never counted
+        calls.append(None)
+        return len(calls)
+
+    return codec, calls
+
+
+def test_nested_phases_repeats_and_warmup(clock):
+    # Two warmup calls, then totals of 5 + 3, 1, 5, 2, 4 seconds.
+    codec, calls = fake_codec(clock, [50, 50, 3, 1, 5, 2, 4])
+    result, figures = benchmark(codec, repeats=5, warmup=2)
+    assert result == len(calls) == 7
+    assert figures == {
+        "median": 8, "p90": 10, "min": 6,
+        "load": 1, "transform": 3, "entropy_code": 3, "write": 1,
+        "repeats": 5,
+    }
+
+
+def test_single_run_by_default(clock):
+    codec, calls = fake_codec(clock, [2])
+    _, figures = benchmark(codec)
+    assert len(calls) == 1
+    assert figures["repeats"] == 1
+    assert figures["median"] == figures["p90"] == figures["min"] == 7
+
+
+def test_phases_outside_a_benchmark_are_not_timed(clock):
+    with phase("load"):
+        clock.sleep(1)
+    codec, _ = fake_codec(clock, [0])
+    assert benchmark(codec)[1]["load"] == 1
+
+
+def test_failed_call_leaves_no_open_phase(clock):
+    def failing():
+        with phase("transform"):
+            raise RuntimeError("codec failed")
+
+    with pytest.raises(RuntimeError):
+        benchmark(failing)
+    codec, _ = fake_codec(clock, [1])
+    figures = benchmark(codec)[1]
+    assert (figures["transform"], figures["entropy_code"]) == (3, 1)
+
+
+def test_percentile_is_nearest_rank():
+    assert timing.percentile([4, 1, 3, 2], 0.9) == 4
+    assert timing.percentile([4, 1, 3, 2], 0.5) == 2
+    assert timing.percentile([7], 0.9) == 7
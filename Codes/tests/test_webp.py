@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import webp
+from conftest import random_image, smooth_image
+
+
+@pytest.mark.parametrize("method", [0, webp.DEFAULT_METHOD, 6])
+def test_lossless_round_trip(tmp_path, source_path, method):
+    image = smooth_image(19, 37)
+    image[3:9, 5:20] = random_image(6, 15)
+    path = str(tmp_path / "image.webp")
+    result = webp.webp_compression(source_path, path, verify=True, method=method, image=image)
+    assert result["verified"]
+    assert result["compressed_size"] == (tmp_path / "image.webp").stat().st_size
+    assert np.array_equal(np.asarray(Image.open(path).convert("RGB"))[..., ::-1], image)
+    decoded = webp.webp_decompression(path, str(tmp_path / "image.png"))
+    assert np.array_equal(decoded, image)
+
+
+def test_effort_sweep_decodes_exactly(source_path):
+    image = smooth_image(8, 11)
+    results = webp.webp_effort_sweep(source_path, image=image)
+    assert [result["method"] for result in results] == list(range(7))
+    for result in results:
+        encoded = np.frombuffer(webp.encode_webp(image, method=result["method"]), dtype=np.uint8)
+        assert encoded.size == result["compressed_size"]
+        assert np.array_equal(cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED), image)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import zlib_tuning
+from zlib_tuning import STRATEGIES, autotune_zlib
+
+# (level, strategy) -> (compressed bytes, seconds) of a 1 MB image
+SETTINGS = {
+    (1, "default"): (350_000, 1.0),
+    (9, "default"): (250_000, 4.0),
+    (1, "rle"): (400_000, 0.5),
+    (9, "rle"): (252_000, 3.0),
+}
+LEVELS = (1, 9)
+NAMES = ("default", "rle")
+
+
+@pytest.fixture
+def encode(monkeypatch):
+    """Fake encoder whose sizes and times come from ``SETTINGS``, scaled by the band size."""
+    clock = [0.0]
+    monkeypatch.setattr(zlib_tuning.time, "perf_counter", lambda: clock[0])
+    names = {STRATEGIES[name]: name for name in NAMES}
+
+    def encode(band, level, strategy):
+        size, seconds = SETTINGS[level, names[strategy]]
+        clock[0] += seconds * band.nbytes / 1e6
+        return bytes(size * band.nbytes // 1_000_000)
+
+    return encode
+
+
+def tune(encode, **options):
+    # 50 rows are fewer than the sampled rows, so the whole 1 MB image is the sample.
+    image = np.zeros((50, 20_000, 1), dtype=np.uint8)
+    choice = autotune_zlib(image, encode, levels=LEVELS, strategies=NAMES, **options)
+    return choice["level"], choice["strategy"]
+
+
+@pytest.mark.parametrize("options, expected", [
+    ({}, (9, "rle")),  # Fastest within 1% of the best ratio, 4
+    ({"tolerance": 0}, (9, "default")),
+    ({"tolerance": 0.5}, (1, "rle")),
+    ({"target_ratio": 2.2}, (1, "rle")),  # Fastest reaching the target
+    ({"target_ratio": 2.7}, (1, "default")),
+    ({"target_ratio": 5}, (9, "default")),  # Best ratio when none reaches it
+    ({"time_budget": 3.5}, (9, "rle")),  # Best ratio within the budget
+    ({"time_budget": 2}, (1, "default")),
+    ({"time_budget": 0.1}, (1, "rle")),  # Fastest when none is within it
+    ({"time_budget": 2, "target_ratio": 3}, (1, "default")),  # The budget takes precedence
+])
+def test_selection_rules(encode, options, expected):
+    assert tune(encode, **options) == expected
+
+
+def test_predictions_scale_from_sampled_bands(encode):
+    # 4 bands of 16 rows out of 256: the predictions are 4 times the sample.
+    image = np.zeros((256, 1000, 1), dtype=np.uint8)
+    choice = autotune_zlib(image, encode, levels=(9,), strategies=("default",))
+    assert choice["predicted_compressed_size"] == round(image.nbytes * 0.25)
+    assert choice["predicted_time_taken"] == pytest.approx(4.0 * image.nbytes / 1e6)
+
+
+def test_empty_image(encode):
+    choice = autotune_zlib(np.zeros((0, 0, 3), dtype=np.uint8), encode, levels=LEVELS, strategies=NAMES)
+    assert choice == {"level": 1, "strategy": "default", "predicted_compressed_size": 0, "predicted_time_taken": 0.0}
@@ -0,0 +1,85 @@
+import math
+import statistics
+import time
+from contextlib import contextmanager
+
+# Every codec marks its work with ``phase`` in these four phases. The time a
+# codec takes is the sum of its phases, so work outside them (metrics,
+# progress messages) never counts, whatever the codec also does.
+PHASES = ("load", "transform", "entropy_code", "write")
+# One timed call and no warmup by default: a benchmark run costs one codec
+# call. More repeats and a warmup give steadier figures on request.
+REPEATS = 1
+WARMUP = 0
+
+_timer = None  # Nanoseconds per phase of the benchmark run in progress
+_open_phases = []  # [name, start] of the phases entered and not left yet
+
+
+@contextmanager
+def phase(name):
+    """
+    Attributes the time spent in the block to phase ``name`` of the benchmark
+    run in progress, if any. Phases nest: an inner phase pauses the outer one,
+    so a codec can mark a call as a whole and the callee still split it.
+    Work sent to other processes only counts through the phase around the call.
+    """
+    if _timer is None:
+        yield
+        return
+    now = time.perf_counter_ns()
+    if _open_phases:
+        outer = _open_phases[-1]
+        _timer[outer[0]] += now - outer[1]
+    _open_phases.append([name, now])
+    try:
+        yield
+    finally:
+        now = time.perf_counter_ns()
+        inner, start = _open_phases.pop()
+        _timer[inner] += now - start
+        if _open_phases:
+            _open_phases[-1][1] = now
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of ``values``.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def benchmark(function, repeats=REPEATS, warmup=WARMUP):
+    """
+    Times a codec call with ``time.perf_counter_ns``.
+
+    :param function: Callable without arguments running the codec once.
+    :param repeats: Timed calls.
+    :param warmup: Untimed calls made first, to fill caches and load libraries.
+    :return: The result of the last call and a dict of seconds: ``median``,
+             ``p90`` and ``min`` of the per-call totals (the sum of the
+             phases), the median of each phase in ``PHASES`` and the number of
+             timed ``repeats``.
+    """
+    global _timer
+    for _ in range(warmup):
+        function()
+    totals, phases = [], {name: [] for name in PHASES}
+    for _ in range(max(repeats, 1)):
+        _timer = dict.fromkeys(PHASES, 0)
+        try:
+            result = function()
+        finally:
+            timer, _timer = _timer, None
+            _open_phases.clear()
+        totals.append(sum(timer.values()))
+        for name in PHASES:
+            phases[name].append(timer[name])
+    return result, {
+        "median": statistics.median(totals) / 1e9,
+        "p90": percentile(totals, 0.9) / 1e9,
+        "min": min(totals) / 1e9,
+        **{name: statistics.median(phases[name]) / 1e9 for name in PHASES},
+        "repeats": len(totals),
+    }
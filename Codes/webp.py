@@ -1,9 +1,14 @@
 import cv2
+import io
 from PIL import Image
 import numpy as np
 import os
 import time
-from collections import Counter
+
+from image_loader import source_image
+from timing import phase
+
+DEFAULT_METHOD = 4
 
 
 def calculate_entropy(image):
@@ -13,16 +18,15 @@ def calculate_entropy(image):
     :param image: The input image as a numpy array.
     :return: Entropy and redundancy values.
     """
-    # Flatten the image and count the occurrences of each pixel value
-    flat_image = image.flatten()
-    value_counts = Counter(flat_image)
-    total_pixels = len(flat_image)
+    # Count the occurrences of each pixel value
+    value_counts = np.bincount(image.ravel(), minlength=256)
+    total_pixels = image.size
 
-    # Calculate probabilities of unique pixel values
-    probabilities = [count / total_pixels for count in value_counts.values()]
+    # Calculate probabilities of the pixel values that occur
+    probabilities = value_counts[value_counts > 0] / total_pixels
 
     # Calculate entropy
-    entropy = -sum(p * np.log2(p) for p in probabilities)
+    entropy = -np.sum(probabilities * np.log2(probabilities))
 
     # Calculate maximum entropy for an 8-bit image (256 possible values)
     max_entropy = np.log2(256)
@@ -33,51 +37,125 @@ def calculate_entropy(image):
     return entropy, redundancy
 
 
-def webp_compression(image_path, output_path):
+def encode_webp(image, lossless=True, method=DEFAULT_METHOD, quality=100, exact=True):
     """
-    Compresses an image using WebP in lossless mode (quality=100).
-    
+    Encodes a BGR image as WebP in memory.
+
+    Lossless mode goes through Pillow, which exposes libwebp's lossless encoder;
+    OpenCV's quality=100 is its highest lossy quality and does not round-trip.
+
+    :param image: uint8 BGR array as returned by OpenCV.
+    :param lossless: Use the lossless encoder. Otherwise OpenCV's lossy encoder
+                     is used with ``quality``.
+    :param method: Encoder effort from 0 (fast) to 6 (slowest, smallest).
+    :param quality: In lossless mode, how hard the encoder tries within
+                    ``method`` (0-100); in lossy mode, the quality.
+    :param exact: Keep the RGB values of fully transparent pixels.
+    :return: The encoded bytes.
+    """
+    if not lossless:
+        is_success, encoded = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        if not is_success:
+            raise IOError("Failed to encode image as WebP")
+        return encoded.tobytes()
+
+    if image.ndim == 2:
+        pil_image = Image.fromarray(image)
+    elif image.shape[2] == 4:
+        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA))
+    else:
+        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    buffer = io.BytesIO()
+    pil_image.save(buffer, format="WEBP", lossless=True, method=method, quality=quality, exact=exact)
+    return buffer.getvalue()
+
+
+def webp_compression(image_path, output_path=None, verify=False, lossless=True, method=DEFAULT_METHOD, quality=100,
+                     exact=True, image=None):
+    """
+    Compresses an image using WebP, in true lossless mode by default.
+
+    The image is encoded in memory: the compressed size is the length of the
+    encoded buffer and the metrics come from the source array, so nothing is
+    read back from disk.
+
     :param image_path: Path to the input image.
-    :param output_path: Path to save the WebP-compressed image.
+    :param output_path: Path to save the WebP-compressed image, if given.
+    :param verify: Decode the encoded buffer, compute the metrics on the decoded
+                   image and report whether it matches the source.
+    :param lossless, method, quality, exact: See ``encode_webp``.
+    :param image: The source already decoded by ``image_loader.load_image``, an
+                  array or memoryview. ``None`` decodes ``image_path``.
     :return: Compression statistics.
     """
-    start_time = time.time()
+    start_time = time.perf_counter()
 
-    # Read the image
-    image = cv2.imread(image_path)
-    if image is None:
-        raise FileNotFoundError(f"Image not found at {image_path}")
+    # Read the image unless it was decoded already
+    image = source_image(image_path, image)
 
-    # Save the image as WebP with quality=100 (lossless)
-    is_success = cv2.imwrite(output_path, image, [cv2.IMWRITE_WEBP_QUALITY, 100])
-    if not is_success:
-        raise IOError(f"Failed to save image as WebP at {output_path}")
+    # Encode the image as WebP; libwebp transforms and entropy codes in one call
+    with phase("entropy_code"):
+        encoded = np.frombuffer(encode_webp(image, lossless, method, quality, exact), dtype=np.uint8)
+    if output_path:
+        with phase("write"):
+            encoded.tofile(output_path)
 
-    end_time = time.time()
+    end_time = time.perf_counter()
 
     # Get sizes and calculate compression ratio
     original_size = os.path.getsize(image_path)
-    compressed_size = os.path.getsize(output_path)
+    compressed_size = encoded.size
     compression_ratio = original_size / compressed_size
     time_taken = end_time - start_time
 
-    # Load the compressed image to calculate entropy and redundancy
-    compressed_image = cv2.imread(output_path, cv2.IMREAD_UNCHANGED)
-    if compressed_image is None:
-        raise FileNotFoundError(f"Failed to load compressed image from {output_path}")
-
-    # Calculate entropy and redundancy for the compressed image
-    entropy, redundancy = calculate_entropy(compressed_image)
-
-    return {
+    result = {
         "original_size": original_size,
         "compressed_size": compressed_size,
         "compression_ratio": compression_ratio,
         "time_taken": time_taken,
-        "entropy": entropy,
-        "redundancy": redundancy,
+        "method": method if lossless else None,
     }
 
+    # Calculate entropy and redundancy, on the decoded image when verifying
+    if verify:
+        decoded_image = cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED)
+        if decoded_image is None:
+            raise ValueError("Failed to decode the encoded WebP image")
+        result["verified"] = np.array_equal(image, decoded_image)
+        image = decoded_image
+    result["entropy"], result["redundancy"] = calculate_entropy(image)
+    return result
+
+
+def webp_effort_sweep(image_path, methods=range(7), quality=100, image=None):
+    """
+    Encodes an image losslessly at every encoder method to show the size and
+    time trade-off.
+
+    :param image_path: Path to the input image.
+    :param methods: Methods (effort levels) to try.
+    :param quality: Lossless effort within each method, see ``encode_webp``.
+    :param image: The source already decoded, see ``webp_compression``.
+    :return: One dict per method with the method, sizes, compression ratio and
+             encode time.
+    """
+    image = source_image(image_path, image)
+    original_size = os.path.getsize(image_path)
+
+    results = []
+    for method in methods:
+        start_time = time.perf_counter()
+        with phase("entropy_code"):
+            encoded = encode_webp(image, method=method, quality=quality)
+        results.append({
+            "method": method,
+            "original_size": original_size,
+            "compressed_size": len(encoded),
+            "compression_ratio": original_size / len(encoded),
+            "time_taken": time.perf_counter() - start_time,
+        })
+    return results
+
 
 def webp_decompression(webp_path, output_image_path):
     """
@@ -101,12 +179,16 @@ def webp_decompression(webp_path, output_image_path):
 if __name__ == "__main__":
     input_image_path = "Images/480-360-sample.bmp"  # Replace with your image path
     compressed_webp_path = "compressed_image.webp"
-    decompressed_image_path = "decompressed_image.jpg"
+    decompressed_image_path = "decompressed_image.png"  # Lossless format, so the check below is exact
 
     # WebP Compression
     compression_result = webp_compression(input_image_path, compressed_webp_path)
     print("WebP Compression Results:", compression_result)
 
+    # Size and encode time at every effort level
+    for sweep_result in webp_effort_sweep(input_image_path):
+        print("WebP Effort Sweep:", sweep_result)
+
     # WebP Decompression
     decompressed_image = webp_decompression(compressed_webp_path, decompressed_image_path)
 
@@ -0,0 +1,102 @@
+import time
+import zlib
+
+import numpy as np
+
+LEVELS = (1, 6, 9)
+STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "rle": zlib.Z_RLE,
+}
+SAMPLE_BANDS = 4
+SAMPLE_ROWS = 16
+RATIO_TOLERANCE = 0.01
+
+
+def sample_bands(image, count=SAMPLE_BANDS, rows=SAMPLE_ROWS):
+    """
+    Picks evenly spaced full-width bands of rows from an image.
+
+    Args:
+        image (numpy.ndarray): Image of shape (height, width, channels).
+        count (int): Number of bands.
+        rows (int): Rows per band.
+
+    Returns:
+        list: The bands as views of ``image``, or the whole image if it is too
+        small to sample.
+    """
+    height = image.shape[0]
+    if count * rows >= height:
+        return [image]
+    starts = np.linspace(0, height - rows, count).astype(int)
+    return [image[start:start + rows] for start in starts]
+
+
+def autotune_zlib(image, encode, target_ratio=None, time_budget=None, levels=LEVELS, strategies=tuple(STRATEGIES),
+                  tolerance=RATIO_TOLERANCE):
+    """
+    Chooses a zlib level and strategy by compressing sampled bands of the image.
+
+    Every (level, strategy) pair compresses the bands of ``sample_bands``. The
+    pick is then:
+
+    * with ``time_budget``, the best ratio among the settings that stay within
+      the budget (the fastest setting if none does);
+    * with ``target_ratio``, the fastest setting that reaches it (the best ratio
+      if none does);
+    * otherwise, the fastest setting within ``tolerance`` of the best sampled
+      ratio.
+
+    An empty image has nothing to sample: the first of ``levels`` and
+    ``strategies`` is returned with zero predictions.
+
+    Args:
+        image (numpy.ndarray): uint8 image of shape (height, width, channels).
+        encode (callable): ``encode(band, level, strategy)`` returns the
+            compressed bytes of a band, ``strategy`` being a zlib constant.
+        target_ratio (float): Wanted ratio of raw pixel bytes to compressed bytes.
+        time_budget (float): Allowed compression seconds per MB of pixel data.
+        levels (tuple): zlib levels to try.
+        strategies (tuple): Keys of ``STRATEGIES`` to try.
+        tolerance (float): Relative ratio loss accepted in the default mode.
+
+    Returns:
+        dict: The chosen ``level`` and ``strategy`` name, and the
+        ``predicted_compressed_size`` and ``predicted_time_taken`` for the whole
+        image, extrapolated from the bands.
+    """
+    bands = sample_bands(image)
+    sample_size = sum(band.nbytes for band in bands)
+    if sample_size == 0:
+        return {"level": levels[0], "strategy": strategies[0], "predicted_compressed_size": 0,
+                "predicted_time_taken": 0.0}
+    scale = image.nbytes / sample_size
+
+    candidates = []
+    for strategy in strategies:
+        for level in levels:
+            start_time = time.perf_counter()
+            compressed_size = sum(len(encode(band, level, STRATEGIES[strategy])) for band in bands)
+            seconds = time.perf_counter() - start_time
+            candidates.append({
+                "level": level,
+                "strategy": strategy,
+                "ratio": sample_size / compressed_size,
+                "seconds_per_mb": seconds / (sample_size / 1e6),
+                "predicted_compressed_size": round(compressed_size * scale),
+                "predicted_time_taken": seconds * scale,
+            })
+
+    fastest = min(candidates, key=lambda candidate: candidate["seconds_per_mb"])
+    smallest = max(candidates, key=lambda candidate: candidate["ratio"])
+    if time_budget is not None:
+        feasible = [candidate for candidate in candidates if candidate["seconds_per_mb"] <= time_budget]
+        choice = max(feasible, key=lambda candidate: candidate["ratio"]) if feasible else fastest
+    else:
+        target = target_ratio if target_ratio is not None else smallest["ratio"] * (1 - tolerance)
+        feasible = [candidate for candidate in candidates if candidate["ratio"] >= target]
+        choice = min(feasible, key=lambda candidate: candidate["seconds_per_mb"]) if feasible else smallest
+
+    return {key: choice[key] for key in ("level", "strategy", "predicted_compressed_size", "predicted_time_taken")}